@@ -0,0 +1,66 @@
+"""
+账单批次台账
+
+记录已经合并进抖音订单合并结果的账单批次（批次取自文件名），跨运行持久保存。
+追加模式下只解析台账中没有的批次，并把新数据追加到已有的合并结果后面。
+无法从文件名提取批次的文件按相对路径记录。
+"""
+import json
+import os
+from datetime import datetime
+
+LEDGER_VERSION = 1
+
+
+def _empty_ledger():
+    return {"version": LEDGER_VERSION, "batches": {}, "files": {}}
+
+
+def load_ledger(ledger_path):
+    """读取台账，不存在或损坏时返回空台账"""
+    if not ledger_path or not os.path.exists(ledger_path):
+        return _empty_ledger()
+    try:
+        with open(ledger_path, "r", encoding="utf-8") as f:
+            ledger = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 账单批次台账损坏，将重新合并全部文件: {str(e)}")
+        return _empty_ledger()
+    if ledger.get("version") != LEDGER_VERSION:
+        return _empty_ledger()
+    return ledger
+
+
+def save_ledger(ledger_path, ledger):
+    """写入台账（先写临时文件再替换）"""
+    folder = os.path.dirname(ledger_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    temp_path = ledger_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(ledger, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, ledger_path)
+
+
+def is_empty(ledger):
+    return not ledger["batches"] and not ledger["files"]
+
+
+def find_ingested(ledger, order_batch, rel_path, unknown_batch):
+    """返回该批次（或未知批次文件）的台账记录，未合并过返回 None"""
+    if order_batch == unknown_batch:
+        return ledger["files"].get(rel_path)
+    return ledger["batches"].get(order_batch)
+
+
+def record_ingested(ledger, order_batch, rel_path, rows, unknown_batch):
+    """登记一个已合并的批次"""
+    entry = {
+        "file": rel_path,
+        "rows": int(rows),
+        "ingested_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if order_batch == unknown_batch:
+        ledger["files"][rel_path] = entry
+    else:
+        ledger["batches"][order_batch] = entry
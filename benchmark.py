@@ -0,0 +1,222 @@
+"""
+基准测试
+
+用 workload_generator 生成不同行数的模拟数据，逐个计时主程序和二次登记的各个处理函数：
+    batch_process_excel、merge_excel_by_batch、create_guobu_table、fill_3c_name、
+    count_unique_shops_with_sheet、document_file、国补二次登记（按 sku 一次性匹配）、二次登记提速（多线程）
+可并行的函数（前三个按进程数，二次登记提速按线程数）在每个 --workers 取值下各测一次。
+结果输出两张表：随数据量的变化（相邻两档的增长阶数，1 表示线性）和随核心数的加速比，
+并保存为 基准测试/基准测试结果_时间.json。
+
+用法:
+    python benchmark.py --sizes 1000 10000 100000 --workers 1 2 4
+    python benchmark.py --sizes 1000000 --workers 1 8 --repeat 1
+"""
+import argparse
+import importlib.util
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+import perf_metrics  # noqa: E402
+from excel_reader import read_sheet, read_merged_sheet  # noqa: E402
+from workload_generator import generate_workload, SHOPS  # noqa: E402
+
+BENCHMARK_DIR = os.path.join(REPO_DIR, "基准测试")
+INTERMEDIATE_DIR = "./中间文件—可忽略"
+WORKLOAD_INFO = "workload.json"
+
+
+def load_pipeline():
+    """加载主程序模块（文件名含"."，不能直接 import）"""
+    path = os.path.join(REPO_DIR, "国补登记_V_1.0.py")
+    spec = importlib.util.spec_from_file_location("guobu_pipeline", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["guobu_pipeline"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def prepare_workload(rows, seed):
+    """生成（或复用已生成的）指定行数的模拟数据，返回数据目录"""
+    data_dir = os.path.join(BENCHMARK_DIR, f"数据_{rows}_{seed}")
+    info_path = os.path.join(data_dir, WORKLOAD_INFO)
+    if os.path.exists(info_path):
+        return data_dir
+    print(f"🔧 生成 {rows} 行模拟数据...")
+    summary = generate_workload(data_dir, rows=rows, seed=seed)
+    with open(info_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1)
+    return data_dir
+
+
+def _timed(func, *args, **kwargs):
+    """执行一次并计时，被测函数的输出不打印"""
+    with open(os.devnull, "w", encoding="utf-8") as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        return time.perf_counter() - start
+
+
+def _measure(results, stage, rows, workers, repeat, func, *args, **kwargs):
+    """重复 repeat 次取最短耗时，记入 results"""
+    best = min(_timed(func, *args, **kwargs) for _ in range(repeat))
+    record = {
+        "stage": stage,
+        "rows": rows,
+        "workers": workers,
+        "seconds": round(best, 4),
+        "rows_per_second": round(rows / best) if best > 0 else None,
+        "peak_rss_mb": perf_metrics.peak_rss_mb(),
+    }
+    results.append(record)
+    print(f"   {stage:<32} 并行数 {workers:>2}  {record['seconds']:>9.3f}秒  {record['rows_per_second'] or '-':>10} 行/秒")
+
+
+def run_size(pipeline, rows, seed, workers_list, process_workers, repeat):
+    """
+    在一档数据量上依次测试所有函数（按流程顺序，后一个函数使用前一个的输出）
+    workers_list 为二次登记提速的线程数，process_workers 为前三个函数的进程数
+    """
+    import 国补二次登记
+    import 二次登记提速
+
+    data_dir = prepare_workload(rows, seed)
+    results = []
+    cwd = os.getcwd()
+    os.chdir(data_dir)
+    try:
+        douyin_path = f"{INTERMEDIATE_DIR}/抖音订单合并结果.feather"
+        wangdian_path = f"{INTERMEDIATE_DIR}/网店单号汇总表.feather"
+        guobu_path = f"{INTERMEDIATE_DIR}/国补登记结果_未匹配名称.feather"
+        matched_path = f"{INTERMEDIATE_DIR}/国补登记结果_未处理.feather"
+        dianzi_path = f"{INTERMEDIATE_DIR}/垫资款结果_未处理.xlsx"
+
+        print(f"\n📊 数据量：{rows} 行（{data_dir}）")
+        for workers in process_workers:
+            _measure(results, "batch_process_excel", rows, workers, repeat,
+                     pipeline.batch_process_excel, "3c商品名表格", cache_dir=None, max_workers=workers)
+        for workers in process_workers:
+            _measure(results, "merge_excel_by_batch", rows, workers, repeat,
+                     pipeline.merge_excel_by_batch, "抖音表格", "sku单号", output_path=douyin_path, max_workers=workers)
+        for workers in process_workers:
+            _measure(results, "create_guobu_table", rows, workers, repeat,
+                     pipeline.create_guobu_table, douyin_path, guobu_path, max_workers=workers)
+        _measure(results, "fill_3c_name", rows, 1, repeat, pipeline.fill_3c_name, guobu_path, wangdian_path)
+
+        def match_names():
+            # 每次从空的商品名缓存开始、不使用匹配结果缓存，避免上一次的缓存影响结果
+            pipeline.parse_product_name.cache_clear()
+            pipeline.count_unique_shops_with_sheet(guobu_path, "企业库存数量.xlsx", matched_path, cache_path=None)
+
+        _measure(results, "count_unique_shops_with_sheet", rows, 1, repeat, match_names)
+        _measure(results, "document_file", rows, 1, repeat, pipeline.document_file, matched_path, "国补登记结果.xlsx")
+
+        # 二次登记：表1为步骤3生成的垫资款，表2为第一个店铺的国补表 sheet（读取不计时）
+        df1 = read_sheet(dianzi_path)
+        df2 = read_merged_sheet("国补表.xlsx", sheet_name=SHOPS[0][3], header=1)
+        _measure(results, "国补二次登记", rows, 1, repeat,
+                 lambda: 国补二次登记.register_and_save(df1.copy(), df2.copy(), "垫资款_已标记.xlsx",
+                                                     "国补_已更新.xlsx", verbose=False))
+        for workers in workers_list:
+            _measure(results, "二次登记提速", rows, workers, repeat,
+                     lambda: 二次登记提速.register_and_save(df1.copy(), df2.copy(), "垫资款_已标记.xlsx",
+                                                         "国补_已更新.xlsx", "国补_已合并.xlsx", max_threads=workers))
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def size_scaling(results):
+    """单并行数下相邻两档数据量之间的增长阶数：log(耗时比)/log(行数比)"""
+    table = []
+    for stage in dict.fromkeys(r["stage"] for r in results):
+        base_workers = min(r["workers"] for r in results if r["stage"] == stage)
+        runs = sorted((r for r in results if r["stage"] == stage and r["workers"] == base_workers),
+                      key=lambda r: r["rows"])
+        for small, large in zip(runs, runs[1:]):
+            if small["seconds"] > 0 and large["rows"] > small["rows"]:
+                order = math.log(large["seconds"] / small["seconds"]) / math.log(large["rows"] / small["rows"])
+                table.append({"stage": stage, "from_rows": small["rows"], "to_rows": large["rows"],
+                              "order": round(order, 2)})
+    return table
+
+
+def core_scaling(results):
+    """可并行的函数在每档数据量下相对最少并行数的加速比"""
+    table = []
+    for stage in dict.fromkeys(r["stage"] for r in results):
+        for rows in sorted({r["rows"] for r in results if r["stage"] == stage}):
+            runs = sorted((r for r in results if r["stage"] == stage and r["rows"] == rows), key=lambda r: r["workers"])
+            if len(runs) < 2:
+                continue
+            base = runs[0]
+            for run in runs[1:]:
+                table.append({"stage": stage, "rows": rows, "workers": run["workers"],
+                              "speedup": round(base["seconds"] / run["seconds"], 2) if run["seconds"] > 0 else None})
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="国补登记各处理函数的基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="抖店导出行数（可多个）")
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="并行数（默认 1 和 CPU 核心数）")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取最短耗时")
+    parser.add_argument("--seed", type=int, default=0, help="模拟数据的随机种子")
+    args = parser.parse_args()
+
+    workers_list = sorted(set(args.workers or [1, os.cpu_count() or 1]))
+    process_workers = workers_list
+    if max(workers_list) > 1:
+        if "fork" in multiprocessing.get_all_start_methods():
+            # 主程序模块通过文件路径加载，子进程需要继承而不是重新导入
+            multiprocessing.set_start_method("fork", force=True)
+        else:
+            process_workers = [min(workers_list)]
+            print("⚠️ 当前系统不支持 fork，前三个函数只测单进程，并行数只作用于二次登记提速（线程）")
+
+    perf_metrics.set_verbosity(0)
+    pipeline = load_pipeline()
+    started_at = datetime.now()
+    results = []
+    for rows in sorted(args.sizes):
+        results.extend(run_size(pipeline, rows, args.seed, workers_list, process_workers, args.repeat))
+
+    by_size = size_scaling(results)
+    by_core = core_scaling(results)
+    print("\n📈 随数据量的增长阶数（1≈线性）：")
+    for row in by_size:
+        print(f"   {row['stage']:<32} {row['from_rows']:>8} → {row['to_rows']:<8} {row['order']}")
+    if by_core:
+        print("\n🚀 随并行数的加速比：")
+        for row in by_core:
+            print(f"   {row['stage']:<32} {row['rows']:>8} 行  并行数 {row['workers']:>2}  ×{row['speedup']}")
+
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    report_path = os.path.join(BENCHMARK_DIR, f"基准测试结果_{started_at.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "cpu_count": os.cpu_count(),
+            "sizes": sorted(args.sizes),
+            "workers": workers_list,
+            "process_workers": process_workers,
+            "repeat": args.repeat,
+            "results": results,
+            "size_scaling": by_size,
+            "core_scaling": by_core,
+        }, f, ensure_ascii=False, indent=1)
+    print(f"\n💾 基准测试结果已保存至：{report_path}")
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
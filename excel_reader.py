@@ -0,0 +1,351 @@
+"""
+统一的表格读取入口
+
+三个脚本的读表都经过这里：每个文件只解析一次，所有单元格按原值读取（dtype=object），
+长数字的 sku单号、带 ¥ 的金额等文本保持不变。
+
+解析后端可切换：
+    openpyxl  —— pandas 默认引擎（默认）
+    calamine  —— 基于 Rust 的只读引擎，速度快数倍，需要 pip install python-calamine
+数据量很大时用 iter_sheet_chunks 按行分块读取，内存占用与块大小成正比。
+只需要表头时用 read_header，以只读模式流式读取表头所在的那一行，不解析后面的数据。
+含合并单元格的表（如国补表）用 read_merged_sheet，合并区域内的单元格都取左上角的值。
+"""
+import io
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils import range_boundaries
+from pandas.io.parsers import TextParser
+
+BACKENDS = ("openpyxl", "calamine")
+_default_backend = "openpyxl"
+_calamine_warned = False
+
+
+def set_default_backend(backend):
+    """设置默认解析后端（openpyxl / calamine）"""
+    global _default_backend
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的解析后端: {backend}，可选：{', '.join(BACKENDS)}")
+    _default_backend = backend
+
+
+def get_default_backend():
+    return _default_backend
+
+
+def _is_openpyxl_format(path):
+    return str(path).lower().endswith((".xlsx", ".xlsm"))
+
+
+def _resolve_engine(path, backend):
+    """根据后端和文件格式确定 pandas 引擎，calamine 未安装时退回 openpyxl"""
+    global _calamine_warned
+    backend = backend or _default_backend
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的解析后端: {backend}，可选：{', '.join(BACKENDS)}")
+    if backend == "calamine":
+        try:
+            import python_calamine  # noqa: F401
+            return "calamine"
+        except ImportError:
+            if not _calamine_warned:
+                print("⚠️ 未安装 python-calamine，改用 openpyxl 解析")
+                _calamine_warned = True
+    # .xls 等旧格式交给 pandas 自动选择引擎
+    return "openpyxl" if _is_openpyxl_format(path) else None
+
+
+def check_columns(columns, required_columns, source=""):
+    """校验必要字段，缺少时抛出 ValueError"""
+    missing = [c for c in required_columns if c not in columns]
+    if missing:
+        prefix = f"{source} " if source else ""
+        raise ValueError(f"{prefix}缺少必要字段: {', '.join(missing)}")
+
+
+def read_sheet(path, sheet_name=0, header=0, usecols=None, nrows=None,
+               required_columns=None, backend=None):
+    """
+    读取工作表，所有单元格保持原值（dtype=object）
+
+    参数:
+        path: 表格路径
+        sheet_name: 工作表名或序号，传列表/None 时返回 {sheet名: DataFrame}
+        header: 表头所在行（从0开始）
+        usecols / nrows: 同 pandas.read_excel
+        required_columns: 必要字段列表，读取后立即校验
+        backend: 解析后端，None 使用默认后端
+    """
+    df = pd.read_excel(
+        path,
+        sheet_name=sheet_name,
+        header=header,
+        usecols=usecols,
+        nrows=nrows,
+        dtype=object,
+        engine=_resolve_engine(path, backend),
+    )
+    if required_columns:
+        frames = df.values() if isinstance(df, dict) else [df]
+        for frame in frames:
+            check_columns(frame.columns, required_columns)
+    return df
+
+
+def _convert_cell(cell):
+    """与 pandas 的 openpyxl 引擎一致：空单元格为 ""，错误值为 NaN，整数值的小数转为整数"""
+    if cell.value is None:
+        return ""
+    if cell.data_type == "e":
+        return np.nan
+    if cell.data_type == "n":
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+
+def _parse_rows(rows, names=None):
+    """按 read_sheet 相同的规则（空值识别、重复列名加 .1 后缀）把转换后的行解析为 DataFrame"""
+    if names is None:
+        return TextParser(rows, header=0, dtype=object, skip_blank_lines=False).read()
+    return TextParser(rows, header=None, names=names, dtype=object, skip_blank_lines=False).read()
+
+
+def iter_sheet_chunks(path, chunk_rows=50000, sheet_name=0):
+    """
+    按行分块读取工作表（表头在第1行），逐块返回 DataFrame，每块的内容与 read_sheet 读取结果的对应行一致
+
+    xlsx 以只读模式流式读取，同一时间只有一块数据在内存中；其他格式整表读取后再分块。
+    列以表头为准，超出表头宽度的单元格不读取。末尾的空行与 read_sheet 一样丢弃。
+    """
+    if not _is_openpyxl_format(path):
+        df = read_sheet(path, sheet_name=sheet_name)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].reset_index(drop=True)
+        return
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        # 不依赖文件中记录的尺寸（部分程序生成的文件尺寸不准）
+        ws.reset_dimensions()
+        names = None
+        width = 0
+        rows = []
+        blank_rows = 0  # 连续空行，后面还有数据时才保留
+        for cells in ws.rows:
+            row = [_convert_cell(cell) for cell in cells]
+            while row and row[-1] == "":
+                row.pop()
+            if names is None:
+                if not row:
+                    continue
+                header = _parse_rows([row])
+                names = list(header.columns)
+                width = len(names)
+                continue
+            if not row:
+                blank_rows += 1
+                continue
+            rows.extend([[""] * width] * blank_rows)
+            blank_rows = 0
+            rows.append((row + [""] * width)[:width])
+            if len(rows) >= chunk_rows:
+                yield _parse_rows(rows, names)
+                rows = []
+        if rows:
+            yield _parse_rows(rows, names)
+    finally:
+        wb.close()
+
+
+def read_sheets(path, sheet_names, header=0, usecols=None, required_columns=None, backend=None):
+    """
+    打开一次工作簿，依次读取多个工作表（各 sheet 的错误互不影响）
+
+    返回:
+        ({sheet名: DataFrame}, {sheet名: 错误信息})
+    """
+    frames = {}
+    errors = {}
+    with pd.ExcelFile(path, engine=_resolve_engine(path, backend)) as book:
+        available = set(book.sheet_names)
+        for name in sheet_names:
+            if name not in available:
+                errors[name] = f"Worksheet named '{name}' not found"
+                continue
+            try:
+                df = book.parse(name, header=header, usecols=usecols, dtype=object)
+                if required_columns:
+                    check_columns(df.columns, required_columns)
+                frames[name] = df
+            except Exception as e:
+                errors[name] = str(e)
+    return frames, errors
+
+
+_SHEET_DATA_START = re.compile(rb"<(?:\w+:)?sheetData[\s/>]")
+_SHEET_DATA_END = re.compile(rb"</(?:\w+:)?sheetData>|<(?:\w+:)?sheetData\s*/>")
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def sheet_members(book):
+    """xlsx（已打开的 zipfile.ZipFile）中 sheet 名 → 对应的 XML 成员路径（读取 workbook.xml 及其关系文件）"""
+    targets = {}
+    for rel in ET.fromstring(book.read("xl/_rels/workbook.xml.rels")):
+        target = rel.get("Target", "")
+        member = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = member
+    members = {}
+    for element in ET.fromstring(book.read("xl/workbook.xml")).iter():
+        if _local_name(element.tag) != "sheet":
+            continue
+        rel_id = next((v for k, v in element.attrib.items() if _local_name(k) == "id"), None)
+        if rel_id in targets:
+            members[element.get("name")] = targets[rel_id]
+    return members
+
+
+def _scan_merged_ranges(source, chunk_size=1024 * 1024):
+    """
+    流式读取工作表 XML，解析 sheetData 以外的部分，取出其中 <mergeCell> 的 ref 属性
+    （单元格数据在 sheetData 中，按字节跳过不解析；其余部分保留开头的 <worksheet> 及命名空间声明，
+    拼成完整的 XML 后用 iterparse 按元素读取属性，不依赖属性的顺序和引号）
+    返回 [(min_col, min_row, max_col, max_row)]
+    """
+    head = None
+    tail = []
+    buffer = b""
+    found = False
+    for chunk in iter(lambda: source.read(chunk_size), b""):
+        if found:
+            tail.append(chunk)
+            continue
+        buffer += chunk
+        if head is None:
+            match = _SHEET_DATA_START.search(buffer)
+            if not match:
+                continue
+            head = buffer[:match.start()]
+            buffer = buffer[match.start():]
+        match = _SHEET_DATA_END.search(buffer)
+        if match:
+            found = True
+            tail.append(buffer[match.end():])
+        else:
+            buffer = buffer[-64:]
+    if head is None:
+        head = buffer
+
+    ranges = []
+    for _, element in ET.iterparse(io.BytesIO(head + b"".join(tail)), events=("end",)):
+        if _local_name(element.tag) == "mergeCell" and element.get("ref"):
+            ranges.append(range_boundaries(element.get("ref")))
+    return ranges
+
+
+def _merged_frame(ws, header, source):
+    """把只读模式的工作表读成 DataFrame，合并区域（从 source，即该 sheet 的 XML 成员中读取）整块填入左上角的值"""
+    try:
+        merged_ranges = _scan_merged_ranges(source)
+    finally:
+        source.close()
+    # 不依赖文件中记录的尺寸（部分程序生成的文件尺寸不准）
+    ws.reset_dimensions()
+    rows = [row for row in ws.iter_rows(values_only=True)]
+
+    width = max([len(row) for row in rows] + [bounds[2] for bounds in merged_ranges] + [1])
+    height = max([len(rows)] + [bounds[3] for bounds in merged_ranges] + [header + 1])
+    grid = np.full((height, width), None, dtype=object)
+    for i, row in enumerate(rows):
+        grid[i, :len(row)] = row
+    for min_col, min_row, max_col, max_row in merged_ranges:
+        grid[min_row - 1:max_row, min_col - 1:max_col] = grid[min_row - 1, min_col - 1]
+
+    return pd.DataFrame(grid[header + 1:], columns=list(grid[header]), dtype=object)
+
+
+def read_merged_sheet(path, sheet_name=0, header=0):
+    """
+    读取含合并单元格的工作表：合并区域内所有单元格都填入左上角的值，所有单元格保持原值（dtype=object）
+
+    只以只读模式流式读取指定的工作表，合并区域从工作表 XML 中直接读取，
+    在内存中的二维数组上按区域整块填充，不修改、不保存工作簿。
+
+    参数:
+        path: 表格路径（xlsx）
+        sheet_name: 工作表名或序号
+        header: 表头所在行（从0开始），其后的行为数据
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        with zipfile.ZipFile(path) as book:
+            return _merged_frame(ws, header, book.open(sheet_members(book)[ws.title]))
+    finally:
+        wb.close()
+
+
+def read_merged_sheets(path, sheet_names, header=0):
+    """
+    打开一次工作簿，按 read_merged_sheet 的方式读取多个工作表（各 sheet 的错误互不影响）
+
+    返回:
+        ({sheet名: DataFrame}, {sheet名: 错误信息})
+    """
+    frames = {}
+    errors = {}
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        with zipfile.ZipFile(path) as book:
+            members = sheet_members(book)
+            for name in sheet_names:
+                if name not in wb.sheetnames:
+                    errors[name] = f"Worksheet named '{name}' not found"
+                    continue
+                try:
+                    frames[name] = _merged_frame(wb[name], header, book.open(members[name]))
+                except Exception as e:
+                    errors[name] = str(e)
+    finally:
+        wb.close()
+    return frames, errors
+
+
+def read_header(path, sheet_name=0, header=0):
+    """只读取表头行，返回列名列表（xlsx 以只读模式流式读取，不解析数据行）"""
+    if not _is_openpyxl_format(path):
+        return list(pd.read_excel(path, sheet_name=sheet_name, header=header, nrows=0).columns)
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        names = []
+        for row in ws.iter_rows(min_row=header + 1, max_row=header + 1, values_only=True):
+            names = list(row)
+        while names and names[-1] is None:
+            names.pop()
+        return names
+    finally:
+        wb.close()
+
+
+def list_sheets(path):
+    """返回工作簿中的工作表名列表（不解析单元格）"""
+    if not _is_openpyxl_format(path):
+        return pd.ExcelFile(path).sheet_names
+    wb = load_workbook(path, read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
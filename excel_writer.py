@@ -0,0 +1,215 @@
+"""
+统一的表格写出入口
+
+使用 openpyxl 的只写（流式）模式逐行写出，不在内存中保留整张工作表。
+需要保持文本格式的列（如 sku单号）在写出前声明，写单元格时直接带上"@"格式，
+不再在 to_excel 之后重新打开文件逐行设置。表头样式、时间格式默认与 pandas.to_excel 一致，
+原来直接用 openpyxl 的 Workbook 写出的表格可选择 openpyxl 的默认样式（表头无样式、时间值用 openpyxl 的默认格式）。
+需要合并连续相同值的单元格时，先用 run_length_merges 在 DataFrame 上算出合并区域，
+写出时一并登记，不再写出后重新打开文件合并。
+"""
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+
+TEXT_FORMAT = "@"
+# 与 pandas.to_excel 默认格式一致
+DATETIME_FORMAT = "YYYY-MM-DD HH:MM:SS"
+DATE_FORMAT = "YYYY-MM-DD"
+_THIN = Side(style="thin")
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+MERGED_ALIGNMENT = Alignment(horizontal="center", vertical="center")
+
+# 这些推断类型的列不会含时间值，整列按原值写出
+_PLAIN_TYPES = ("string", "empty", "integer", "floating", "mixed-integer-float", "boolean", "decimal")
+
+
+def _column_values(series):
+    """把一列转换为可直接写入的 Python 值数组（空值统一为 None）"""
+    values = series.to_numpy(dtype=object)
+    missing = pd.isna(values)
+    if missing.any():
+        values = values.copy()
+        values[missing] = None
+    return values
+
+
+def _may_contain_dates(series):
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return True
+    if series.dtype != object:
+        return False
+    return pd.api.types.infer_dtype(series, skipna=True) not in _PLAIN_TYPES
+
+
+def _styled_cell(ws, value, text, openpyxl_defaults=False):
+    """需要单独设置格式的单元格：文本列设为"@"，时间值设为时间格式（openpyxl_defaults 时由 openpyxl 决定），其余原样返回"""
+    if text:
+        number_format = TEXT_FORMAT
+    elif openpyxl_defaults:
+        return value
+    elif isinstance(value, datetime):
+        number_format = DATETIME_FORMAT
+    elif isinstance(value, date):
+        number_format = DATE_FORMAT
+    else:
+        return value
+    cell = WriteOnlyCell(ws, value=value)
+    cell.number_format = number_format
+    return cell
+
+
+def _header_row(ws, columns, text_flags, openpyxl_defaults=False):
+    row = []
+    for name, text in zip(columns, text_flags):
+        cell = WriteOnlyCell(ws, value=name)
+        if not openpyxl_defaults:
+            cell.font = HEADER_FONT
+            cell.border = HEADER_BORDER
+            cell.alignment = HEADER_ALIGNMENT
+        if text:
+            cell.number_format = TEXT_FORMAT
+        row.append(cell)
+    return row
+
+
+def _write_sheet(ws, df, text_columns, merged_ranges, openpyxl_defaults=False):
+    columns = list(df.columns)
+    text_flags = [name in text_columns for name in columns]
+    ws.append(_header_row(ws, columns, text_flags, openpyxl_defaults))
+    if not columns:
+        return
+    _write_rows(ws, df, text_flags, merged_ranges, openpyxl_defaults=openpyxl_defaults)
+
+
+def _write_rows(ws, df, text_flags, merged_ranges=None, first_row=2, openpyxl_defaults=False):
+    """写出数据行，first_row 为 df 第一行所在的 Excel 行号"""
+    columns = list(df.columns)
+    values = [_column_values(df.iloc[:, i]) for i in range(len(columns))]
+    if openpyxl_defaults:
+        # 时间值原样写出，由 openpyxl 设为默认的时间格式
+        styled = [i for i in range(len(columns)) if text_flags[i]]
+    else:
+        styled = [i for i in range(len(columns)) if text_flags[i] or _may_contain_dates(df.iloc[:, i])]
+
+    # 合并区域在写出前登记：左上角的单元格写出时直接设为居中，区域内其余单元格写为空（与 merge_cells 一致）
+    merge_starts = {}
+    merge_covered = {}
+    for col_name, start_row, end_row in merged_ranges or []:
+        col_idx = columns.index(col_name)
+        letter = get_column_letter(col_idx + 1)
+        ws.merged_cells.add(f"{letter}{start_row}:{letter}{end_row}")
+        merge_starts.setdefault(start_row, []).append(col_idx)
+        for covered_row in range(start_row + 1, end_row + 1):
+            merge_covered.setdefault(covered_row, []).append(col_idx)
+
+    if not styled and not merge_starts:
+        for row in zip(*values):
+            ws.append(row)
+        return
+
+    for row_number, row in enumerate(zip(*values), start=first_row):
+        row = list(row)
+        for i in styled:
+            row[i] = _styled_cell(ws, row[i], text_flags[i], openpyxl_defaults)
+        for i in merge_starts.get(row_number, ()):
+            cell = row[i] if isinstance(row[i], Cell) else WriteOnlyCell(ws, value=row[i])
+            cell.alignment = MERGED_ALIGNMENT
+            row[i] = cell
+        for i in merge_covered.get(row_number, ()):
+            row[i] = None
+        ws.append(row)
+
+
+def run_length_merges(keys, columns, skip_na=True, min_rows=2, first_row=2):
+    """
+    按 keys 中连续相同的值计算合并区域
+
+    参数:
+        keys: 判断是否连续相同的列（如"账单批次"）
+        columns: 按相同行数合并的列名列表（可包含 keys 本身）
+        skip_na: 空值组成的连续区域是否跳过
+        min_rows: 至少多少行才合并
+        first_row: keys 第一个值所在的 Excel 行号（表头为第1行时为2）
+    返回:
+        [(列名, 起始行, 结束行)]，可直接作为 write_excel 的 merged_cells
+    """
+    codes = pd.factorize(pd.Series(keys, dtype=object), use_na_sentinel=True)[0]
+    if len(codes) == 0:
+        return []
+    boundaries = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(codes)])) - 1
+    keep = ends - starts + 1 >= min_rows
+    if skip_na:
+        keep &= codes[starts] != -1
+    ranges = []
+    for start, end in zip(starts[keep] + first_row, ends[keep] + first_row):
+        for col in columns:
+            ranges.append((col, int(start), int(end)))
+    return ranges
+
+
+@contextmanager
+def excel_sheet_stream(path, sheet_name, text_columns=("sku单号",)):
+    """
+    分块写出单个工作表：with 块中得到 append(df)，每次调用把 df 的行接在已写出的行后面，
+    第一次调用时写出表头（以后各块的列须与第一块一致）。
+    写出的内容与把所有块合并后调用 write_excel 相同，块写出后即可释放。
+
+    用法:
+        with excel_sheet_stream("垫资款结果.xlsx", "垫资款") as append:
+            for chunk in chunks:
+                append(chunk)
+    """
+    text_columns = set(text_columns or ())
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name)
+    state = {"columns": None, "next_row": 2}
+
+    def append(df):
+        columns = list(df.columns)
+        if state["columns"] is None:
+            state["columns"] = columns
+            state["text_flags"] = [name in text_columns for name in columns]
+            ws.append(_header_row(ws, columns, state["text_flags"]))
+        elif columns != state["columns"]:
+            raise ValueError(f"工作表 {sheet_name} 分块写出时列不一致")
+        if columns and len(df):
+            _write_rows(ws, df, state["text_flags"], first_row=state["next_row"])
+        state["next_row"] += len(df)
+
+    yield append
+    wb.save(path)
+
+
+def write_excel(path, sheets, text_columns=("sku单号",), merged_cells=None, openpyxl_defaults=False):
+    """
+    流式写出一个或多个工作表
+
+    参数:
+        path: 输出路径
+        sheets: {工作表名: DataFrame}，按顺序写出
+        text_columns: 需要设为文本格式（@）的列名，默认 sku单号
+        merged_cells: {工作表名: [(列名, 起始行, 结束行), ...]}，行号为 Excel 行号（表头为第1行）
+        openpyxl_defaults: 为 True 时表头不加样式、时间值使用 openpyxl 的默认格式（yyyy-mm-dd h:mm:ss），
+                           与原来直接用 openpyxl 的 Workbook 写出的表格一致
+    返回:
+        输出路径
+    """
+    text_columns = set(text_columns or ())
+    merged_cells = merged_cells or {}
+    wb = Workbook(write_only=True)
+    for sheet_name, df in sheets.items():
+        ws = wb.create_sheet(title=sheet_name)
+        _write_sheet(ws, df, text_columns, merged_cells.get(sheet_name), openpyxl_defaults)
+    wb.save(path)
+    return path
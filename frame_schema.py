@@ -0,0 +1,130 @@
+"""
+按字段约定的内存类型
+
+读表时所有单元格都按原值（dtype=object）读取，每个单元格都是一个 Python 对象；
+店铺主体、账单批次、行类型、来源文件等每行重复的文本因此各占一份字符串，合并后的抖音表格内存占用很大。
+这里按字段名约定更紧凑的类型，只在转换不丢失原始内容时才转换：
+
+    分类（category）  低基数文本（店铺主体、账单批次、行类型、来源文件、二次登记状态等），整列都是文本时转换
+    文本（string）    sku单号、网店单号等长数字文本，整列都是文本时按字符串精确保存（有 pyarrow 时用 Arrow 存储）
+    数值（number）    金额列，整列都是数字（不含 ¥ 等文本）时转为整数或小数
+
+转换后写出 xlsx 或列式中间文件时内容与原来一致：分类和文本列写出原来的字符串，
+整数列仍为整数，缺失值仍为空单元格。不在约定中的字段保持原样。
+"""
+import pandas as pd
+
+CATEGORY = "category"
+TEXT = "text"
+NUMBER = "number"
+
+MONEY_COLUMNS = [
+    "订单应付金额（元）", "政府补贴（元）", "店铺补贴（元）", "自营补贴（元）", "分账金额（元）", "服务费用（元）",
+    "平台折扣（元）", "订单实付（元）", "采购折扣金额（元）", "采购成本（元）", "结算金额（元）", "订单金额",
+]
+
+COLUMN_TYPES = {
+    "店铺主体": CATEGORY,
+    "店铺名": CATEGORY,
+    "账单批次": CATEGORY,
+    "行类型": CATEGORY,
+    "来源文件": CATEGORY,
+    "来源路径": CATEGORY,
+    "二次登记状态": CATEGORY,
+    "费用项名称": CATEGORY,
+    "商品一级类目": CATEGORY,
+    "商品信息": CATEGORY,
+    "商品信息.1": CATEGORY,
+    "采购折扣比例": CATEGORY,
+    "3c商品名称": CATEGORY,
+    "sku单号": TEXT,
+    "网店单号": TEXT,
+    "网店单号-去后缀": TEXT,
+    "税率": NUMBER,
+    **{name: NUMBER for name in MONEY_COLUMNS},
+}
+
+try:
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = pd.StringDtype("pyarrow")
+except ImportError:
+    TEXT_DTYPE = pd.StringDtype()
+
+_TEXT_KINDS = ("string", "empty")
+
+
+def _to_category(series):
+    if series.dtype != object or pd.api.types.infer_dtype(series, skipna=True) not in _TEXT_KINDS:
+        return series
+    return series.astype("category")
+
+
+def _to_text(series):
+    if isinstance(series.dtype, pd.StringDtype):
+        # 列式中间文件读回的字符串列为 Python 存储，统一为 TEXT_DTYPE
+        return series if series.dtype == TEXT_DTYPE else series.astype(TEXT_DTYPE)
+    if series.dtype != object or pd.api.types.infer_dtype(series, skipna=True) not in _TEXT_KINDS:
+        return series
+    return series.astype(TEXT_DTYPE)
+
+
+def _to_number(series):
+    if series.dtype != object:
+        return series
+    kind = pd.api.types.infer_dtype(series, skipna=True)
+    if kind == "integer":
+        return series.astype("Int64")
+    if kind in ("floating", "mixed-integer-float"):
+        return series.astype("float64")
+    return series
+
+
+_CONVERTERS = {CATEGORY: _to_category, TEXT: _to_text, NUMBER: _to_number}
+
+
+def apply_schema(df, column_types=None):
+    """
+    按字段约定转换列类型（在原 DataFrame 上修改并返回）
+
+    参数:
+        column_types: {字段名: CATEGORY / TEXT / NUMBER}，None 使用 COLUMN_TYPES
+    """
+    column_types = COLUMN_TYPES if column_types is None else column_types
+    # 列名重复时（如两列"商品信息"）按位置转换
+    for i, name in enumerate(df.columns):
+        kind = column_types.get(name)
+        if kind is None:
+            continue
+        column = df.iloc[:, i]
+        converted = _CONVERTERS[kind](column)
+        if converted is not column:
+            df.isetitem(i, converted)
+    return df
+
+
+def concat_frames(frames):
+    """
+    合并多个已转换类型的 DataFrame，同名分类列先统一类别再合并（否则 pandas 会退回 object），
+    合并后再按约定转换一次
+    """
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return pd.DataFrame()
+    for name in dict.fromkeys(n for f in frames for n in f.columns):
+        holders = [f for f in frames if name in f.columns and not isinstance(f[name], pd.DataFrame)]
+        categorical = [isinstance(f[name].dtype, pd.CategoricalDtype) for f in holders]
+        if not any(categorical):
+            continue
+        if all(categorical):
+            categories = sorted(set().union(*(f[name].cat.categories for f in holders)))
+            for f in holders:
+                f[name] = f[name].cat.set_categories(categories)
+        else:
+            for f in holders:
+                f[name] = f[name].astype(object)
+    return apply_schema(pd.concat(frames, ignore_index=True))
+
+
+def memory_mb(df):
+    """DataFrame 实际占用的内存（MB，含字符串对象）"""
+    return round(df.memory_usage(deep=True).sum() / (1024 * 1024), 1)
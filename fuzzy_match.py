@@ -0,0 +1,170 @@
+"""
+名称模糊匹配（--fuzzy）
+
+步骤4按 型号+内存+颜色 精确匹配，3c商品名和企业库存数量中的名称写法稍有不同（颜色多一个字、
+型号写法不同、多了品牌词等）就会落到"未匹配到该型号…"等状态，只能手工修改。
+模糊匹配只处理精确匹配未成功的行：
+
+    分块（blocking）  商品名中的型号在该 sheet 中存在时，候选只取该型号下的名称；否则把每个 sheet 的名称
+                     切成字符二元组，建立 二元组 → 名称 的倒排索引，商品名只和与它共享较少见二元组最多的
+                     少数候选名称比较，不与整张 sheet 逐一比较
+    排除              内存不同、版本（柔光版、Pro版等）不同、颜色（最后一个词）明显不同的候选直接排除
+    打分              名称中颜色、型号、内存以外部分的二元组 Dice 系数与颜色相似度加权
+    置信度            得分即置信度（0～1），不低于阈值且与次优候选拉开差距时才采用
+
+同一 (sheet, 商品名) 只匹配一次，10万行的月份中未匹配的行通常只有几百种不同的商品名。
+"""
+import re
+from collections import Counter
+
+from spec_index import normalize_memory, NON_STANDARD_VERSIONS
+
+# 采用模糊匹配结果的最低置信度
+MIN_CONFIDENCE = 0.8
+# 最优与次优候选的置信度差距小于该值时视为无法区分，不采用
+MIN_MARGIN = 0.02
+# 每个商品名最多打分的候选数
+MAX_CANDIDATES = 20
+# 出现在超过该比例名称中的二元组不参与分块（如"GB"、"+"等）
+COMMON_GRAM_RATIO = 0.2
+# 颜色相似度低于该值的候选排除，颜色在得分中的权重
+MIN_COLOR_SIMILARITY = 0.5
+COLOR_WEIGHT = 0.25
+# 标准版在企业库存名称中通常省略，不参与打分
+IMPLICIT_WORDS = ("标准版",)
+
+_MEMORY = re.compile(r'\d+GB\+\d+GB')
+_TOKEN = re.compile(r'[\s,，/()（）\[\]【】]+')
+
+
+def _tokens(text):
+    return [t for t in _TOKEN.split(normalize_memory(str(text)).lower()) if t]
+
+
+def _grams(tokens):
+    """每个词的字符二元组（单字词取该字），不跨词"""
+    grams = set()
+    for token in tokens:
+        if len(token) == 1:
+            grams.add(token)
+        else:
+            grams.update(token[i:i + 2] for i in range(len(token) - 1))
+    return grams
+
+
+def _dice(a, b):
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def _color_similarity(a, b):
+    if a == b:
+        return 1.0
+    return _dice(_grams([a]), _grams([b]))
+
+
+def _versions(text):
+    return frozenset(v for v in NON_STANDARD_VERSIONS if v in text)
+
+
+def _features(text, model=""):
+    """商品名/名称的特征；model 为型号时从词中去掉（型号单独比较）"""
+    skip = set(IMPLICIT_WORDS) | {str(model).lower()}
+    tokens = [t for t in _tokens(text) if t not in skip]
+    memory = _MEMORY.search(normalize_memory(str(text)))
+    # 内存单独比较，不参与二元组打分
+    words = [t for t in tokens[:-1] if not _MEMORY.fullmatch(t.upper())]
+    return {
+        "grams": _grams(words),
+        "memory": memory.group(0) if memory else "",
+        "color": tokens[-1] if tokens else "",
+        "versions": _versions(str(text)),
+    }
+
+
+def build_fuzzy_index(model_name_dict):
+    """
+    为一个 sheet 建立模糊匹配索引
+
+    参数:
+        model_name_dict: {规格型号: [名称...]}（generate_model_name_dict 的结果）
+    返回:
+        {"entries": [(名称, 规格型号, 特征)...], "postings": {二元组: [条目序号...]},
+         "models": {规格型号: [条目序号...]}, "limit": 分块用二元组的最大出现次数}
+    """
+    entries = []
+    postings = {}
+    models = {}
+    for model, names in model_name_dict.items():
+        for name in names:
+            if not isinstance(name, str) or not name.strip():
+                continue
+            features = _features(name)
+            for gram in features["grams"] | _grams([features["color"]]):
+                postings.setdefault(gram, []).append(len(entries))
+            models.setdefault(model, []).append(len(entries))
+            entries.append((name, model, features))
+    limit = max(MAX_CANDIDATES, int(len(entries) * COMMON_GRAM_RATIO))
+    return {"entries": entries, "postings": postings, "models": models, "limit": limit}
+
+
+def _candidates(index, grams):
+    """分块：按共享的少见二元组个数取前 MAX_CANDIDATES 个候选（含同分的）"""
+    postings = index["postings"]
+    known = [g for g in grams if g in postings]
+    rare = [g for g in known if len(postings[g]) <= index["limit"]]
+    if not rare:
+        # 所有二元组都很常见时退回到最少见的几个
+        rare = sorted(known, key=lambda g: len(postings[g]))[:3]
+    shared = Counter()
+    for gram in rare:
+        shared.update(postings[gram])
+    ranked = shared.most_common()
+    if len(ranked) <= MAX_CANDIDATES:
+        return [i for i, _ in ranked]
+    # 与第 MAX_CANDIDATES 个候选共享个数相同的一并保留，避免同分候选被随意截断
+    cutoff = ranked[MAX_CANDIDATES - 1][1]
+    return [i for i, count in ranked if count >= cutoff]
+
+
+def fuzzy_lookup(index, product_name, model=""):
+    """
+    为一个商品名模糊匹配名称
+
+    参数:
+        model: 从商品名中解析出的型号，在该 sheet 中存在时只在该型号下匹配
+    返回:
+        (名称, 规格型号, 置信度)；没有达到阈值或无法区分时名称、规格型号为 None，置信度为最优候选的得分
+    """
+    query = _features(product_name, model)
+    if model in index["models"]:
+        candidates = index["models"][model]
+    else:
+        candidates = _candidates(index, query["grams"] | _grams([query["color"]]))
+    scored = []
+    for i in candidates:
+        name, candidate_model, features = index["entries"][i]
+        if query["memory"] and features["memory"] and query["memory"] != features["memory"]:
+            continue
+        if query["versions"] != features["versions"]:
+            continue
+        color = _color_similarity(query["color"], features["color"])
+        if color < MIN_COLOR_SIMILARITY:
+            continue
+        score = (1 - COLOR_WEIGHT) * _dice(query["grams"], features["grams"]) + COLOR_WEIGHT * color
+        scored.append((score, name, candidate_model))
+    if not scored:
+        return None, None, 0.0
+    scored.sort(key=lambda item: -item[0])
+    best_score, best_name, best_model = scored[0]
+    for score, name, model in scored[1:]:
+        # 与最优候选只差空格的同名项不算竞争（企业库存中偶有重复录入）
+        if name.strip() == best_name.strip() and model == best_model:
+            continue
+        if best_score - score < MIN_MARGIN:
+            return None, None, round(best_score, 3)
+        break
+    if best_score < MIN_CONFIDENCE:
+        return None, None, round(best_score, 3)
+    return best_name, best_model, round(best_score, 3)
@@ -0,0 +1,228 @@
+"""
+中间文件列式存储
+
+各步骤之间的中间结果用 Arrow IPC（Feather v2）格式交换，不再经过 xlsx 的压缩/XML 解析。
+只有交付给人看的结果（国补登记结果.xlsx、垫资款结果.xlsx）才写成 xlsx。
+
+dtype=object 的列里一个单元格可能是字符串、整数、小数或时间，Arrow 的一列只能有一种类型，
+所以 object 列按"文本值 + 类型标记"两列存储，读回时按标记还原成原来的 Python 对象，
+长数字的 sku单号 等文本始终按原样保存，不会被转成数字。
+"""
+import os
+from contextlib import contextmanager
+from datetime import datetime, date, time as dt_time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from excel_reader import read_sheet
+
+STORE_SUFFIX = ".feather"
+TYPE_COLUMN_PREFIX = "__类型__"
+
+# object 列中每个单元格的原始类型标记
+TAG_NONE = 0
+TAG_STR = 1
+TAG_INT = 2
+TAG_FLOAT = 3
+TAG_BOOL = 4
+TAG_DATETIME = 5
+TAG_DATE = 6
+TAG_TIME = 7
+
+
+def is_store_path(path):
+    """判断路径是否为列式中间文件（按后缀区分，其余按 xlsx 处理）"""
+    return str(path).lower().endswith(STORE_SUFFIX)
+
+
+def _encode_value(value):
+    """把单个单元格转换为（文本值, 类型标记）"""
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None, TAG_NONE
+    if isinstance(value, str):
+        return value, TAG_STR
+    if isinstance(value, (bool, np.bool_)):
+        return ("1" if value else "0"), TAG_BOOL
+    if isinstance(value, (int, np.integer)):
+        return str(int(value)), TAG_INT
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return None, TAG_NONE
+        return repr(float(value)), TAG_FLOAT
+    if isinstance(value, datetime):
+        return value.isoformat(), TAG_DATETIME
+    if isinstance(value, date):
+        return value.isoformat(), TAG_DATE
+    if isinstance(value, dt_time):
+        return value.isoformat(), TAG_TIME
+    # 其他少见类型按文本保存
+    return str(value), TAG_STR
+
+
+def _encode_object_column(series):
+    """object 列 → (文本数组, 类型标记数组)"""
+    values = series.to_numpy(dtype=object)
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred in ("string", "empty"):
+        # 纯文本列（最常见）走向量化路径
+        missing = pd.isna(values)
+        texts = np.where(missing, None, values)
+        tags = np.where(missing, TAG_NONE, TAG_STR).astype(np.int8)
+        return texts, tags
+
+    texts = np.empty(len(values), dtype=object)
+    tags = np.empty(len(values), dtype=np.int8)
+    for i, value in enumerate(values):
+        texts[i], tags[i] = _encode_value(value)
+    return texts, tags
+
+
+def _decode_object_column(texts, tags):
+    """(文本数组, 类型标记数组) → object 列"""
+    result = np.empty(len(texts), dtype=object)
+    result[:] = None
+    converters = {
+        TAG_STR: None,
+        TAG_INT: int,
+        TAG_FLOAT: float,
+        TAG_BOOL: lambda s: s == "1",
+        TAG_DATETIME: datetime.fromisoformat,
+        TAG_DATE: date.fromisoformat,
+        TAG_TIME: dt_time.fromisoformat,
+    }
+    for tag in np.unique(tags):
+        if tag == TAG_NONE:
+            continue
+        positions = np.flatnonzero(tags == tag)
+        converter = converters[int(tag)]
+        if converter is None:
+            result[positions] = texts[positions]
+        else:
+            result[positions] = [converter(s) for s in texts[positions]]
+    return result
+
+
+def _frame_table(df):
+    """DataFrame → Arrow 表（object 列按"文本值 + 类型标记"两列存储）"""
+    df = df.reset_index(drop=True)
+    object_names = [name for name in df.columns if df[name].dtype == object]
+    # 非 object 列（数值、时间、分类等）直接交给 Arrow，并保留 pandas 的类型信息
+    native = pa.Table.from_pandas(df.drop(columns=object_names), preserve_index=False)
+    arrays = list(native.columns)
+    names = list(native.column_names)
+    for name in object_names:
+        texts, tags = _encode_object_column(df[name])
+        arrays += [pa.array(texts, type=pa.large_string()), pa.array(tags, type=pa.int8())]
+        names += [name, f"{TYPE_COLUMN_PREFIX}{name}"]
+    metadata = {
+        **(native.schema.metadata or {}),
+        b"column_order": "\x1f".join(map(str, df.columns)).encode("utf-8"),
+    }
+    return pa.Table.from_arrays(arrays, names=names, metadata=metadata)
+
+
+def save_frame(df, path):
+    """把 DataFrame 保存为列式中间文件，返回保存路径"""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    feather.write_feather(_frame_table(df), path)
+    return path
+
+
+def frame_to_bytes(df):
+    """把 DataFrame 按列式中间文件的格式编码为字节串（用于存入数据库等）"""
+    sink = pa.BufferOutputStream()
+    feather.write_feather(_frame_table(df), sink)
+    return sink.getvalue().to_pybytes()
+
+
+def frame_from_bytes(data):
+    """frame_to_bytes 的逆操作"""
+    return _table_frame(feather.read_table(pa.BufferReader(data)))
+
+
+@contextmanager
+def frame_stream(path):
+    """
+    分块写出列式中间文件：with 块中得到 append(df)，每块追加为一个记录批次，读取时与整表保存的文件相同。
+    所有列都按 object 列的"文本值 + 类型标记"方式存储，各块的列类型不必一致（列名和顺序须与第一块一致）。
+    先写到临时文件，with 块正常结束后才替换目标文件。
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    temp_path = path + ".tmp"
+    state = {"writer": None, "columns": None}
+
+    def append(df):
+        columns = list(map(str, df.columns))
+        if state["writer"] is None:
+            fields = []
+            for name in columns:
+                fields += [pa.field(name, pa.large_string()), pa.field(f"{TYPE_COLUMN_PREFIX}{name}", pa.int8())]
+            schema = pa.schema(fields, metadata={b"column_order": "\x1f".join(columns).encode("utf-8")})
+            state["writer"] = pa.ipc.new_file(temp_path, schema, options=pa.ipc.IpcWriteOptions(compression="lz4"))
+            state["schema"] = schema
+            state["columns"] = columns
+        elif columns != state["columns"]:
+            raise ValueError(f"中间文件 {path} 分块写出时列不一致")
+        arrays = []
+        for i in range(len(columns)):
+            texts, tags = _encode_object_column(df.iloc[:, i].astype(object))
+            arrays += [pa.array(texts, type=pa.large_string()), pa.array(tags, type=pa.int8())]
+        state["writer"].write_batch(pa.RecordBatch.from_arrays(arrays, schema=state["schema"]))
+
+    try:
+        yield append
+        if state["writer"] is None:
+            raise ValueError(f"中间文件 {path} 没有写入任何数据")
+        state["writer"].close()
+        state["writer"] = None
+        os.replace(temp_path, path)
+    finally:
+        if state["writer"] is not None:
+            state["writer"].close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load_frame(path, columns=None):
+    """读取列式中间文件，object 列按类型标记还原为原始 Python 对象"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"中间文件不存在: {path}")
+
+    return _table_frame(feather.read_table(path, memory_map=True), columns)
+
+
+def _table_frame(table, columns=None):
+    """Arrow 表 → DataFrame，object 列按类型标记还原"""
+    metadata = table.schema.metadata or {}
+    if b"column_order" in metadata:
+        names = metadata[b"column_order"].decode("utf-8").split("\x1f")
+    else:
+        names = [n for n in table.column_names if not n.startswith(TYPE_COLUMN_PREFIX)]
+    if columns is not None:
+        missing = [c for c in columns if c not in names]
+        if missing:
+            raise ValueError(f"中间文件缺少字段: {', '.join(missing)}")
+        names = list(columns)
+
+    tagged = [n for n in names if f"{TYPE_COLUMN_PREFIX}{n}" in table.column_names]
+    native = [n for n in names if n not in tagged]
+    df = table.select(native).to_pandas() if native else pd.DataFrame(index=range(table.num_rows))
+    for name in tagged:
+        texts = table.column(name).to_numpy(zero_copy_only=False)
+        tags = table.column(f"{TYPE_COLUMN_PREFIX}{name}").to_numpy()
+        df[name] = _decode_object_column(texts, tags)
+    return df[names]
+
+
+def read_frame(path, **read_sheet_kwargs):
+    """按后缀读取中间文件：.feather 走列式存储，其余仍按 xlsx（dtype=object）读取"""
+    if is_store_path(path):
+        return load_frame(path)
+    return read_sheet(path, **read_sheet_kwargs)
@@ -0,0 +1,133 @@
+"""
+名称匹配结果缓存（SQLite）
+
+步骤4每个月都要把同样的 (sheet, 3c商品名称) 重新匹配一遍，而企业库存数量.xlsx 两次下载之间通常只改动几行。
+这里把匹配结果按 (sheet, 商品名, 匹配模式) 保存在 ./中间文件—可忽略/名称匹配缓存.sqlite 中：
+
+    sheets 表    每个 sheet 的指纹（xlsx 中 sheet 成员的 CRC，见 order_store.sheet_fingerprints）
+    models 表    每个 sheet 每个规格型号的名称列表哈希
+    results 表   匹配结果：名称（或未匹配说明）、规格、匹配置信度、匹配方式，以及结果依赖的规格型号
+
+sheet 指纹没有变化时不读取该 sheet，缓存全部有效。指纹变化时读取该 sheet，逐个规格型号比对名称列表哈希，
+只删除依赖于有变化（新增、删除、名称改动）的规格型号的结果。精确匹配只用到商品名中型号下的名称，
+依赖该型号；模糊匹配在型号不在 sheet 中时会在整张 sheet 中找候选，依赖整张 sheet（记为 "*"），sheet 有任何变化都删除。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+
+CACHE_PATH = "./中间文件—可忽略/名称匹配缓存.sqlite"
+# 匹配规则（spec_index / fuzzy_match）有变化时调大版本号，旧缓存整体失效
+CACHE_VERSION = 2
+# 依赖整张 sheet 的结果
+WHOLE_SHEET = "*"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS sheets (sheet TEXT PRIMARY KEY, fingerprint TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS models (
+    sheet TEXT NOT NULL,
+    model TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (sheet, model)
+);
+CREATE TABLE IF NOT EXISTS results (
+    sheet TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    product_name TEXT NOT NULL,
+    name,
+    spec,
+    confidence REAL,
+    method TEXT,
+    dep_model TEXT NOT NULL,
+    PRIMARY KEY (sheet, mode, product_name)
+);
+CREATE INDEX IF NOT EXISTS results_dep ON results (sheet, dep_model);
+"""
+
+
+def open_cache(path=CACHE_PATH):
+    """打开（不存在时创建）名称匹配缓存，版本不一致时清空重建"""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if row is None or row[0] != str(CACHE_VERSION):
+        with conn:
+            for table in ("sheets", "models", "results"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(CACHE_VERSION),))
+    return conn
+
+
+def stale_sheets(conn, fingerprints):
+    """指纹与缓存中记录的不同（或没有记录）的 sheet"""
+    stored = dict(conn.execute("SELECT sheet, fingerprint FROM sheets"))
+    return [sheet for sheet, fingerprint in fingerprints.items() if stored.get(sheet) != fingerprint]
+
+
+def _model_digest(names):
+    text = json.dumps([str(name) for name in names], ensure_ascii=False)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def refresh_sheet(conn, sheet, model_name_dict, fingerprint):
+    """
+    sheet 内容有变化时更新缓存：逐个规格型号比对名称列表哈希，删除依赖于有变化的型号（及整张 sheet）的结果
+
+    参数:
+        model_name_dict: {规格型号: [名称...]}（generate_model_name_dict 的结果）
+    返回:
+        有变化的规格型号列表，sheet 第一次加入缓存时为 None
+    """
+    current = {str(model): _model_digest(names) for model, names in model_name_dict.items()}
+    stored = dict(conn.execute("SELECT model, digest FROM models WHERE sheet = ?", (sheet,)))
+    known = conn.execute("SELECT 1 FROM sheets WHERE sheet = ?", (sheet,)).fetchone() is not None
+    changed = sorted(model for model in current.keys() | stored.keys() if current.get(model) != stored.get(model))
+    with conn:
+        if changed:
+            conn.executemany("DELETE FROM results WHERE sheet = ? AND dep_model = ?",
+                             [(sheet, model) for model in changed + [WHOLE_SHEET]])
+        conn.execute("DELETE FROM models WHERE sheet = ?", (sheet,))
+        conn.executemany("INSERT INTO models (sheet, model, digest) VALUES (?, ?, ?)",
+                         [(sheet, model, digest) for model, digest in current.items()])
+        conn.execute("INSERT OR REPLACE INTO sheets (sheet, fingerprint) VALUES (?, ?)", (sheet, fingerprint))
+    return changed if known else None
+
+
+def lookup_results(conn, mode, pairs):
+    """
+    查询 (sheet, 商品名) 的缓存结果
+
+    返回:
+        {(sheet, 商品名): (名称, 规格, 匹配置信度, 匹配方式)}，没有缓存的不在结果中
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (sheet TEXT, product_name TEXT, PRIMARY KEY (sheet, product_name))")
+    conn.execute("DELETE FROM wanted")
+    conn.executemany("INSERT OR IGNORE INTO wanted (sheet, product_name) VALUES (?, ?)", pairs)
+    rows = conn.execute(
+        "SELECT r.sheet, r.product_name, r.name, r.spec, r.confidence, r.method "
+        "FROM wanted w JOIN results r ON r.sheet = w.sheet AND r.mode = ? AND r.product_name = w.product_name",
+        (mode,),
+    ).fetchall()
+    return {(sheet, product_name): (name, spec, confidence, method)
+            for sheet, product_name, name, spec, confidence, method in rows}
+
+
+def store_results(conn, mode, results):
+    """
+    写入匹配结果
+
+    参数:
+        results: [(sheet, 商品名, 名称, 规格, 匹配置信度, 匹配方式, 依赖的规格型号)...]
+    """
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO results (sheet, mode, product_name, name, spec, confidence, method, dep_model) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(sheet, mode, product_name, name, spec, confidence, method, dep_model)
+             for sheet, product_name, name, spec, confidence, method, dep_model in results],
+        )
@@ -0,0 +1,39 @@
+"""
+金额统一转换为整数分
+
+表格中的金额可能是数字，也可能是带 ¥ 和空格的文本（如 "¥ 12.50"），原来逐行用
+float(str(x).replace('¥', '').replace(' ', '')) 转换。这里整列一次性转换：
+去掉 ¥ 和空格后按数值解析，四舍五入为整数分（Int64），空单元格为缺失值，
+非空但无法解析的单元格逐行标记为转换失败。后续按分比较正负和大小，不再逐行解析。
+"""
+import numpy as np
+import pandas as pd
+
+
+def parse_cents(values):
+    """
+    把一列金额转换为整数分
+
+    参数:
+        values: 金额列（Series，dtype 任意）
+    返回:
+        (cents, failed)
+        cents: Int64 Series（与 values 同索引），空单元格和转换失败的为缺失值
+        failed: bool 数组，非空但无法转换为数值的单元格为 True
+    """
+    values = pd.Series(values)
+    missing = values.isna().to_numpy()
+    text = values.astype(str).str.replace("¥", "", regex=False).str.replace(" ", "", regex=False).str.strip()
+    # 文本 "nan" 与空单元格一样视为缺失
+    missing |= (text.str.lower() == "nan").to_numpy()
+    number = pd.to_numeric(text.where(~missing), errors="coerce").to_numpy(dtype=float)
+    invalid = ~np.isfinite(number)
+    failed = invalid & ~missing
+    cents = pd.array(np.round(np.where(invalid, 0, number) * 100).astype(np.int64), dtype="Int64")
+    cents[invalid] = pd.NA
+    return pd.Series(cents, index=values.index), failed
+
+
+def cents_sign(cents):
+    """整数分的正负（1 / -1 / 0），缺失值为 0"""
+    return np.sign(cents.fillna(0).to_numpy(dtype=np.int64))
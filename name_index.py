@@ -0,0 +1,144 @@
+"""
+3c商品名称索引（SQLite）
+
+步骤3原来每次读取整张网店单号汇总表，去重后建立 网店单号-去后缀 → 商品名称 的映射，
+汇总表随3c商品名表格的存档不断变大，而每批抖音订单只用到其中很少一部分。
+这里把映射按源文件保存在 ./中间文件—可忽略/3c商品名索引.sqlite 中，步骤1只把新增或改动的
+3c表格写入索引，步骤3只按本批订单的 sku 查询，耗时与本批订单数有关，与历史数据量无关。
+
+    files 表     每个3c表格一行：路径、大小、修改时间、在汇总表中的顺序（rank）
+    entries 表   每个3c表格的每一行：行号、清理后的网店单号、商品名称，按网店单号建索引
+
+同一单号出现多次时取汇总表中第一次出现的商品名称（rank 最小的文件中行号最小的一行），
+与原来 drop_duplicates(keep="first") 的结果一致。已从文件夹中删除的表格同时从索引中删除。
+"""
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+INDEX_PATH = "./中间文件—可忽略/3c商品名索引.sqlite"
+# 存储格式或单号清理规则有变化时调大版本号，旧索引整体重建
+INDEX_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    rank INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    file_id INTEGER NOT NULL,
+    row_no INTEGER NOT NULL,
+    sku TEXT NOT NULL,
+    name
+);
+CREATE INDEX IF NOT EXISTS entries_sku ON entries (sku, file_id, row_no);
+CREATE INDEX IF NOT EXISTS entries_file ON entries (file_id);
+"""
+
+
+def clean_sku(value):
+    """清理单号（去除前后空格和Excel文本标记'），空值为空字符串"""
+    if pd.isna(value):
+        return ""
+    return str(value).strip().strip("'")
+
+
+def _name_value(value):
+    """商品名称按原值存入 SQLite，空值为 NULL"""
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+def open_index(path=INDEX_PATH):
+    """打开（不存在时创建）3c商品名称索引，版本不一致时清空重建"""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if row is None or row[0] != str(INDEX_VERSION):
+        with conn:
+            conn.execute("DELETE FROM files")
+            conn.execute("DELETE FROM entries")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(INDEX_VERSION),))
+    return conn
+
+
+def _file_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def sync_index(conn, paths, frames):
+    """
+    按步骤1的结果更新索引：只写入新增或改动（大小/修改时间变化）的表格，
+    按 paths 的顺序更新每个表格在汇总表中的顺序，删除不在 paths 中的表格
+
+    参数:
+        paths: 步骤1处理成功的表格路径（与汇总表中的顺序相同）
+        frames: 与 paths 对应的解析结果（含"网店单号-去后缀"、"商品名称"列）
+    返回:
+        本次写入索引的表格数
+    """
+    stored = {path: (file_id, size, mtime_ns)
+              for file_id, path, size, mtime_ns in conn.execute("SELECT id, path, size, mtime_ns FROM files")}
+    live = {}
+    written = 0
+    with conn:
+        for rank, (path, df) in enumerate(zip(paths, frames)):
+            key = _file_key(path)
+            live[key] = rank
+            stat = os.stat(path)
+            entry = stored.get(key)
+            if entry is not None and entry[1:] == (stat.st_size, stat.st_mtime_ns):
+                conn.execute("UPDATE files SET rank = ? WHERE id = ?", (rank, entry[0]))
+                continue
+            if entry is not None:
+                conn.execute("DELETE FROM entries WHERE file_id = ?", (entry[0],))
+                conn.execute("DELETE FROM files WHERE id = ?", (entry[0],))
+            file_id = conn.execute(
+                "INSERT INTO files (path, size, mtime_ns, rank) VALUES (?, ?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime_ns, rank),
+            ).lastrowid
+            skus = [clean_sku(v) for v in df["网店单号-去后缀"]] if "网店单号-去后缀" in df.columns else []
+            names = df["商品名称"].tolist() if "商品名称" in df.columns else [None] * len(skus)
+            conn.executemany(
+                "INSERT INTO entries (file_id, row_no, sku, name) VALUES (?, ?, ?, ?)",
+                ((file_id, i, sku, _name_value(name)) for i, (sku, name) in enumerate(zip(skus, names))),
+            )
+            written += 1
+        for key, (file_id, _, _) in stored.items():
+            if key not in live:
+                conn.execute("DELETE FROM entries WHERE file_id = ?", (file_id,))
+                conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+    return written
+
+
+def lookup_names(conn, skus):
+    """
+    查询清理后的单号对应的商品名称（临时表与 entries 索引连接）
+
+    返回:
+        {单号: 商品名称}，索引中没有的单号不在结果中
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (sku TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM wanted")
+    conn.executemany("INSERT OR IGNORE INTO wanted (sku) VALUES (?)", ((sku,) for sku in set(skus)))
+    # MIN() 聚合时 SQLite 的裸列取值来自取得最小值的那一行，即汇总表中第一次出现的商品名称
+    rows = conn.execute(
+        "SELECT w.sku, e.name, MIN(f.rank * 4294967296 + e.row_no) "
+        "FROM wanted w JOIN entries e ON e.sku = w.sku JOIN files f ON f.id = e.file_id "
+        "GROUP BY w.sku"
+    ).fetchall()
+    return {sku: name for sku, name, _ in rows}
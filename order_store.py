@@ -0,0 +1,202 @@
+"""
+国补表本地库（SQLite）
+
+二次登记每次运行都要解析国补表中所选店铺的 sheet（合并单元格展开后再建立 sku 索引），
+对账时一天内反复运行多次，国补表大多没有变化。这里把解析后的 sheet 按店铺保存在
+./中间文件—可忽略/国补表库.sqlite 中：
+
+    sheets 表   每个店铺一行：sheet 指纹、列名、整张 sheet（列式编码）
+    orders 表   每个店铺的每一行：行号、sku单号、订单金额正负，按 (店铺, sku单号, 金额正负) 建索引
+
+加载是增量的：xlsx 是 zip 包，每个 sheet 是其中一个 XML 成员，zip 目录中记录了成员的 CRC32，
+读取目录（不解压）即可得到每个 sheet 的指纹（sheet 成员 CRC + 共享字符串成员 CRC）。
+只有指纹变化或库中没有的 sheet 才重新解析，其余直接从库中读取。
+匹配时把表1的 sku 写入临时表，与 orders 表按索引连接，一次查询得到每个 sku 的行数、
+第一行、订单金额为正/负的第一行。
+"""
+import json
+import os
+import sqlite3
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from excel_reader import read_merged_sheets, sheet_members
+from intermediate_store import frame_to_bytes, frame_from_bytes
+from money_normalize import parse_cents, cents_sign
+from parse_cache import file_digest
+
+STORE_PATH = "./中间文件—可忽略/国补表库.sqlite"
+# 存储格式有变化时调大版本号，旧库整体重建
+STORE_VERSION = 1
+SHEET_HEADER = 1  # 国补表表头在第2行
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS sheets (
+    shop TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    source TEXT,
+    columns TEXT NOT NULL,
+    frame BLOB NOT NULL,
+    row_count INTEGER NOT NULL,
+    loaded_at TEXT
+);
+CREATE TABLE IF NOT EXISTS orders (
+    shop TEXT NOT NULL,
+    row_no INTEGER NOT NULL,
+    sku,
+    amount_sign INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_sku ON orders (shop, sku, amount_sign, row_no);
+"""
+
+
+def open_store(path=STORE_PATH):
+    """打开（不存在时创建）国补表本地库，版本不一致时清空重建"""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if row is None or row[0] != str(STORE_VERSION):
+        with conn:
+            conn.execute("DELETE FROM sheets")
+            conn.execute("DELETE FROM orders")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(STORE_VERSION),))
+    return conn
+
+
+def sheet_fingerprints(path, sheet_names):
+    """
+    各 sheet 的指纹：xlsx 取 sheet 成员和共享字符串成员的 CRC32（只读 zip 目录，不解压），
+    其他格式（或无法识别的 xlsx）取整个文件的内容哈希。不存在的 sheet 不在结果中。
+    """
+    try:
+        with zipfile.ZipFile(path) as book:
+            infos = {info.filename: info for info in book.infolist()}
+            members = sheet_members(book)
+    except (zipfile.BadZipFile, KeyError, ET.ParseError):
+        digest = f"file:{file_digest(path)}"
+        return {name: digest for name in sheet_names}
+    shared = infos.get("xl/sharedStrings.xml")
+    shared_crc = f"{shared.CRC:08x}" if shared else "-"
+    result = {}
+    for name in sheet_names:
+        info = infos.get(members.get(name))
+        if info is not None:
+            result[name] = f"crc:{info.CRC:08x}:{shared_crc}"
+    return result
+
+
+def _sku_value(value):
+    """sku 按原值存入 SQLite（文本仍为文本、整数仍为整数，与 pandas 中按值匹配一致），空值为 NULL"""
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NA:
+        return None
+    if isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _store_sheet(conn, shop, df, fingerprint, source):
+    """把一张 sheet 写入库中（替换旧数据）"""
+    columns = [None if pd.isna(c) else c for c in df.columns] if len(df.columns) else []
+    # 列名可能重复或为空，按位置编码
+    frame = df.set_axis([str(i) for i in range(len(df.columns))], axis=1)
+    if "订单金额" in df.columns:
+        signs = cents_sign(parse_cents(df["订单金额"])[0])
+    else:
+        signs = np.zeros(len(df), dtype=np.int64)
+    skus = df["sku单号"].tolist() if "sku单号" in df.columns else [None] * len(df)
+    with conn:
+        conn.execute("DELETE FROM orders WHERE shop = ?", (shop,))
+        conn.executemany(
+            "INSERT INTO orders (shop, row_no, sku, amount_sign) VALUES (?, ?, ?, ?)",
+            ((shop, i, _sku_value(sku), int(sign)) for i, (sku, sign) in enumerate(zip(skus, signs))),
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO sheets (shop, fingerprint, source, columns, frame, row_count, loaded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (shop, fingerprint, os.path.abspath(source), json.dumps(columns, ensure_ascii=False, default=str),
+             frame_to_bytes(frame), len(df), datetime.now().isoformat(timespec="seconds")),
+        )
+
+
+def sync_sheets(conn, path, sheet_names):
+    """
+    按指纹增量加载国补表：只解析库中没有或指纹变化的 sheet（国补表只打开一次）
+
+    返回:
+        (重新加载的 sheet 列表, {sheet名: 错误信息})
+    """
+    fingerprints = sheet_fingerprints(path, sheet_names)
+    errors = {name: f"Worksheet named '{name}' not found" for name in sheet_names if name not in fingerprints}
+    stored = dict(conn.execute("SELECT shop, fingerprint FROM sheets"))
+    stale = [name for name in sheet_names if name in fingerprints and stored.get(name) != fingerprints[name]]
+    reused = len(fingerprints) - len(stale)
+    if reused:
+        print(f"♻️ 国补表中 {reused} 个店铺的 sheet 未变化，直接使用本地库")
+    if not stale:
+        return [], errors
+    frames, read_errors = read_merged_sheets(path, stale, header=SHEET_HEADER)
+    errors.update(read_errors)
+    loaded = [name for name in stale if name in frames]
+    for name in loaded:
+        _store_sheet(conn, name, frames[name], fingerprints[name], path)
+    if loaded:
+        print(f"📥 已解析并存入本地库：{'、'.join(loaded)}")
+    return loaded, errors
+
+
+def load_sheets(path, sheet_names, store_path=STORE_PATH):
+    """
+    增量同步所选店铺后从本地库读取（代替 read_merged_sheets(path, sheet_names, header=1)）
+
+    返回:
+        ({sheet名: DataFrame}, {sheet名: 错误信息})
+    """
+    conn = open_store(store_path)
+    try:
+        _, errors = sync_sheets(conn, path, sheet_names)
+        frames = {name: load_sheet(conn, name) for name in sheet_names if name not in errors}
+    finally:
+        conn.close()
+    return frames, errors
+
+
+def load_sheet(conn, shop):
+    """从库中读取一张 sheet（与 read_merged_sheet 读取的结果相同）"""
+    row = conn.execute("SELECT columns, frame FROM sheets WHERE shop = ?", (shop,)).fetchone()
+    if row is None:
+        raise KeyError(f"国补表库中没有店铺 {shop}")
+    columns, frame = row
+    return frame_from_bytes(frame).set_axis(json.loads(columns), axis=1)
+
+
+def sku_lookup(conn, shop, skus):
+    """
+    查询表1中出现的 sku 在该店铺国补表中的匹配信息（临时表与 orders 索引连接）
+
+    返回:
+        以 sku 为索引的 DataFrame，列为 count（行数）、first_any（第一行）、
+        first_positive / first_negative（订单金额为正/负的第一行，没有时为 NaN），行号从0开始
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (sku PRIMARY KEY)")
+    conn.execute("DELETE FROM wanted")
+    conn.executemany("INSERT OR IGNORE INTO wanted (sku) VALUES (?)",
+                     ((sku,) for sku in map(_sku_value, pd.unique(pd.Series(skus, dtype=object))) if sku is not None))
+    rows = conn.execute(
+        "SELECT o.sku, COUNT(*), MIN(o.row_no), "
+        "MIN(CASE WHEN o.amount_sign > 0 THEN o.row_no END), MIN(CASE WHEN o.amount_sign < 0 THEN o.row_no END) "
+        "FROM wanted w JOIN orders o ON o.shop = ? AND o.sku = w.sku GROUP BY o.sku",
+        (shop,),
+    ).fetchall()
+    lookup = pd.DataFrame(rows, columns=["sku", "count", "first_any", "first_positive", "first_negative"], dtype=object)
+    lookup = lookup.set_index("sku")
+    return lookup.astype({"count": np.int64, "first_any": float, "first_positive": float, "first_negative": float})
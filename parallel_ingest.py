@@ -0,0 +1,65 @@
+"""
+多进程并行执行互相独立的任务
+
+openpyxl 解析和写出都是纯 Python 的 CPU 密集型操作，单进程只能用满一个核心。
+这里把互相独立的任务（逐文件解析表格、分别写出两个结果表、逐店铺二次登记等）分发到进程池：
+工作量大的任务优先调度保证负载均衡，结果按输入顺序返回，
+单个任务的异常不会中断整体流程，而是连同任务一起返回给调用方按原有方式汇报。
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Windows 下进程池最多 61 个进程
+MAX_WORKERS_LIMIT = 61
+
+
+def default_workers():
+    """默认进程数：CPU 核心数（受上限约束）"""
+    return max(1, min(os.cpu_count() or 1, MAX_WORKERS_LIMIT))
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def run_parallel(worker, tasks, max_workers=None, sizes=None):
+    """
+    并行执行 worker(*task)
+
+    参数:
+        worker: 模块级函数（需可被 pickle）
+        tasks: 参数元组列表，每个元组为一次 worker 调用的参数
+        max_workers: 最大进程数，None 使用 default_workers()，<=1 时在当前进程串行执行
+        sizes: 各任务的工作量（如行数），用于调度顺序；None 时取每个任务第一个参数的文件大小，
+               因此任务的第一个参数不是文件路径（如店铺名）时必须给出
+    返回:
+        与 tasks 顺序一致的 [(结果, 异常信息)]，成功时异常信息为 None，失败时结果为 None
+    """
+    if max_workers is None:
+        max_workers = default_workers()
+    max_workers = max(1, min(max_workers, MAX_WORKERS_LIMIT, len(tasks)))
+
+    results = [None] * len(tasks)
+    if max_workers <= 1:
+        for i, task in enumerate(tasks):
+            try:
+                results[i] = (worker(*task), None)
+            except Exception as e:
+                results[i] = (None, str(e))
+        return results
+
+    # 大文件先提交，避免最后只剩一个大文件拖住整体耗时
+    if sizes is None:
+        sizes = [_file_size(task[0]) for task in tasks]
+    order = sorted(range(len(tasks)), key=lambda i: sizes[i], reverse=True)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {i: executor.submit(worker, *tasks[i]) for i in order}
+        for i, future in futures.items():
+            try:
+                results[i] = (future.result(), None)
+            except Exception as e:
+                results[i] = (None, str(e))
+    return results
@@ -0,0 +1,109 @@
+"""
+逐文件解析缓存
+
+按 路径 + 文件大小 + 修改时间 + 内容哈希 记录每个表格解析后的 DataFrame（保存为列式中间文件），
+再次运行时只解析新增或有改动的文件，其余直接从缓存读取。
+"""
+import hashlib
+import json
+import os
+
+from intermediate_store import save_frame, load_frame
+
+MANIFEST_NAME = "manifest.json"
+# 解析逻辑有变化时调大版本号，旧缓存会整体失效
+CACHE_VERSION = 1
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """计算文件内容哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def load_manifest(cache_dir):
+    """读取缓存清单，清单不存在或版本不一致时返回空清单"""
+    manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {"version": CACHE_VERSION, "files": {}}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 解析缓存清单损坏，将重新解析全部文件: {str(e)}")
+        return {"version": CACHE_VERSION, "files": {}}
+    if manifest.get("version") != CACHE_VERSION:
+        return {"version": CACHE_VERSION, "files": {}}
+    return manifest
+
+
+def save_manifest(cache_dir, manifest):
+    """写入缓存清单（先写临时文件再替换，避免中断时留下半个清单）"""
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, manifest_path)
+
+
+def lookup_cached_frame(manifest, cache_dir, path):
+    """
+    查询文件的缓存结果，命中返回 DataFrame，否则返回 None
+
+    大小和修改时间都没变时直接命中；只有修改时间变了（如文件被复制/另存）时再比对内容哈希。
+    """
+    entry = manifest["files"].get(_cache_key(path))
+    if not entry:
+        return None
+    frame_path = os.path.join(cache_dir, entry["frame"])
+    if not os.path.exists(frame_path):
+        return None
+
+    stat = os.stat(path)
+    if stat.st_size != entry["size"]:
+        return None
+    if stat.st_mtime_ns != entry["mtime_ns"]:
+        if file_digest(path) != entry["digest"]:
+            return None
+        entry["mtime_ns"] = stat.st_mtime_ns
+    return load_frame(frame_path)
+
+
+def store_cached_frame(manifest, cache_dir, path, df):
+    """把文件的解析结果写入缓存（缓存文件以内容哈希命名）"""
+    stat = os.stat(path)
+    digest = file_digest(path)
+    frame_name = f"{digest}.feather"
+    save_frame(df, os.path.join(cache_dir, frame_name))
+    manifest["files"][_cache_key(path)] = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "digest": digest,
+        "frame": frame_name,
+    }
+
+
+def prune_cache(manifest, cache_dir, live_paths):
+    """删除已不存在的源文件对应的缓存记录和缓存文件，返回清理的记录数"""
+    live_keys = {_cache_key(p) for p in live_paths}
+    stale = [key for key in manifest["files"] if key not in live_keys]
+    for key in stale:
+        del manifest["files"][key]
+
+    referenced = {entry["frame"] for entry in manifest["files"].values()}
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.endswith(".feather") and name not in referenced:
+                os.remove(os.path.join(cache_dir, name))
+    return len(stale)
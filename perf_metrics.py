@@ -0,0 +1,238 @@
+"""
+运行性能记录
+
+用 stage(名称) 包住一个处理阶段（主程序的步骤1-5，二次登记的读取/匹配/保存/合并），记录：
+    seconds         耗时（秒）
+    rows_in/out     输入、输出行数（由阶段内部调用 note_rows 登记）
+    bytes_read      读取的文件大小（count_read 登记）
+    bytes_written   写出的文件大小（count_written 登记）
+    peak_rss_mb     进程到该阶段结束时的内存峰值（MB）
+一次运行结束后 write_report 把所有阶段写成 JSON 运行报告。
+
+输出详细程度由 verbosity 控制：0 不打印阶段耗时，1 打印每个阶段的一行汇总（默认），
+2 额外打印规格字典等大块调试内容。
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+REPORT_DIR = "./中间文件—可忽略/运行报告"
+
+_verbosity = 1
+_stages = []
+_active = []
+_suspended = 0
+_started_at = datetime.now()
+
+
+def set_verbosity(level):
+    """设置输出详细程度（0/1/2）"""
+    global _verbosity
+    _verbosity = level
+
+
+def get_verbosity():
+    return _verbosity
+
+
+def verbose(level=2):
+    """当前详细程度是否达到 level，用于控制大块调试输出"""
+    return _verbosity >= level
+
+
+def reset():
+    """清空已记录的阶段，开始新的一次运行"""
+    global _started_at
+    _stages.clear()
+    _active.clear()
+    _started_at = datetime.now()
+
+
+def _windows_peak_mb():
+    """Windows 下用 GetProcessMemoryInfo 读取进程的工作集峰值（PeakWorkingSetSize），只用标准库 ctypes"""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32 = ctypes.WinDLL("kernel32")
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    # Windows 7 起 kernel32 导出 K32GetProcessMemoryInfo，更早的系统只在 psapi.dll 中
+    get_info = getattr(kernel32, "K32GetProcessMemoryInfo", None) or ctypes.WinDLL("psapi").GetProcessMemoryInfo
+    get_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+    get_info.restype = wintypes.BOOL
+    if not get_info(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+
+
+def peak_rss_mb():
+    """当前进程的内存峰值（MB），无法获取时为 None"""
+    if sys.platform == "win32":
+        try:
+            return _windows_peak_mb()
+        except (OSError, AttributeError):
+            return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _path_size(path):
+    if os.path.isdir(path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                total += os.path.getsize(os.path.join(root, name))
+        return total
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _current():
+    return _active[-1] if _active else None
+
+
+def note_rows(rows_in=None, rows_out=None):
+    """登记当前阶段的输入/输出行数（不在任何阶段内时忽略）"""
+    record = _current()
+    if record is None:
+        return
+    if rows_in is not None:
+        record["rows_in"] = int(rows_in)
+    if rows_out is not None:
+        record["rows_out"] = int(rows_out)
+
+
+def count_read(*paths):
+    """把文件（或目录下所有文件）的大小计入当前阶段的读取字节数"""
+    record = _current()
+    if record is not None:
+        record["bytes_read"] += sum(_path_size(p) for p in paths)
+
+
+def count_written(*paths):
+    """把文件的大小计入当前阶段的写出字节数"""
+    record = _current()
+    if record is not None:
+        record["bytes_written"] += sum(_path_size(p) for p in paths)
+
+
+def _format_bytes(size):
+    return f"{size / (1024 * 1024):.2f} MB"
+
+
+def _summary_line(record):
+    parts = [f"{record['seconds']}秒"]
+    if record["rows_in"] is not None or record["rows_out"] is not None:
+        parts.append(f"行数 {record['rows_in'] if record['rows_in'] is not None else '-'}"
+                     f" → {record['rows_out'] if record['rows_out'] is not None else '-'}")
+    if record["bytes_read"] or record["bytes_written"]:
+        parts.append(f"读 {_format_bytes(record['bytes_read'])} / 写 {_format_bytes(record['bytes_written'])}")
+    if record["peak_rss_mb"] is not None:
+        parts.append(f"内存峰值 {record['peak_rss_mb']} MB")
+    status = "" if record["ok"] else "（失败）"
+    return f"⏱️  [{record['name']}]{status} " + " | ".join(parts)
+
+
+@contextmanager
+def stage(name):
+    """
+    记录一个处理阶段
+
+    用法:
+        with perf_metrics.stage("step4"):
+            ...
+            perf_metrics.note_rows(rows_in=len(df), rows_out=len(result))
+    阶段内抛出的异常照常向外抛出，该阶段记为失败。
+    """
+    record = {"name": name, "seconds": None, "rows_in": None, "rows_out": None,
+              "bytes_read": 0, "bytes_written": 0, "peak_rss_mb": None, "ok": True}
+    _active.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record["ok"] = False
+        raise
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        record["peak_rss_mb"] = peak_rss_mb()
+        _active.remove(record)
+        if not _suspended:
+            _stages.append(record)
+            if _verbosity >= 1:
+                print(_summary_line(record))
+
+
+@contextmanager
+def suspended():
+    """
+    其中的阶段照常计时，但不计入运行报告、不打印
+    用于批量模式的店铺 worker：串行执行时在主进程中运行，不应混入主进程的阶段
+    """
+    global _suspended
+    _suspended += 1
+    try:
+        yield
+    finally:
+        _suspended -= 1
+
+
+def stages():
+    """已结束的阶段记录（按结束顺序）"""
+    return list(_stages)
+
+
+def write_report(script, report_dir=REPORT_DIR, extra=None):
+    """
+    把本次运行的所有阶段写成 JSON 运行报告
+
+    参数:
+        script: 脚本名，用于报告文件名
+        extra: 附加到报告中的其他信息（如选择的店铺）
+    返回:
+        报告路径，写入失败时为 None
+    """
+    finished_at = datetime.now()
+    report = {
+        "script": script,
+        "started_at": _started_at.isoformat(timespec="seconds"),
+        "finished_at": finished_at.isoformat(timespec="seconds"),
+        "total_seconds": round((finished_at - _started_at).total_seconds(), 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages(),
+    }
+    if extra:
+        report.update(extra)
+    try:
+        os.makedirs(report_dir, exist_ok=True)
+        path = os.path.join(report_dir, f"{script}_{finished_at.strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+    except OSError as e:
+        print(f"⚠️ 运行报告保存失败: {str(e)}")
+        return None
+    if _verbosity >= 1:
+        print(f"📈 运行报告已保存至：{path}")
+    return path
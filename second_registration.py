@@ -0,0 +1,221 @@
+"""
+国补二次登记的匹配引擎
+
+表1（垫资款）每一行按 sku单号 到表2（国补表）中查找对应订单：
+    表2中没有该 sku            → 未匹配_未找到匹配
+    表2中只有一个              → 正常匹配
+    表2中有两个（一购一退）      → 两个单号，按采购成本的正负取订单金额同号的第一行
+    表2中多于两个              → 未匹配_匹配过多，无法排除
+匹配到的行把表1的登记数据写入表2的"—1"列。
+
+表2只扫描一次：订单金额和采购成本整列转为整数分（money_normalize），建立 sku → 第一行、(sku, 金额正负) → 第一行 的索引，
+表1所有行一次性分类，"—1"列整块写入。
+
+run_all_shops 为批量模式：表1和国补表各只读取一次，多个店铺 sheet 分发到进程池并行登记，
+每个店铺单独输出，最后汇总各店铺的匹配状态。
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from excel_reader import read_sheet
+from order_store import load_sheets
+from excel_writer import write_excel
+from parallel_ingest import run_parallel
+from money_normalize import parse_cents, cents_sign
+import perf_metrics
+
+SUMMARY_NAME = "二次登记状态汇总.xlsx"
+
+# 表2的"—1"列 ← 表1的列
+FILL_COLUMNS = [
+    ("账单批次—1", "账单批次"), ("行类型—1", "行类型"), ("订单应付金额（元）—1", "订单应付金额（元）"),
+    ("政府补贴（元）—1", "政府补贴（元）"), ("店铺补贴（元）—1", "店铺补贴（元）"), ("自营补贴（元）—1", "自营补贴（元）"),
+    ("分账金额（元）—1", "分账金额（元）"), ("服务费用（元）—1", "服务费用（元）"), ("平台折扣（元）—1", "平台折扣（元）"),
+    ("订单实付（元）—1", "订单实付（元）"), ("采购折扣比例—1", "采购折扣比例"), ("采购折扣金额（元）—1", "采购折扣金额（元）"),
+    ("采购成本（元）—1", "采购成本（元）"), ("结算金额（元）—1", "结算金额（元）"), ("创建时间—1", "创建时间"), ("备注—1", "备注"),
+]
+
+STATUS_NORMAL = "正常匹配"
+STATUS_TWO_ORDERS = "两个单号"
+STATUS_NOT_FOUND = "未匹配_未找到匹配"
+STATUS_TOO_MANY = "未匹配_匹配过多，无法排除"
+STATUS_ZERO_COST = "未匹配_采购成本为零"
+STATUS_BAD_COST = "未匹配_采购成本格式错误"
+STATUS_NO_SIGNED_ORDER = "未匹配_无对应正负订单金额"
+
+
+def _first_position(positions, keys):
+    """每个 key 第一次出现的位置（key 为空的行不参与）"""
+    return positions.groupby(keys, sort=False).first()
+
+
+def build_sku_lookup(df2):
+    """
+    由表2建立 sku 索引（与 order_store.sku_lookup 的结果格式相同）
+
+    返回:
+        以 sku 为索引的 DataFrame，列为 count（行数）、first_any（第一行）、
+        first_positive / first_negative（订单金额为正/负的第一行，没有时为 NaN），行号为位置（从0开始）
+    """
+    sku2 = df2["sku单号"]
+    positions = pd.Series(np.arange(len(df2)), index=df2.index)
+
+    # 金额整列转为整数分，按分的正负比较（订单金额为空或无法转换时不参与正负匹配）
+    if "订单金额" in df2.columns:
+        amount_sign = cents_sign(parse_cents(df2["订单金额"])[0])
+    else:
+        amount_sign = np.zeros(len(df2), dtype=np.int64)
+    lookup = pd.DataFrame({
+        "count": sku2.value_counts(),
+        "first_any": _first_position(positions, sku2),
+        "first_positive": _first_position(positions[amount_sign > 0], sku2[amount_sign > 0]),
+        "first_negative": _first_position(positions[amount_sign < 0], sku2[amount_sign < 0]),
+    })
+    return lookup.astype({"first_any": float, "first_positive": float, "first_negative": float})
+
+
+def register_second(df1, df2, verbose=True, lookup=None):
+    """
+    二次登记匹配
+
+    参数:
+        df1: 表1（垫资款），需包含 sku单号、采购成本（元） 以及 FILL_COLUMNS 中的来源列
+        df2: 表2（国补表），需包含 sku单号、订单金额
+        verbose: 是否逐行打印"两个单号"的采购成本正负
+        lookup: 表2的 sku 索引（order_store.sku_lookup 从本地库查询的结果），None 时由 df2 现场建立
+    返回:
+        (df1, df2)，df1 新增"二次登记状态"列，df2 的"—1"列写入匹配结果（均在原对象上修改）
+    """
+    if lookup is None:
+        lookup = build_sku_lookup(df2)
+
+    sku1 = df1["sku单号"]
+    counts = sku1.map(lookup["count"]).fillna(0).to_numpy()
+    cost_cents, bad_cost = parse_cents(df1["采购成本（元）"])
+    cost_sign = cents_sign(cost_cents)
+
+    status = np.full(len(df1), "", dtype=object)
+    target = np.full(len(df1), np.nan)
+
+    status[counts == 0] = STATUS_NOT_FOUND
+    status[counts > 2] = STATUS_TOO_MANY
+    single = counts == 1
+    status[single] = STATUS_NORMAL
+    target[single] = sku1[single].map(lookup["first_any"]).to_numpy()
+
+    # 两个单号：按采购成本正负取对应订单
+    two = counts == 2
+    bad = two & bad_cost
+    status[bad] = STATUS_BAD_COST
+    positive = two & ~bad & (cost_sign > 0)
+    negative = two & ~bad & (cost_sign < 0)
+    zero = two & ~bad & ~positive & ~negative
+    status[zero] = STATUS_ZERO_COST
+    target[positive] = sku1[positive].map(lookup["first_positive"]).to_numpy()
+    target[negative] = sku1[negative].map(lookup["first_negative"]).to_numpy()
+    signed = positive | negative
+    status[signed & ~np.isnan(target)] = STATUS_TWO_ORDERS
+    status[signed & np.isnan(target)] = STATUS_NO_SIGNED_ORDER
+
+    if verbose:
+        checked = np.flatnonzero(two & ~bad)
+        for pos in checked:
+            row_no = df1.index[pos] + 2
+            if positive[pos]:
+                print(f"行{row_no}：采购成本为正数（{cost_cents.iat[pos] / 100}）")
+            elif negative[pos]:
+                print(f"行{row_no}：采购成本为负数（{cost_cents.iat[pos] / 100}）")
+            else:
+                print(f"行{row_no}：采购成本为零")
+
+    # 状态只有几种取值，按分类存储
+    df1["二次登记状态"] = pd.Categorical(status)
+
+    # 整块写入"—1"列；多行指向表2同一行时以表1中靠后的一行为准
+    matched = ~np.isnan(target)
+    fill = pd.DataFrame({"source": np.flatnonzero(matched), "target": target[matched].astype(np.int64)})
+    fill = fill.drop_duplicates("target", keep="last")
+    target_cols = [t for t, _ in FILL_COLUMNS]
+    source_cols = [s for _, s in FILL_COLUMNS]
+    missing = [c for c in target_cols if c not in df2.columns]
+    for col in missing:
+        df2[col] = np.nan
+    df2[target_cols] = df2[target_cols].astype(object)
+    if len(fill):
+        values = df1.iloc[fill["source"].to_numpy()][source_cols].to_numpy(dtype=object)
+        df2.iloc[fill["target"].to_numpy(), [df2.columns.get_loc(c) for c in target_cols]] = values
+    return df1, df2
+
+
+def run_all_shops(worker, table1_path, table2_path, shops, output_dir, max_workers=None, report_name="二次登记"):
+    """
+    批量二次登记：国补表只打开一次，读取所有选中店铺的 sheet，分发到进程池并行处理
+
+    参数:
+        worker: 模块级函数 worker(店铺名, 表1, 表2, 输出目录)，返回 {状态: 行数}
+        table1_path: 垫资款表格路径
+        table2_path: 国补表路径
+        shops: 要处理的店铺 sheet 名列表
+        output_dir: 各店铺结果及汇总表的输出目录
+        max_workers: 最大进程数，None 使用 CPU 核心数
+        report_name: 运行报告的名称（读取/并行登记/汇总三个阶段，子进程内的阶段不计入）
+    返回:
+        汇总 DataFrame（每个店铺一行，各状态的行数）
+    """
+    start_time = time.time()
+    perf_metrics.reset()
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"🔍 读取表1和国补表（{len(shops)}个店铺，国补表只打开一次）...")
+    with perf_metrics.stage("read"):
+        df1 = read_sheet(table1_path)
+        # 国补表中未变化的店铺直接从本地库读取，其余解析后存入库中
+        frames, errors = load_sheets(table2_path, shops)
+        perf_metrics.note_rows(rows_out=len(df1) + sum(len(f) for f in frames.values()))
+        perf_metrics.count_read(table1_path, table2_path)
+    for shop, err in errors.items():
+        print(f"❌ 读取店铺 {shop} 失败: {err}")
+
+    tasks = [(shop, df1, frames[shop], output_dir) for shop in shops if shop in frames]
+    print(f"⚙️  并行处理 {len(tasks)} 个店铺...")
+    with perf_metrics.stage("register"):
+        results = run_parallel(worker, tasks, max_workers=max_workers, sizes=[len(task[2]) for task in tasks])
+        perf_metrics.note_rows(rows_in=len(df1) * len(tasks), rows_out=sum(len(task[2]) for task in tasks))
+    outcomes = {task[0]: result for task, result in zip(tasks, results)}
+
+    rows = []
+    for shop in shops:
+        row = {"店铺": shop, "表2行数": len(frames[shop]) if shop in frames else 0}
+        if shop in errors:
+            row["处理结果"] = f"失败: {errors[shop]}"
+        else:
+            counts, err = outcomes[shop]
+            if err:
+                row["处理结果"] = f"失败: {err}"
+            else:
+                row["处理结果"] = "成功"
+                row.update(counts)
+        rows.append(row)
+
+    summary = pd.DataFrame(rows)
+    status_cols = [c for c in summary.columns if c not in ("店铺", "表2行数", "处理结果")]
+    summary[status_cols] = summary[status_cols].fillna(0).astype(int)
+    summary_path = os.path.join(output_dir, SUMMARY_NAME)
+    with perf_metrics.stage("summary"):
+        write_excel(summary_path, {"二次登记状态汇总": summary}, text_columns=())
+        perf_metrics.note_rows(rows_out=len(summary))
+        perf_metrics.count_written(summary_path)
+
+    print("\n" + "=" * 70)
+    print("🎉 批量二次登记完成！")
+    for row in rows:
+        counts = {c: row[c] for c in status_cols if row.get(c)}
+        print(f"   • {row['店铺']}：{row['处理结果']}" + (f" {counts}" if counts else ""))
+    print(f"📊 状态汇总已保存至：{summary_path}")
+    print(f"⏱️  总耗时：{round(time.time() - start_time, 2)}秒")
+    print("=" * 70)
+    perf_metrics.write_report(report_name, extra={"shops": list(shops)})
+    return summary
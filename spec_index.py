@@ -0,0 +1,85 @@
+"""
+规格索引
+
+企业库存数量.xlsx 中每个 sheet 的 {规格型号: [名称...]} 在加载时建一次索引：
+每个名称预先统一内存写法（8GB+256GB 格式）并标记是否为非标准版，按规格型号分组。
+匹配规则与原来相同（名称中 8G+256G 等写法的内存也能匹配）：在该型号下筛选同时包含内存和颜色（子串）的名称，
+再按版本排除。
+筛选结果按 (型号, 内存, 颜色) 记住，同一组合在一个 sheet 中只筛选一次，
+10万行的月份中不同的组合通常只有几百个。
+"""
+import re
+
+# 非标准版的关键词列表（可根据实际情况扩展）
+NON_STANDARD_VERSIONS = ["柔光版", "灵动版", "Pro版", "青春版"]
+
+UNMATCHED_MODEL = "未匹配到该型号{model}"
+NO_CONFIG = "有{model}规格，但是没有对应的配置"
+AMBIGUOUS = "无法排除到唯一值_请向工程师反馈"
+
+_MEMORY_PATTERN = re.compile(r'(\d+)\s*GB?\s*\+\s*(\d+)\s*GB?')
+
+
+def normalize_memory(text):
+    """把名称中的内存写法统一为 8GB+256GB（8G+256G、8GB+256G 等）"""
+    return _MEMORY_PATTERN.sub(r'\1GB+\2GB', text)
+
+
+def _make_entry(name):
+    return {
+        "name": name,
+        "text": normalize_memory(name),
+        "non_standard": any(v in name for v in NON_STANDARD_VERSIONS),
+    }
+
+
+def build_spec_index(model_name_dict):
+    """
+    为一个 sheet 建立索引
+
+    参数:
+        model_name_dict: {规格型号: [名称...]}（generate_model_name_dict 的结果）
+    返回:
+        {"models": {型号: [条目...]}, "matches": {(型号, 内存, 颜色): [条目...]}}，matches 在匹配时逐步填充
+    """
+    index = {"models": {}, "matches": {}}
+    for model, names in model_name_dict.items():
+        index["models"][model] = [_make_entry(name) for name in names if isinstance(name, str)]
+    return index
+
+
+def _filter_version(entries, version):
+    if version == "标准版":
+        # 标准版：排除包含任何非标准版关键词的项
+        return [e for e in entries if not e["non_standard"]]
+    # 其他版本：直接匹配包含该版本关键词的项
+    return [e for e in entries if version in e["name"]]
+
+
+def lookup_spec(index, version, model, memory, color):
+    """
+    在索引中确定唯一名称
+
+    参数:
+        memory: 已统一为 8GB+256GB 格式的内存
+    返回:
+        (名称或状态说明, 匹配成功时的规格型号，否则 None)
+    """
+    entries = index["models"].get(model)
+    if entries is None:
+        return UNMATCHED_MODEL.format(model=model), None
+
+    # 在该型号下按子串筛选同时包含内存和颜色的项（同一组合只筛选一次）
+    key = (model, memory, color)
+    candidates = index["matches"].get(key)
+    if candidates is None:
+        candidates = [e for e in entries if memory in e["text"] and color in e["text"]]
+        index["matches"][key] = candidates
+
+    if len(candidates) >= 2:
+        candidates = _filter_version(candidates, version)
+        if len(candidates) >= 2:
+            return AMBIGUOUS, None
+    if len(candidates) == 1:
+        return candidates[0]["name"], model
+    return NO_CONFIG.format(model=model), None
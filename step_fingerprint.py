@@ -0,0 +1,117 @@
+"""
+流程指纹（类似 make 的增量执行）
+
+每个步骤成功执行后，记录它的输入（原始表格目录、企业库存数量.xlsx、上游步骤的中间文件）和输出的指纹，
+保存在 ./中间文件—可忽略/流程指纹.json。再次运行时，输入指纹与上次一致、输出仍然存在且未被改动的步骤直接跳过，
+沿用上次的输出；上游步骤重新执行后输出有变化，下游步骤的输入指纹随之变化，会自动重新执行。
+
+文件指纹为 大小 + 修改时间 + 内容哈希，大小和修改时间都没变时沿用上次的哈希，不重新读取文件。
+"""
+import json
+import os
+
+from parse_cache import file_digest
+
+FINGERPRINT_PATH = "./中间文件—可忽略/流程指纹.json"
+# 步骤的处理逻辑有变化时调大版本号，旧指纹会整体失效
+PIPELINE_VERSION = 1
+
+
+def _empty():
+    return {"version": PIPELINE_VERSION, "steps": {}}
+
+
+def load_fingerprints(path=FINGERPRINT_PATH):
+    """读取流程指纹，文件不存在、损坏或版本不一致时返回空记录（所有步骤都会执行）"""
+    if not os.path.exists(path):
+        return _empty()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            fingerprints = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 流程指纹文件损坏，将重新执行全部步骤: {str(e)}")
+        return _empty()
+    if fingerprints.get("version") != PIPELINE_VERSION:
+        return _empty()
+    return fingerprints
+
+
+def save_fingerprints(fingerprints, path=FINGERPRINT_PATH):
+    """写入流程指纹（先写临时文件再替换，避免中断时留下半个文件）"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(fingerprints, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, path)
+
+
+def _expand(paths):
+    """目录展开为其中所有文件（按名称排序，跳过 Excel 打开时生成的 ~$ 临时文件），文件原样保留"""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if not name.startswith("~$"):
+                        expanded.append(os.path.join(root, name))
+        else:
+            expanded.append(path)
+    return [os.path.normpath(p) for p in expanded]
+
+
+def snapshot(paths, known=None):
+    """
+    计算一组文件/目录的指纹
+
+    参数:
+        paths: 文件或目录路径列表
+        known: 上次记录的指纹，大小和修改时间都没变的文件直接沿用其中的哈希
+    返回:
+        {路径: {"size", "mtime_ns", "digest"}}，不存在的路径为 None
+    """
+    known = known or {}
+    result = {}
+    for path in _expand(paths):
+        if not os.path.exists(path):
+            result[path] = None
+            continue
+        stat = os.stat(path)
+        previous = known.get(path)
+        if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+            digest = previous["digest"]
+        else:
+            digest = file_digest(path)
+        result[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+    return result
+
+
+def _digests(files):
+    return {path: entry and entry["digest"] for path, entry in files.items()}
+
+
+def is_up_to_date(fingerprints, step, inputs, outputs):
+    """步骤上次成功执行后，输入没有变化且输出都还在、没有被改动时返回 True"""
+    record = fingerprints["steps"].get(step)
+    if not record:
+        return False
+    current_outputs = snapshot(outputs, record["outputs"])
+    if any(entry is None for entry in current_outputs.values()):
+        return False
+    if _digests(current_outputs) != _digests(record["outputs"]):
+        return False
+    return _digests(snapshot(inputs, record["inputs"])) == _digests(record["inputs"])
+
+
+def record_step(fingerprints, step, inputs, outputs):
+    """步骤成功执行后记录输入和输出的指纹"""
+    previous = fingerprints["steps"].get(step) or {"inputs": {}, "outputs": {}}
+    fingerprints["steps"][step] = {
+        "inputs": snapshot(inputs, previous["inputs"]),
+        "outputs": snapshot(outputs, previous["outputs"]),
+    }
+
+
+def forget_step(fingerprints, step):
+    """步骤执行失败时删除其记录，下次一定重新执行"""
+    fingerprints["steps"].pop(step, None)
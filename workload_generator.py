@@ -0,0 +1,254 @@
+"""
+生成模拟数据（用于基准测试）
+
+按真实表格的格式生成一整套输入，行数可从 1 千扩展到 100 万：
+    抖音表格/国补_店铺名_店铺主体_x_批次.xlsx    抖店导出（含重复的"商品信息"列、带 ¥ 的金额）
+    3c商品名表格/网店宝导出_NNN.xlsx             网店宝导出（网店单号带字母后缀）
+    企业库存数量.xlsx                            多个 sheet，前两行为标题，第3行为列名
+    国补表.xlsx                                  每个店铺一个 sheet，第1行为标题，店铺主体按账单批次合并单元格
+同一个 seed 生成的数据完全相同。sku、商品名、国补表中的订单相互对应，
+匹配结果中正常匹配、两个单号、匹配过多、未找到等情况都会出现。
+
+用法:
+    python workload_generator.py 输出目录 --rows 100000 --seed 0
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from excel_writer import write_excel
+
+# (抖店店铺名, 店铺主体, 企业库存数量 sheet, 国补表 sheet)
+SHOPS = [
+    ("华为星桥专卖店", "河北星桥科技有限公司", "河北星桥", "抖音-华为星桥专卖店"),
+    ("华为崇云专卖店", "河北崇云电子商务有限公司", "河北崇云", "抖音-华为崇云专卖店"),
+    ("华为浩昌数码专卖店", "山东浩昌数码科技有限公司", "山东浩昌", "抖音-华为浩昌数码专卖店"),
+    ("荣耀星桥专卖店", "河北星桥科技有限公司", "河北星桥", "抖音-荣耀星桥专卖店"),
+    ("华为智慧通达专卖店", "河北智慧通达贸易有限公司", "河北智慧", "抖音-华为智慧通达专卖店"),
+]
+# 国补表中没有抖店订单的店铺（sheet 中只有无法匹配的订单）
+OTHER_GUOBU_SHEETS = ["抖音-vivo丽坤专卖店", "京东-崇云平板旗舰店", "抖音-vivo平板旗舰店"]
+SPEC_SHEETS = ["河北星桥", "河北崇云", "山东浩昌", "河北智慧", "河北丽坤"]
+
+SERIES = ["MatePad 11.5", "MatePad Air", "MatePad Pro 13.2", "MatePad SE", "MateBook E"]
+MODEL_PREFIXES = ["BTK", "DBY", "GOT", "ROD", "AGS", "KRJ", "PCE", "TGR"]
+MEMORIES = [(8, 128), (8, 256), (12, 256), (16, 512)]
+COLORS = ["深空灰", "星河银", "曜石黑", "晨曦白", "羽砂紫"]
+VERSIONS = ["标准版", "柔光版", "Pro版"]
+
+ROW_TYPES = ["订单货款", "订单退款", "国补垫资款", "垫资款退回"]
+ROW_TYPE_WEIGHTS = [0.55, 0.1, 0.3, 0.05]
+GUOBU_FILL_COLUMNS = ["账单批次", "行类型", "订单应付金额（元）", "政府补贴（元）", "店铺补贴（元）", "自营补贴（元）",
+                      "分账金额（元）", "服务费用（元）", "平台折扣（元）", "订单实付（元）", "采购折扣比例",
+                      "采购折扣金额（元）", "采购成本（元）", "结算金额（元）", "创建时间", "备注"]
+
+
+def build_catalog():
+    """商品目录：每个型号若干内存/颜色/版本组合，返回 DataFrame（型号、3c商品名、规格名称）"""
+    rows = []
+    for p, prefix in enumerate(MODEL_PREFIXES):
+        for n in range(3):
+            model = f"{prefix}-W{n:02d}"
+            series = SERIES[(p + n) % len(SERIES)]
+            for m, (ram, rom) in enumerate(MEMORIES):
+                for c, color in enumerate(COLORS):
+                    if (p + n + m + c) % 3 == 0:
+                        continue
+                    version = VERSIONS[(p + m + c) % len(VERSIONS)]
+                    spec_version = "" if version == "标准版" else f" {version}"
+                    rows.append({
+                        "model": model,
+                        "product_name": f"HUAWEI {series} {version} {model} {ram}G+{rom}G {color}",
+                        "spec_name": f"{series}{spec_version} {ram}GB+{rom}GB {color}",
+                    })
+    return pd.DataFrame(rows)
+
+
+def _money(rng, amounts, text_ratio):
+    """部分金额写成带 ¥ 的文本（与导出文件一致）"""
+    values = amounts.astype(object)
+    as_text = rng.random(len(amounts)) < text_ratio
+    values[as_text] = [f"¥ {v:.2f}" for v in amounts[as_text]]
+    return values
+
+
+def _write_preamble_workbook(path, sheets):
+    """
+    只写模式写出带标题行的工作簿
+    sheets: {sheet名: (标题行列表, 列名, DataFrame, 合并区域列表)}
+    """
+    wb = Workbook(write_only=True)
+    for name, (title_rows, header, df, merges) in sheets.items():
+        ws = wb.create_sheet(title=name)
+        for ref in merges:
+            ws.merged_cells.add(ref)
+        for row in title_rows:
+            ws.append(row)
+        ws.append(header)
+        for row in df.itertuples(index=False, name=None):
+            ws.append([None if isinstance(v, float) and np.isnan(v) else v for v in row])
+    wb.save(path)
+
+
+def _douyin_frame(rng, skus, row_types, amounts, created):
+    cost = np.round(amounts * 0.92, 2)
+    subsidy = np.round(amounts * 0.15, 2)
+    df = pd.DataFrame({
+        "费用项名称": "国补",
+        "行类型": row_types,
+        "sku单号": skus,
+        "商品一级类目": "平板电脑",
+        "商品信息": "平板电脑",
+        "商品信息 ": "HUAWEI 平板",
+        "税率": 0.13,
+        "订单应付金额（元）": amounts,
+        "政府补贴（元）": _money(rng, subsidy, 0.1),
+        "分账金额（元）": np.round(amounts - subsidy, 2),
+        "服务费用（元）": np.round(amounts * 0.006, 2),
+        "平台折扣（元）": 0,
+        "订单实付（元）": np.round(amounts - subsidy, 2),
+        "采购折扣比例": "0.92",
+        "采购折扣金额（元）": np.round(amounts * 0.08, 2),
+        "采购成本（元）": _money(rng, cost, 0.1),
+        "结算金额（元）": np.round(amounts - subsidy, 2),
+        "创建时间": created,
+        "备注": None,
+    })
+    # 抖店导出中有两列"商品信息"
+    return df.rename(columns={"商品信息 ": "商品信息"})
+
+
+def generate_workload(output_dir, rows=10000, seed=0, rows_per_file=20000):
+    """
+    生成一整套模拟输入
+
+    参数:
+        output_dir: 输出目录（运行主程序时的工作目录）
+        rows: 抖店导出的总行数，其余表格按比例生成
+        seed: 随机种子
+        rows_per_file: 每个导出文件的最大行数
+    返回:
+        各类文件的数量和行数统计
+    """
+    start_time = time.time()
+    rng = np.random.default_rng(seed)
+    douyin_dir = os.path.join(output_dir, "抖音表格")
+    wangdian_dir = os.path.join(output_dir, "3c商品名表格")
+    for folder in (douyin_dir, wangdian_dir, os.path.join(output_dir, "中间文件—可忽略")):
+        os.makedirs(folder, exist_ok=True)
+
+    catalog = build_catalog()
+    n_orders = max(1, rows // 2)
+    order_skus = (6900000000000000000 + np.arange(n_orders, dtype=np.int64) * 7919).astype(str)
+    order_shop = rng.integers(0, len(SHOPS), n_orders)
+    order_product = rng.integers(0, len(catalog), n_orders)
+
+    # 抖店导出：按店铺拆分，每个文件一个账单批次
+    row_order = np.sort(rng.integers(0, n_orders, rows))
+    row_types = rng.choice(ROW_TYPES, size=rows, p=ROW_TYPE_WEIGHTS)
+    sign = np.where(np.isin(row_types, ["订单退款", "垫资款退回"]), -1.0, 1.0)
+    amounts = np.round(rng.uniform(999, 8999, rows), 2) * sign
+    created = pd.Timestamp("2025-08-01") + pd.to_timedelta(rng.integers(0, 30 * 86400, rows), unit="s")
+    douyin = pd.DataFrame({"order": row_order, "row_type": row_types, "amount": amounts, "created": created})
+    douyin["shop"] = order_shop[row_order]
+
+    batch_no = 0
+    douyin_files = 0
+    for shop_idx, (shop_name, subject, _, _) in enumerate(SHOPS):
+        part = douyin[douyin["shop"] == shop_idx]
+        for start in range(0, len(part), rows_per_file):
+            chunk = part.iloc[start:start + rows_per_file]
+            batch_no += 1
+            batch = f"2025{batch_no:06d}"
+            df = _douyin_frame(rng, order_skus[chunk["order"].to_numpy()], chunk["row_type"].to_numpy(),
+                               chunk["amount"].to_numpy(), chunk["created"].to_numpy())
+            write_excel(os.path.join(douyin_dir, f"国补_{shop_name}_{subject}_x_{batch}.xlsx"), {"Sheet1": df})
+            douyin_files += 1
+
+    # 网店宝导出：95% 的订单有记录，网店单号带字母后缀，少量商品名为未知型号
+    used_orders = np.unique(row_order)
+    covered = used_orders[rng.random(len(used_orders)) < 0.95]
+    suffix = rng.choice(["", "A", "AB"], size=len(covered))
+    names = catalog["product_name"].to_numpy()[order_product[covered]].astype(object)
+    unknown = rng.random(len(covered)) < 0.03
+    names[unknown] = "HUAWEI MatePad 标准版 XYZ-W99 8G+128G 深空灰"
+    wangdian = pd.DataFrame({
+        "网店单号": np.char.add(order_skus[covered], suffix),
+        "店铺": [SHOPS[i][0] for i in order_shop[covered]],
+        "商品名称": names,
+        "数量": 1,
+    })
+    wangdian = wangdian.sample(frac=1, random_state=seed).reset_index(drop=True)
+    wangdian_files = 0
+    for start in range(0, max(len(wangdian), 1), rows_per_file):
+        write_excel(os.path.join(wangdian_dir, f"网店宝导出_{wangdian_files:03d}.xlsx"),
+                    {"Sheet1": wangdian.iloc[start:start + rows_per_file]}, text_columns=("网店单号",))
+        wangdian_files += 1
+
+    # 企业库存数量：每个 sheet 收录约 90% 的规格，偶尔同一规格有两个名称（无法排除到唯一值）
+    spec_sheets = {}
+    for sheet in SPEC_SHEETS:
+        keep = rng.random(len(catalog)) < 0.9
+        spec = catalog[keep]
+        dup = spec.sample(frac=0.02, random_state=int(rng.integers(1 << 30)))
+        spec = pd.concat([spec, dup.assign(spec_name=dup["spec_name"] + " ")], ignore_index=True)
+        frame = pd.DataFrame({"名称": spec["spec_name"], "数量": rng.integers(0, 50, len(spec)), "规格型号": spec["model"]})
+        spec_sheets[sheet] = ([[f"{sheet} 企业库存"], ["更新时间", "2025-08-31"]], ["名称", "数量", "规格型号"], frame, [])
+    _write_preamble_workbook(os.path.join(output_dir, "企业库存数量.xlsx"), spec_sheets)
+
+    # 国补表：垫资款行的订单按 1/2/3 条记录（及未收录）写入对应店铺的 sheet，店铺主体按账单批次合并
+    dianzi = douyin[~douyin["row_type"].str.startswith("订单")]
+    header = ["店铺主体", "账单批次", "sku单号", "订单金额"] + [f"{c}—1" for c in GUOBU_FILL_COLUMNS]
+    guobu_sheets = {}
+    guobu_rows = 0
+    sheet_orders = {sheet: dianzi.loc[dianzi["shop"] == i, "order"].unique() for i, (_, _, _, sheet) in enumerate(SHOPS)}
+    for sheet in OTHER_GUOBU_SHEETS:
+        sheet_orders[sheet] = np.arange(n_orders, n_orders + max(10, len(dianzi) // 20))
+    for sheet, orders in sheet_orders.items():
+        kind = rng.choice(4, size=len(orders), p=[0.8, 0.12, 0.03, 0.05])  # 一条/一正一负/三条/未收录
+        repeat = np.array([1, 2, 3, 0])[kind]
+        sku_idx = np.repeat(orders, repeat)
+        first = np.ones(len(sku_idx), dtype=bool)
+        first[1:] = sku_idx[1:] != sku_idx[:-1]
+        amount = np.round(rng.uniform(999, 8999, len(sku_idx)), 2)
+        amount[~first] *= -1
+        skus = np.array([str(6900000000000000000 + int(i) * 7919) for i in sku_idx], dtype=object)
+        batches = np.arange(len(sku_idx)) // 50
+        subject = next((s[1] for s in SHOPS if s[3] == sheet), "其他主体有限公司")
+        frame = pd.DataFrame({"店铺主体": np.where(np.r_[True, batches[1:] != batches[:-1]], subject, None),
+                              "账单批次": [f"GB{b:05d}" for b in batches], "sku单号": skus, "订单金额": amount})
+        for col in header[4:]:
+            frame[col] = None
+        starts = np.flatnonzero(np.r_[True, batches[1:] != batches[:-1]])
+        ends = np.r_[starts[1:], len(batches)] - 1
+        merges = [f"A{s + 3}:A{e + 3}" for s, e in zip(starts, ends) if e > s]
+        guobu_sheets[sheet] = ([[f"{sheet} 国补登记表"]], header, frame, ["A1:D1"] + merges)
+        guobu_rows += len(frame)
+    _write_preamble_workbook(os.path.join(output_dir, "国补表.xlsx"), guobu_sheets)
+
+    summary = {
+        "rows": rows,
+        "seed": seed,
+        "douyin_files": douyin_files,
+        "wangdian_files": wangdian_files,
+        "wangdian_rows": len(wangdian),
+        "spec_rows": sum(len(v[2]) for v in spec_sheets.values()),
+        "guobu_rows": guobu_rows,
+        "seconds": round(time.time() - start_time, 2),
+    }
+    print(f"✅ 模拟数据已生成：{os.path.abspath(output_dir)}，{summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成国补登记的模拟输入数据")
+    parser.add_argument("output_dir", help="输出目录")
+    parser.add_argument("--rows", type=int, default=10000, help="抖店导出的总行数（默认 10000）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--rows-per-file", type=int, default=20000, help="每个导出文件的最大行数")
+    args = parser.parse_args()
+    generate_workload(args.output_dir, rows=args.rows, seed=args.seed, rows_per_file=args.rows_per_file)
@@ -1,61 +1,24 @@
-import time
+import multiprocessing
+import os
+import sys
 import traceback
-import pandas as pd
-import numpy as np
-from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Alignment
-from openpyxl.utils.dataframe import dataframe_to_rows
+
+from excel_reader import read_sheet
+from excel_writer import write_excel, run_length_merges
+from second_registration import register_second, run_all_shops
+import order_store
+import perf_metrics
+
+# 批量模式的输出目录
+BATCH_OUTPUT_DIR = "./二次登记结果"
 
 
 '''
 国补二次登记，需要先下载国补表到根目录，还是在第一次国补登记的目录中。
 需要用到的文件是，新下载的国补表，还有中间文件——可忽略文件夹中的垫资款文件，及二次登记的数据。
 '''
-def unmerge_and_fill(excel_path, sheet_name, save_path=None):
-    # 加载工作簿
-    wb = load_workbook(excel_path, data_only=True)
-    ws = wb[sheet_name]
-
-    # 获取所有合并区域（先保存，避免解除后丢失）
-    merged_ranges = list(ws.merged_cells.ranges)
-
-    # 第一步：先解除所有合并（关键！解除后单元格变为普通单元格，可赋值）
-    for merged_range in merged_ranges:
-        ws.unmerge_cells(merged_range.coord)  # 先解除合并
-
-    # 第二步：再填充值（此时单元格已不是MergedCell，可修改value）
-    for merged_range in merged_ranges:
-        # 获取合并区域范围
-        min_col, min_row, max_col, max_row = merged_range.bounds
-        # 主值（合并前的第一个单元格值）
-        main_value = ws.cell(row=min_row, column=min_col).value
-
-        # 填充所有单元格
-        for row in range(min_row, max_row + 1):
-            for col in range(min_col, max_col + 1):
-                ws.cell(row=row, column=col, value=main_value)  # 此时可正常赋值
-
-    # 转为DataFrame
-    headers = [cell.value for cell in ws[2]]
-    data = [list(row) for row in ws.iter_rows(min_row=3, values_only=True)]
-    df = pd.DataFrame(data, columns=headers,dtype=object)
-
-    # 保存文件
-    if save_path:
-        wb.save(save_path)
-        print(f"处理完成，保存至：{save_path}")
-    wb.close()
-    # print(df.head())
-    return df
-def process_excel_files(table1_path, table2_path, output_table1_path, output_table2_path,sheet_name):
-    # 读取表1，指定dtype为object以保持原始数据类型
-    df1 = pd.read_excel(table1_path, dtype=object)
-
-    # 读取表2，指定dtype为object以保持原始数据类型
-    df2 = unmerge_and_fill(table2_path,sheet_name=sheet_name)
-    # df2 = pd.read_excel(table2_path,sheet_name="抖音-华为星桥专卖店", dtype=object,header=1)
-
-    # 检查必要字段是否存在
+def check_required_fields(df1, df2):
+    """检查必要字段是否存在"""
     required_fields1 = ["sku单号", "账单批次", "采购成本（元）", "服务费用（元）"]
     required_fields2 = ["sku单号", "账单批次—1"]
 
@@ -70,78 +33,21 @@ def process_excel_files(table1_path, table2_path, output_table1_path, output_tab
             error_msg.append(f"表2缺少必要字段: {', '.join(missing2)}")
         raise ValueError("; ".join(error_msg))
 
-    # 在表1中添加新列用于标记重复的SKU
-    df1["二次登记状态"] = ""
-
-    # 统计表2中每个sku单号的出现次数
-    sku_counts = df2["sku单号"].value_counts()
-
-    # 遍历表1垫资款的每一行
-    for idx, row in df1.iterrows():
-        current_sku = row["sku单号"]
-        cost = row["采购成本（元）"]
-        # 移除可能的货币符号和空格，再转换为浮点数
-        cost_clean = str(cost).replace('¥', '').replace(' ', '').strip()
-        cost_num = float(cost_clean)
-
-
-        # print(current_sku)
-        # 检查当前sku在表2中的出现次数
-        count = sku_counts.get(current_sku, 0)
-        # print(count)
-        if count == 0:
-            # 没有匹配的sku
-            df1.at[idx, "二次登记状态"] = "未匹配_未找到匹配"
-            continue
-        elif count == 2:
-            # 有两个或更多匹配的sku，做特殊标记
-            df1.at[idx, "二次登记状态"] = "两个单号"
-            mask = df2["sku单号"] == current_sku
-            matching_rows = df2[mask]  # 获取所有匹配的行,一般是两个，一个购买一个退货
-            if cost_num > 0:
-                print(f"行{idx + 2}：采购成本为正数（{cost_num}）")
-                filtered_rows = matching_rows[matching_rows["订单金额"].astype(float) > 0]
-                first_match_idx = filtered_rows.index[0]
 
-            elif cost_num < 0:
-                print(f"行{idx + 2}：采购成本为负数（{cost_num}）")
-                filtered_rows = matching_rows[matching_rows["订单金额"].astype(float) < 0]
-                first_match_idx = filtered_rows.index[0]
-            else:
-                print(f"行{idx + 2}：采购成本为零")
-                df1.at[idx, "二次登记状态"] = "未匹配_采购成本为零"
-                continue
-        elif count > 2:
-            # 选项过多，无法排除
-            df1.at[idx, "二次登记状态"] = "未匹配_匹配过多，无法排除"
-            continue
-        else:
-            # 只有一个匹配的sku
-            df1.at[idx, "二次登记状态"] = "正常匹配"
-            mask = df2["sku单号"] == current_sku
-            first_match_idx = df2[mask].index[0]
-            #
-            # dengji_num =  df2.loc[first_match_idx]["订单金额"]
-            # time.sleep(500)
-            #
-
-        # 填充数据到表2
-        df2.at[first_match_idx, "账单批次—1"] = row["账单批次"]
-        df2.at[first_match_idx, "行类型—1"] = row["行类型"]
-        df2.at[first_match_idx, "订单应付金额（元）—1"] = row["订单应付金额（元）"]
-        df2.at[first_match_idx, "政府补贴（元）—1"] = row["政府补贴（元）"]
-        df2.at[first_match_idx, "店铺补贴（元）—1"] = row["店铺补贴（元）"]
-        df2.at[first_match_idx, "自营补贴（元）—1"] = row["自营补贴（元）"]
-        df2.at[first_match_idx, "分账金额（元）—1"] = row["分账金额（元）"]
-        df2.at[first_match_idx, "服务费用（元）—1"] = row["服务费用（元）"]
-        df2.at[first_match_idx, "平台折扣（元）—1"] = row["平台折扣（元）"]
-        df2.at[first_match_idx, "订单实付（元）—1"] = row["订单实付（元）"]
-        df2.at[first_match_idx, "采购折扣比例—1"] = row["采购折扣比例"]
-        df2.at[first_match_idx, "采购折扣金额（元）—1"] = row["采购折扣金额（元）"]
-        df2.at[first_match_idx, "采购成本（元）—1"] = row["采购成本（元）"]
-        df2.at[first_match_idx, "结算金额（元）—1"] = row["结算金额（元）"]
-        df2.at[first_match_idx, "创建时间—1"] = row["创建时间"]
-        df2.at[first_match_idx, "备注—1"] = row["备注"]
+def register_and_save(df1, df2, output_table1_path, output_table2_path, verbose=None, lookup=None):
+    """
+    对已读取的表1、表2做二次登记并保存，返回 {状态: 行数}
+    verbose 为 None 时按运行详细程度决定是否逐行打印"两个单号"的采购成本正负（--verbose 时打印）
+    lookup 为从国补表本地库查询的 sku 索引，None 时由 df2 现场建立
+    """
+    check_required_fields(df1, df2)
+    if verbose is None:
+        verbose = perf_metrics.verbose()
+
+    # 按 sku单号 和订单金额正负一次性匹配表1所有行，标记"二次登记状态"并整块填充表2的"—1"列
+    with perf_metrics.stage("match"):
+        df1, df2 = register_second(df1, df2, verbose=verbose, lookup=lookup)
+        perf_metrics.note_rows(rows_in=len(df1), rows_out=len(df2))
     '''
     店铺主体	账单批次	sku单号	订单应付金额（元）	政府补贴（元）	分账金额（元）	服务费用（元）	订单实付（元）	采购折扣比例	
     采购折扣金额（元）	采购成本（元）	结算金额（元）	创建时间	备注	行类型	店铺名
@@ -151,140 +57,136 @@ def process_excel_files(table1_path, table2_path, output_table1_path, output_tab
     平台折扣（元）—1	订单实付（元）—1	采购折扣比例—1	采购折扣金额（元）—1	采购成本（元）—1	结算金额（元）—1	创建时间—1	备注—1
     '''
 
-    df1.to_excel(output_table1_path, index=False, engine='openpyxl')
-
-    # 改进的表2保存方法，避免string_conversion参数问题
-    # 使用openpyxl直接创建工作簿并写入数据
-    wb = Workbook()
-    ws = wb.active
-
-    # 写入表头
-    for col_idx, column in enumerate(df2.columns, 1):
-        ws.cell(row=1, column=col_idx, value=column)
-
-    sku_col_idx = None
-    for idx, col_name in enumerate(df2.columns, 1):
-        if col_name == "sku单号":
-            sku_col_idx = idx
-            break
-
-    # 写入数据行，同时处理sku单号的文本格式
-    for row_idx, row in enumerate(dataframe_to_rows(df2, index=False, header=False), 2):
-        for col_idx, value in enumerate(row, 1):
-            cell = ws.cell(row=row_idx, column=col_idx, value=value)
-            # 对sku单号列设置文本格式
-            if col_idx == sku_col_idx:
-                cell.number_format = '@'
-    # # 写入数据行，确保数据类型不变
-    # for row_idx, row in enumerate(dataframe_to_rows(df2, index=False, header=False), 2):
-    #     for col_idx, value in enumerate(row, 1):
-    #         # 直接写入原始值，不进行类型转换
-    #         ws.cell(row=row_idx, column=col_idx, value=value)
-
-    batch_col_idx = None
-    shop_col_idx = None
+    if '账单批次' not in df2.columns or '店铺主体' not in df2.columns:
+        raise ValueError("表2中未找到'账单批次—1'或'店铺主体'列")
 
-    # 遍历表头查找列索引
-    for col_idx, column in enumerate(df2.columns, 1):
-        if column == '账单批次':
-            batch_col_idx = col_idx
-        elif column == '店铺主体':
-            shop_col_idx = col_idx
+    # 保存阶段包含表2的合并单元格（合并区域在写出时一并登记）
+    with perf_metrics.stage("save"):
+        write_excel(output_table1_path, {"Sheet1": df1})
+        # 表2流式写出：sku单号列为文本格式，连续相同账单批次对应的店铺主体在写出时一并合并（只合并店铺主体，不合并账单批次）
+        # 工作表名、表头和时间格式保持原来 openpyxl Workbook 写出的样子（工作表名为 "Sheet"）
+        write_excel(output_table2_path, {"Sheet": df2},
+                    merged_cells={"Sheet": run_length_merges(df2['账单批次'], ['店铺主体'])},
+                    openpyxl_defaults=True)
+        perf_metrics.note_rows(rows_in=len(df1) + len(df2), rows_out=len(df1) + len(df2))
+        perf_metrics.count_written(output_table1_path, output_table2_path)
+    return df1["二次登记状态"].value_counts().to_dict()
 
-    if not batch_col_idx or not shop_col_idx:
-        raise ValueError("表2中未找到'账单批次—1'或'店铺主体'列")
 
-    # 从第二行开始处理数据（跳过标题行）
-    row = 3
-    while row <= ws.max_row:
-        # 获取当前行的账单批次值
-        current_batch = ws.cell(row=row, column=batch_col_idx).value
-        if current_batch is None:
-            row += 1
-            continue
+def process_excel_files(table1_path, table2_path, output_table1_path, output_table2_path,sheet_name):
+    perf_metrics.reset()
+    with perf_metrics.stage("read"):
+        # 读取表1，指定dtype为object以保持原始数据类型
+        df1 = read_sheet(table1_path)
+
+        # 读取表2：所选店铺的 sheet 未变化时直接从本地库读取，否则重新解析（表头在第2行，合并单元格填入左上角的值）后存入库中
+        conn = order_store.open_store()
+        try:
+            _, errors = order_store.sync_sheets(conn, table2_path, [sheet_name])
+            if sheet_name in errors:
+                raise ValueError(errors[sheet_name])
+            df2 = order_store.load_sheet(conn, sheet_name)
+            # 表1的 sku 在库中按索引查询匹配行
+            lookup = order_store.sku_lookup(conn, sheet_name, df1["sku单号"]) if "sku单号" in df1.columns else None
+        finally:
+            conn.close()
+        perf_metrics.note_rows(rows_out=len(df1) + len(df2))
+        perf_metrics.count_read(table1_path, table2_path)
+
+    status_counts = register_and_save(df1, df2, output_table1_path, output_table2_path, lookup=lookup)
+    perf_metrics.write_report("国补二次登记", extra={"shops": [sheet_name], "status_counts": status_counts})
 
-        # 查找连续相同的账单批次
-        merge_rows = 1
-        next_row = row + 1
-        while next_row <= ws.max_row and ws.cell(row=next_row, column=batch_col_idx).value == current_batch:
-            merge_rows += 1
-            next_row += 1
+    print(f"处理完成！")
+    print(f"已标记的表1已保存至: {output_table1_path}")
+    print(f"已更新的表2已保存至: {output_table2_path}")
 
-        # 合并店铺主体列（只合并店铺主体，不合并账单批次）
-        if merge_rows > 1:
-            # 合并对应的店铺主体列
-            ws.merge_cells(start_row=row, start_column=shop_col_idx,
-                           end_row=row + merge_rows - 1, end_column=shop_col_idx)
 
-            # 设置合并后单元格的对齐方式为居中
-            ws.cell(row=row, column=shop_col_idx).alignment = Alignment(horizontal='center', vertical='center')
+def register_shop(shop, df1, df2, output_dir):
+    """批量模式下处理单个店铺（在子进程中运行），结果文件名带店铺名"""
+    output_table1_path = os.path.join(output_dir, f"垫资款_已标记_{shop}.xlsx")
+    output_table2_path = os.path.join(output_dir, f"国补_已更新_{shop}.xlsx")
+    # 各店铺的阶段不混入批量运行报告
+    with perf_metrics.suspended():
+        return register_and_save(df1.copy(), df2, output_table1_path, output_table2_path, verbose=False)
 
-        # 处理下一组数据
-        row += merge_rows
 
+# 店铺列表（与数字1-8对应）
+SHOPS = [
+    "抖音-华为星桥专卖店",
+    "抖音-vivo丽坤专卖店",
+    "抖音-华为崇云专卖店",
+    "抖音-华为浩昌数码专卖店",
+    "京东-崇云平板旗舰店",
+    "抖音-荣耀星桥专卖店",
+    "抖音-华为智慧通达专卖店",
+    "抖音-vivo平板旗舰店"
+]
 
-    wb.save(output_table2_path)
 
-    print(f"处理完成！")
-    print(f"已标记的表1已保存至: {output_table1_path}")
-    print(f"已更新的表2已保存至: {output_table2_path}")
 def select_shop():
     """
-    用户交互选择店铺，返回选中的店铺名称（用于sheet_name赋值）
+    用户交互选择店铺，返回选中的店铺名称列表（用于sheet_name赋值）
+    输入单个数字处理一个店铺；多个数字用逗号分隔（如 1,3,5）或输入 0 处理全部店铺时进入批量模式
     """
-    # 1. 定义店铺列表（与数字1-8对应）
-    shops = [
-        "抖音-华为星桥专卖店",
-        "抖音-vivo丽坤专卖店",
-        "抖音-华为崇云专卖店",
-        "抖音-华为浩昌数码专卖店",
-        "京东-崇云平板旗舰店",
-        "抖音-荣耀星桥专卖店",
-        "抖音-华为智慧通达专卖店",
-        "抖音-vivo平板旗舰店"
-    ]
-
-    # 2. 打印店铺选择菜单
+    # 1. 打印店铺选择菜单
     print("=" * 60)
     print(" 欢迎使用国补二次登记，请确保已下载最新国补表，并且中间文件中包含要登记的表格          ")
     print("                请选择需要处理的店铺（输入1-8）          ")
     print("=" * 60)
-    for i, shop in enumerate(shops, 1):  # 遍历店铺，显示“数字+店铺名”
+    for i, shop in enumerate(SHOPS, 1):  # 遍历店铺，显示“数字+店铺名”
         print(f"          {i} → {shop}")
+    print(f"          0 → 全部店铺（批量处理）")
+    print("   多个店铺可用逗号分隔，如 1,3,5")
     print("=" * 60)
 
-    # 3. 循环获取用户输入（直到输入合法）
+    # 2. 循环获取用户输入（直到输入合法）
     while True:
         user_input = input("请输入选择的数字（1-8）：").strip()  # 获取输入并去除空格
+        if user_input == "0":
+            print(f"\n✅ 已选择全部 {len(SHOPS)} 个店铺")
+            print("=" * 50)
+            return list(SHOPS)
 
-        # 3.1 验证输入是否为数字
-        if not user_input.isdigit():
+        parts = [p.strip() for p in user_input.replace("，", ",").split(",") if p.strip()]
+
+        # 2.1 验证输入是否为数字
+        invalid = [p for p in parts if not p.isdigit()]
+        if not parts or invalid:
             print(f"❌ 输入错误！请输入1-8之间的数字，当前输入：{user_input}")
             continue
 
-        # 3.2 验证数字是否在1-8范围内
-        select_num = int(user_input)
-        if select_num < 1 or select_num > 8:
-            print(f"❌ 数字超出范围！请输入1-8之间的数字，当前输入：{select_num}")
+        # 2.2 验证数字是否在1-8范围内
+        numbers = [int(p) for p in parts]
+        out_of_range = [n for n in numbers if n < 1 or n > 8]
+        if out_of_range:
+            print(f"❌ 数字超出范围！请输入1-8之间的数字，当前输入：{out_of_range[0]}")
             continue
 
-        # 3.3 输入合法，返回对应的店铺名
-        selected_shop = shops[select_num - 1]  # 列表索引从0开始，需减1
-        print(f"\n✅ 已选择店铺：{selected_shop}")
+        # 2.3 输入合法，返回对应的店铺名（去重并保持输入顺序）
+        selected_shops = [SHOPS[n - 1] for n in dict.fromkeys(numbers)]  # 列表索引从0开始，需减1
+        print(f"\n✅ 已选择店铺：{'、'.join(selected_shops)}")
         print("=" * 50)
-        return selected_shop
+        return selected_shops
 # 使用示例
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    # --verbose：逐行打印"两个单号"的采购成本正负等调试内容
+    if "--verbose" in sys.argv[1:]:
+        perf_metrics.set_verbosity(2)
     # 请替换为实际的文件路径
     table1_path = "./中间文件—可忽略/垫资款结果_未处理.xlsx"
     table2_path = "国补表.xlsx"
     output_table1_path = "垫资款_已标记.xlsx"
     output_table2_path = "国补_已更新.xlsx"
-    sheet_name = select_shop()
-    # sheet_name = "抖音-华为星桥专卖店"
+    shops = select_shop()
+    # shops = ["抖音-华为星桥专卖店"]
 
     try:
-        process_excel_files(table1_path, table2_path, output_table1_path, output_table2_path,sheet_name)
+        if len(shops) == 1:
+            process_excel_files(table1_path, table2_path, output_table1_path, output_table2_path, shops[0])
+        else:
+            # 批量模式：国补表只读取一次，各店铺并行处理，结果保存到 二次登记结果 文件夹
+            run_all_shops(register_shop, table1_path, table2_path, shops, BATCH_OUTPUT_DIR, report_name="国补二次登记")
     except Exception as e:
         print(f"操作失败: {str(e)}")
         traceback.print_exc()
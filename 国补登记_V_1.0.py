@@ -1,13 +1,28 @@
+import functools
 import os
 import re
+import numpy as np
 import pandas as pd
-import openpyxl
-from openpyxl.styles import Alignment
 from datetime import datetime, time
 import sys
 import io
+import multiprocessing
 import time
-from openpyxl import load_workbook
+
+from excel_reader import read_sheet, read_sheets, list_sheets, read_header, iter_sheet_chunks
+from excel_writer import write_excel, run_length_merges, excel_sheet_stream
+from spec_index import build_spec_index, lookup_spec
+from fuzzy_match import build_fuzzy_index, fuzzy_lookup
+from intermediate_store import is_store_path, save_frame, read_frame, frame_stream
+from frame_schema import apply_schema, concat_frames, memory_mb
+from parse_cache import load_manifest, save_manifest, lookup_cached_frame, store_cached_frame, prune_cache
+import batch_ledger
+import name_index
+import match_cache
+from order_store import sheet_fingerprints
+from parallel_ingest import run_parallel, default_workers
+import step_fingerprint
+import perf_metrics
 
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
@@ -17,11 +32,9 @@ def process_order_numbers(input_path):
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"输入文件不存在: {input_path}")
 
-    # 读取Excel文件
+    # 读取Excel文件（只解析第一个sheet）
     try:
-        excel_data = pd.read_excel(input_path, sheet_name=None,dtype=object)
-        main_sheet = next(iter(excel_data.keys()))  # 取第一个sheet
-        df = excel_data[main_sheet].copy()
+        df = read_sheet(input_path, sheet_name=0)
     except Exception as e:
         raise Exception(f"读取Excel失败: {str(e)}")
 
@@ -45,22 +58,22 @@ def process_order_numbers(input_path):
     df = df.reindex(columns=cols)
 
     print(f"📊 已处理文件: {os.path.basename(input_path)}，记录数：{len(df)}")
-    return df  # 仅返回处理后的数据框
+    return apply_schema(df)  # 仅返回处理后的数据框（按字段约定转为紧凑类型）
 
 def create_summary_file( all_dataframes):
     """创建汇总表"""
     try:
         # 合并所有数据
-        summary_df = pd.concat(all_dataframes, ignore_index=True)
+        summary_df = concat_frames(all_dataframes)
 
 
-        # 生成带时间戳的汇总文件名，避免重复
-        summary_path = f"./中间文件—可忽略/网店单号汇总表.xlsx"
+        # 汇总表只在步骤之间流转，保存为列式中间文件
+        summary_path = f"./中间文件—可忽略/网店单号汇总表.feather"
 
         # 保存汇总表
-        with pd.ExcelWriter(summary_path, engine='openpyxl') as writer:
-            summary_df.to_excel(writer, sheet_name="汇总数据", index=False)
+        save_frame(summary_df, summary_path)
 
+        perf_metrics.note_rows(rows_in=len(summary_df), rows_out=len(summary_df))
         print(f"\n📑 汇总表已生成，共 {len(summary_df)} 条记录")
         print(f"📌 汇总表路径：{summary_path}")
         return summary_path
@@ -68,13 +81,17 @@ def create_summary_file( all_dataframes):
         print(f"❌ 生成汇总表失败: {str(e)}")
         return None
 
-def batch_process_excel(input_dir):
+def batch_process_excel(input_dir, cache_dir=None, max_workers=1, index_path=None):
     """
-    批量处理文件夹中的所有Excel文件，仅生成汇总表
+    批量处理文件夹中的所有Excel文件，生成汇总表并更新3c商品名称索引
 
     参数:
         input_dir: 包含Excel文件的输入文件夹路径
-
+        cache_dir: 逐文件解析缓存目录，None则不使用缓存（每次全部重新解析）
+        max_workers: 并行解析的进程数，1为串行（默认），None按CPU核心数
+        index_path: 3c商品名称索引路径（只写入新增或改动的表格），None则不更新索引（默认，main 中传入 name_index.INDEX_PATH）
+    返回:
+        汇总表路径，未生成汇总表时为 None
     """
     # 验证输入文件夹
     if not os.path.isdir(input_dir):
@@ -84,45 +101,92 @@ def batch_process_excel(input_dir):
     processed_count = 0
     error_files = []
     all_data = []  # 用于存储所有处理后的数据
+    processed_paths = []  # 与 all_data 对应的源文件路径
+    cached_count = 0
+    seen_paths = []
+    manifest = load_manifest(cache_dir) if cache_dir else None
 
-    # 遍历所有文件和子文件夹
+    # 遍历所有文件和子文件夹（按名称排序，保证汇总顺序稳定）
     for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
         # 处理当前目录下的Excel文件
-        for file in files:
+        for file in sorted(files):
             # 只处理Excel文件
             if file.lower().endswith(('.xlsx', '.xls', '.xlsm')):
-                input_path = os.path.join(root, file)
+                seen_paths.append(os.path.join(root, file))
+
+    # 第一步：未改动的文件直接使用缓存
+    frames = [None] * len(seen_paths)
+    if manifest is not None:
+        for i, input_path in enumerate(seen_paths):
+            try:
+                frames[i] = lookup_cached_frame(manifest, cache_dir, input_path)
+            except Exception as e:
+                print(f"⚠️ 读取缓存失败 {os.path.basename(input_path)}，将重新解析: {str(e)}")
+            if frames[i] is not None:
+                cached_count += 1
+                print(f"♻️ 使用缓存: {os.path.basename(input_path)}，记录数：{len(frames[i])}")
+
+    # 第二步：其余文件调用处理函数（可多进程并行）
+    pending = [i for i, frame in enumerate(frames) if frame is None]
+    results = run_parallel(process_order_numbers, [(seen_paths[i],) for i in pending], max_workers)
+    failed = {}
+    for i, (processed_df, error) in zip(pending, results):
+        if error is not None:
+            failed[i] = error
+            continue
+        frames[i] = processed_df
+        if manifest is not None:
+            store_cached_frame(manifest, cache_dir, seen_paths[i], processed_df)
+
+    # 第三步：按文件顺序汇总
+    for i, input_path in enumerate(seen_paths):
+        file = os.path.basename(input_path)
+        if i in failed:
+            print(f"❌ 处理失败 {file}: {failed[i]}")
+            error_files.append((file, failed[i]))
+            continue
 
-                try:
-                    # 调用处理函数，获取处理后的数据
-                    processed_df = process_order_numbers(input_path)
+        processed_df = frames[i]
+        # 添加来源文件信息
+        processed_df['来源文件'] = file
+        processed_df['来源路径'] = os.path.relpath(input_path, input_dir)
 
-                    # 添加来源文件信息
-                    processed_df['来源文件'] = file
-                    processed_df['来源路径'] = os.path.relpath(input_path, input_dir)
+        all_data.append(processed_df)
+        processed_paths.append(input_path)
+        processed_count += 1
 
-                    all_data.append(processed_df)
-                    processed_count += 1
-                except Exception as e:
-                    print(f"❌ 处理失败 {file}: {str(e)}")
-                    error_files.append((file, str(e)))
+    if manifest is not None:
+        pruned = prune_cache(manifest, cache_dir, seen_paths)
+        save_manifest(cache_dir, manifest)
+        if pruned:
+            print(f"🧹 已清理 {pruned} 个已删除文件的缓存")
+
+    if index_path:
+        conn = name_index.open_index(index_path)
+        try:
+            written = name_index.sync_index(conn, processed_paths, all_data)
+        finally:
+            conn.close()
+        print(f"🗂️ 3c商品名称索引已更新（写入 {written} 个新增或改动的表格）")
 
     # 生成汇总表
+    summary_path = None
     if all_data:
-        create_summary_file(all_data)
+        summary_path = create_summary_file(all_data)
     else:
         print("\n⚠️ 没有可汇总的数据，未生成汇总表")
 
     # 输出处理 summary
     print("\n" + "=" * 50)
-    print(f"处理完成 | 成功: {processed_count} | 失败: {len(error_files)}")
+    print(f"处理完成 | 成功: {processed_count}（其中缓存 {cached_count}） | 失败: {len(error_files)}")
 
     if error_files:
         print("\n失败文件列表:")
         for file, error in error_files:
             print(f"- {file}: {error}")
 
-    return
+    return summary_path
 
 # 开始处理抖音店铺文件
     # 根据sku订单号去重，（弃用） 会删除退货的订单导致数据错误（退货的和购买的是同一个订单号）
@@ -162,18 +226,11 @@ def merge_excel_with_duplicates(input_dir, order_column, output_path=None):
                         print(f"⚠️ 文件名格式不标准 {file}，账单批次设为'未知账单批次'")
                     # ======================================================
 
-                    # 第一步：先读取表头，确认订单列是否存在
-                    df_header = pd.read_excel(file_path, nrows=0,dtype=object)
-                    if order_column not in df_header.columns:
+                    # 读取完整数据（只解析一次），再确认订单列是否存在
+                    df = read_sheet(file_path)
+                    if order_column not in df.columns:
                         raise ValueError(f"文件 {file} 缺少订单字段: {order_column}")
 
-                    # 第二步：读取完整数据，强制订单列为字符串
-                    df = pd.read_excel(
-                        file_path
-                        ,dtype=object
-                        # ,converters={order_column: str}
-                    )
-
                     # ==================== 新增：添加店铺主体字段（放在最前面） ====================
                     df.insert(0, "店铺主体", shop_subject)  # 插入到第0列（最前面）
                     df.insert(1, "店铺名", shop_name)
@@ -213,17 +270,8 @@ def merge_excel_with_duplicates(input_dir, order_column, output_path=None):
 
     # 保存到Excel（确保订单号为文本格式）
     try:
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            main_df.to_excel(writer, sheet_name='主数据（去重后）', index=False)
-            duplicate_df.to_excel(writer, sheet_name='重复数据备份', index=False)
-
-            # 强制订单列为文本格式（原有逻辑保留）
-            for sheet_name in ['主数据（去重后）', '重复数据备份']:
-                worksheet = writer.sheets[sheet_name]
-                col_idx = main_df.columns.get_loc(order_column)
-                for row in range(1, worksheet.max_row + 1):
-                    cell = worksheet.cell(row=row, column=col_idx + 1)
-                    cell.number_format = '@'
+        write_excel(output_path, {'主数据（去重后）': main_df, '重复数据备份': duplicate_df},
+                    text_columns=[order_column])
 
         print(f"\n💾 合并完成，已保存至: {os.path.abspath(output_path)}")
         print(f"📌 主数据记录数: {len(main_df)}")
@@ -241,114 +289,193 @@ def merge_excel_with_duplicates(input_dir, order_column, output_path=None):
     # 根据文件名称中的订单批次来判断该文件是否下载重复。
     # 根据文件名中的订单批次去重
 
-def merge_excel_by_batch(input_dir, order_column, output_path=None):
+def read_douyin_export(file_path, order_column):
+    """读取单个抖店导出文件（强制订单列为字符串），缺少订单字段时报错"""
+    file = os.path.basename(file_path)
+    # 读取完整数据（只解析一次），再确认订单列是否存在
+    df = read_sheet(file_path)
+    if order_column not in df.columns:
+        raise ValueError(f"文件 {file} 缺少订单字段: {order_column}")
+    return apply_schema(df)
+
+def parse_order_batch(file):
+    """文件名按"_"拆分的第五个元素（索引4）为订单批次，格式不标准时为 未知批次"""
+    # ==================== 提取订单批次（按"-"分割的第四个元素） ====================
+    file_name = os.path.splitext(file)[0]  # 去除文件后缀
+    # 按"-"分割文件名
+    batch_parts = file_name.split("_")
+
+    # 检查是否有至少4个元素（索引0-3）
+    if len(batch_parts) >= 4:
+        return batch_parts[4]  # 第五个元素（索引4）作为订单批次
+    print(f"⚠️ 文件名格式不标准 {file}，无法提取订单批次，设为'未知批次'")
+    return "未知批次"
+
+
+def parse_shop_info(file):
+    """从文件名中提取店铺名、店铺主体和账单批次，返回 {"shop_name", "shop_subject", "bill_batch"}"""
+    # ==================== 提取店铺主体等信息（按"_"拆分） ====================
+    # 文件名格式：国补_店铺名_店铺主体_时间（按"_"拆分）
+    parts = os.path.splitext(file)[0].split("_")
+    if len(parts) >= 4:  # 确保格式正确
+        return {
+            "shop_name": parts[1],  # 店铺名在第2个位置（索引1）
+            "shop_subject": parts[2],  # 店铺主体在第3个位置（索引2）
+            "bill_batch": parts[4] if len(parts) > 4 else "未知",  # 账单批次
+        }
+    print(f"⚠️ 文件名格式不标准 {file}，店铺信息使用默认值")
+    return {"shop_name": "未知店铺", "shop_subject": "未知主体", "bill_batch": "未知账单批次"}
+
+
+def merge_excel_by_batch(input_dir, order_column, output_path=None, ledger_path=None, max_workers=1):
     """
     合并Excel文件，根据文件名中用"-"分割的第四个元素（订单批次）检测重复文件
     强制订单号为文本格式，新增“店铺主体”字段
+
+    传入 ledger_path 时为追加模式：台账中已合并过的批次不再读取，
+    新批次的数据追加到 output_path 已有的合并结果后面，重复批次的检测跨运行生效。
+    max_workers 为并行读取的进程数，1为串行（默认），None按CPU核心数。
     """
     # 验证输入文件夹
     if not os.path.isdir(input_dir):
         raise NotADirectoryError(f"输入路径不是有效文件夹: {input_dir}")
 
+    # 追加模式：读取台账和已有的合并结果（两者缺一则重新全量合并）
+    ledger = None
+    existing_df = None
+    if ledger_path:
+        ledger = batch_ledger.load_ledger(ledger_path)
+        if not batch_ledger.is_empty(ledger):
+            if output_path and os.path.exists(output_path):
+                existing_df = read_frame(output_path)
+                print(f"📂 追加模式：已有合并结果 {len(existing_df)} 条，"
+                      f"台账中已有 {len(ledger['batches'])} 个批次")
+            else:
+                print("⚠️ 台账存在但合并结果缺失，将重新全量合并")
+                ledger = batch_ledger.load_ledger(None)
+
     # 读取所有Excel文件（强制订单列为字符串）
     all_data = []
     processed_files = []
     error_files = []
-    processed_batches = set()  # 用于记录已处理的订单批次
     duplicate_files = []  # 用于记录重复批次的文件
+    ingested_files = []  # 追加模式下已合并过、本次跳过的文件
+    new_entries = []  # 本次新合并的（批次, 相对路径, 记录数），保存成功后登记到台账
+    candidates = []  # 待读取的文件（按遍历顺序）
 
-    for root, _, files in os.walk(input_dir):
-        for file in files:
+    # 第一步：遍历文件夹（按名称排序），根据文件名确定订单批次和店铺信息
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for file in sorted(files):
             if file.lower().endswith(('.xlsx', '.xls', '.xlsm')):
                 file_path = os.path.join(root, file)
                 try:
-                    # ==================== 提取订单批次（按"-"分割的第四个元素） ====================
-                    file_name = os.path.splitext(file)[0]  # 去除文件后缀
-                    # 按"-"分割文件名
-                    batch_parts = file_name.split("_")
-
-                    # 检查是否有至少4个元素（索引0-3）
-                    if len(batch_parts) >= 4:
-                        order_batch = batch_parts[4]  # 第五个元素（索引4）作为订单批次
-                    else:
-                        order_batch = "未知批次"
-                        print(f"⚠️ 文件名格式不标准 {file}，无法提取订单批次，设为'未知批次'")
-
-                    # 检查该订单批次是否已处理过
-                    if order_batch in processed_batches and order_batch != "未知批次":
-                        duplicate_files.append((file, order_batch))
-                        print(f"⚠️ 订单批次重复，已跳过: {file}（批次: {order_batch}）")
-                        continue
-                    # ======================================================================
-
-                    # ==================== 提取店铺主体等信息（按"_"拆分） ====================
-                    # 文件名格式：国补_店铺名_店铺主体_时间（按"_"拆分）
-                    parts = file_name.split("_")
-                    if len(parts) >= 4:  # 确保格式正确
-                        shop_name = parts[1]  # 店铺名在第2个位置（索引1）
-                        shop_subject = parts[2]  # 店铺主体在第3个位置（索引2）
-                        bill_batch = parts[4] if len(parts) > 4 else "未知"  # 账单批次
-                    else:
-                        shop_name = "未知店铺"
-                        shop_subject = "未知主体"
-                        bill_batch = "未知账单批次"
-                        print(f"⚠️ 文件名格式不标准 {file}，店铺信息使用默认值")
-                    # ======================================================
-
-                    # 第一步：先读取表头，确认订单列是否存在
-                    df_header = pd.read_excel(file_path, nrows=0,dtype=object)
-                    if order_column not in df_header.columns:
-                        raise ValueError(f"文件 {file} 缺少订单字段: {order_column}")
-
-                    # 第二步：读取完整数据，强制订单列为字符串
-                    df = pd.read_excel(
-                        file_path
-                        ,dtype=object
-                        # converters={order_column: str}
-                    )
-
-                    # ==================== 添加店铺相关字段（放在最前面） ====================
-                    df.insert(0, "店铺主体", shop_subject)
-                    df.insert(1, "店铺名", shop_name)
-                    df.insert(2, "账单批次", bill_batch)
+                    order_batch = parse_order_batch(file)
+
+                    # 追加模式：检查该订单批次是否在之前的运行中合并过
+                    rel_path = os.path.relpath(file_path, input_dir)
+                    if ledger is not None:
+                        entry = batch_ledger.find_ingested(ledger, order_batch, rel_path, "未知批次")
+                        if entry and entry["file"] == rel_path:
+                            ingested_files.append(file)
+                            continue
+                        if entry:
+                            duplicate_files.append((file, order_batch))
+                            print(f"⚠️ 订单批次已在 {entry['file']} 中合并过，已跳过: {file}（批次: {order_batch}）")
+                            continue
                     # ======================================================================
 
-                    # 添加来源信息
-                    df['来源文件'] = file
-                    df['来源路径'] = os.path.relpath(file_path, input_dir)
-                    all_data.append(df)
-                    processed_files.append(file)
-                    processed_batches.add(order_batch)  # 记录已处理的订单批次
-                    print(f"✅ 已读取: {file} (记录数: {len(df)})，批次: {order_batch}，店铺主体: {shop_subject}")
+                    candidates.append({
+                        "file": file, "file_path": file_path, "rel_path": rel_path,
+                        "order_batch": order_batch, **parse_shop_info(file),
+                    })
                 except Exception as e:
                     print(f"❌ 读取失败 {file}: {str(e)}")
                     error_files.append((file, str(e)))
 
+    # 第二步：读取文件（可多进程并行）。同一批次只读取第一个文件，其余视为重复；
+    # 第一个文件读取失败时，下一轮再读取该批次的下一个文件
+    queues = {}
+    for seq, candidate in enumerate(candidates):
+        candidate["seq"] = seq
+        key = candidate["order_batch"]
+        if key == "未知批次":
+            key = (key, candidate["rel_path"])  # 未知批次的文件互不视为重复
+        queues.setdefault(key, []).append(candidate)
+
+    loaded = []
+    duplicates = []
+    while queues:
+        keys = list(queues)
+        heads = [queues[key].pop(0) for key in keys]
+        results = run_parallel(read_douyin_export, [(c["file_path"], order_column) for c in heads], max_workers)
+        for key, candidate, (df, error) in zip(keys, heads, results):
+            if error is not None:
+                print(f"❌ 读取失败 {candidate['file']}: {error}")
+                error_files.append((candidate["file"], error))
+                if not queues[key]:
+                    del queues[key]
+                continue
+            loaded.append((candidate, df))
+            duplicates.extend(queues.pop(key))
+
+    for candidate in sorted(duplicates, key=lambda c: c["seq"]):
+        duplicate_files.append((candidate["file"], candidate["order_batch"]))
+        print(f"⚠️ 订单批次重复，已跳过: {candidate['file']}（批次: {candidate['order_batch']}）")
+
+    # 第三步：按文件顺序添加店铺相关字段
+    for candidate, df in sorted(loaded, key=lambda item: item[0]["seq"]):
+        # ==================== 添加店铺相关字段（放在最前面） ====================
+        df.insert(0, "店铺主体", candidate["shop_subject"])
+        df.insert(1, "店铺名", candidate["shop_name"])
+        df.insert(2, "账单批次", candidate["bill_batch"])
+        # ======================================================================
+
+        # 添加来源信息
+        df['来源文件'] = candidate["file"]
+        df['来源路径'] = candidate["rel_path"]
+        all_data.append(apply_schema(df))
+        processed_files.append(candidate["file"])
+        new_entries.append((candidate["order_batch"], candidate["rel_path"], len(df)))
+        print(f"✅ 已读取: {candidate['file']} (记录数: {len(df)})，批次: {candidate['order_batch']}，店铺主体: {candidate['shop_subject']}")
+
+    if ingested_files:
+        print(f"\n♻️ 追加模式：{len(ingested_files)} 个文件的批次已合并过，本次跳过")
+
     if not all_data:
+        if existing_df is not None:
+            perf_metrics.note_rows(rows_in=0, rows_out=len(existing_df))
+            print("\n✅ 没有新的账单批次，合并结果无需更新")
+            return output_path
         print("\n⚠️ 未找到可合并的有效数据")
         return None
 
-    # 合并所有数据
-    merged_df = pd.concat(all_data, ignore_index=True)
+    # 合并所有数据（追加模式下接在已有结果后面）
+    new_records = sum(len(df) for df in all_data)
+    if existing_df is not None:
+        all_data.insert(0, existing_df)
+    merged_df = concat_frames(all_data)
     total_records = len(merged_df)
-    print(f"\n📊 总记录数: {total_records}")
+    perf_metrics.note_rows(rows_in=new_records, rows_out=total_records)
+    print(f"\n📊 总记录数: {total_records}（内存占用 {memory_mb(merged_df)} MB）")
 
     # 处理输出路径
     if not output_path:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_path = f"合并结果_按批次去重_{timestamp}.xlsx"
 
-    # 保存到Excel（确保订单号为文本格式）
+    # 保存合并结果（.feather 为列式中间文件，否则保存到Excel并确保订单号为文本格式）
     try:
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            merged_df.to_excel(writer, sheet_name='合并数据', index=False)
+        if is_store_path(output_path):
+            save_frame(merged_df, output_path)
+        else:
+            write_excel(output_path, {'合并数据': merged_df}, text_columns=[order_column])
 
-            # 强制订单列为文本格式
-            worksheet = writer.sheets['合并数据']
-            col_idx = merged_df.columns.get_loc(order_column)
-            for row in range(1, worksheet.max_row + 1):
-                cell = worksheet.cell(row=row, column=col_idx + 1)
-                cell.number_format = '@'
+        # 合并结果保存成功后再登记台账，保证两者一致
+        if ledger is not None:
+            for order_batch, rel_path, rows in new_entries:
+                batch_ledger.record_ingested(ledger, order_batch, rel_path, rows, "未知批次")
+            batch_ledger.save_ledger(ledger_path, ledger)
 
         print(f"\n💾 合并完成，已保存至: {os.path.abspath(output_path)}")
         print(f"📌 处理的文件数: {len(processed_files)}")
@@ -368,38 +495,32 @@ def merge_excel_by_batch(input_dir, order_column, output_path=None):
         print(f"\n❌ 保存文件失败: {str(e)}")
         return None
 # 开始比对并处理结果
-def create_guobu_table(douyin_path, output_guobu_path):
-    """从抖音订单表提取字段，创建初始国补登记结果表"""
-    if not os.path.exists(douyin_path):
-        raise FileNotFoundError(f"抖音订单文件不存在: {douyin_path}")
+# 要操作的所有字段，检查抖音汇总文件是否缺少字段
+GUOBU_REQUIRED_FIELDS = ["店铺主体","sku单号", "订单应付金额（元）", "政府补贴（元）", "采购成本（元）","服务费用（元）","行类型", "账单批次"]
+# 订单货款的单独表格字段
+DINGDAN_FIELDS = ["账单批次","店铺主体", "费用项名称","行类型","sku单号","商品一级类目","商品信息.1","税率","订单应付金额（元）", "政府补贴（元）", "分账金额（元）", "服务费用（元）", "平台折扣（元）","订单实付（元）","采购折扣比例","采购折扣金额（元）","采购成本（元）", "结算金额（元）","创建时间","备注","店铺名"]
+# 垫资款的单独表格字段
+DIANZI_FIELDS = ["店铺主体","sku单号","账单批次","行类型","订单应付金额（元）", "政府补贴（元）", "分账金额（元）", "服务费用（元）", "平台折扣（元）", "订单实付（元）","采购折扣比例","采购折扣金额（元）","采购成本（元）", "结算金额（元）","创建时间","备注","店铺名"]
 
-    # 关键修复1：读取时强制"sku单号"为字符串，避免长数字精度丢失
-    try:
-        douyin_df = pd.read_excel(
-            douyin_path,
-            dtype = object,
-            # converters={"sku单号": str}  # 强制以字符串读取，保留原始格式
-        )
-        print(f"✅ 成功读取抖音订单表，共 {len(douyin_df)} 条记录")
-    except Exception as e:
-        raise Exception(f"读取抖音订单表失败: {str(e)}")
 
-    # 要操作的所有字段，检查抖音汇总文件是否缺少字段
-    required_fields = ["店铺主体","sku单号", "订单应付金额（元）", "政府补贴（元）", "采购成本（元）","服务费用（元）","行类型", "账单批次"]
-    # 订单货款的单独表格字段
-    dingdan_fields = ["账单批次","店铺主体", "费用项名称","行类型","sku单号","商品一级类目","商品信息.1","税率","订单应付金额（元）", "政府补贴（元）", "分账金额（元）", "服务费用（元）", "平台折扣（元）","订单实付（元）","采购折扣比例","采购折扣金额（元）","采购成本（元）", "结算金额（元）","创建时间","备注","店铺名"]
-    # 垫资款的单独表格字段
-    dianzi_fields = ["店铺主体","sku单号","账单批次","行类型","订单应付金额（元）", "政府补贴（元）", "分账金额（元）", "服务费用（元）", "平台折扣（元）", "订单实付（元）","采购折扣比例","采购折扣金额（元）","采购成本（元）", "结算金额（元）","创建时间","备注","店铺名"]
-
-    missing_fields = [f for f in required_fields if f not in douyin_df.columns]
-    if missing_fields:
-        raise ValueError(f"抖音订单表缺少必要字段: {', '.join(missing_fields)}")
-
-    dingdan_fields = douyin_df[
-        (douyin_df["行类型"] == "订单货款") |  # 条件1：等于"订单货款"
-        (douyin_df["行类型"] == "订单退款") |  # 条件2：等于"订单退款"
-        (douyin_df["行类型"].str[:2] == "订单")  # 条件3：前两个字是"订单"
-        ][dingdan_fields].copy() # 编写订单货款的国补登记结果
+def is_order_row(row_types):
+    """
+    每行是否为订单货款：行类型前两个字是"订单"（包括"订单货款""订单退款"），其余（含空值）为垫资款
+    分类列只判断每个类别一次，再按类别编号展开到各行
+    """
+    if isinstance(row_types.dtype, pd.CategoricalDtype):
+        flags = np.append(row_types.cat.categories.astype(str).str[:2] == "订单", False)
+        return flags[row_types.cat.codes.to_numpy()]  # 空值的编号为 -1，取到末尾的 False
+    if pd.api.types.is_numeric_dtype(row_types):
+        return np.zeros(len(row_types), dtype=bool)  # 整列为空（读成小数列）或都不是文本
+    return (row_types.str[:2] == "订单").to_numpy(dtype=bool, na_value=False)
+
+
+def split_row_types(douyin_df):
+    """按行类型把抖音订单拆分为 订单货款（行类型以"订单"开头）和 垫资款 两张表，返回 (订单货款, 垫资款)"""
+    # 每行只判断一次，订单货款和垫资款互为补集
+    order_rows = is_order_row(douyin_df["行类型"])
+    dingdan_fields = douyin_df.loc[order_rows, DINGDAN_FIELDS].copy() # 编写订单货款的国补登记结果
     lastName_idx = dingdan_fields.columns.get_loc("商品一级类目")
     dingdan_fields.insert(lastName_idx + 1, "名称", "")
     dingdan_fields.insert(lastName_idx + 2, "规格", "")
@@ -408,44 +529,69 @@ def create_guobu_table(douyin_path, output_guobu_path):
     dingdan_fields.insert(lastName_idx + 1, "店铺补贴（元）", "")
     dingdan_fields.insert(lastName_idx + 1, "自营补贴（元）", "")
 
-    dianzi_df = douyin_df[
-        (douyin_df["行类型"] != "订单货款") &  # 排除"订单货款"
-        (douyin_df["行类型"] != "订单退款") &  # 排除"订单退款"
-        (douyin_df["行类型"].str[:2] != "订单")  # 排除前两个字是"订单"的情况
-        ][dianzi_fields].copy()  #  编写垫资款的国补登记结果
+    dianzi_df = douyin_df.loc[~order_rows, DIANZI_FIELDS].copy()  #  编写垫资款的国补登记结果
     lastName_idx = dianzi_df.columns.get_loc("政府补贴（元）")
     dianzi_df.insert(lastName_idx + 1, "店铺补贴（元）", "")
     dianzi_df.insert(lastName_idx + 1, "自营补贴（元）", "")
+    return dingdan_fields, dianzi_df
 
 
+def save_table(path, df, sheet_name):
+    """保存一张结果表（.feather 为列式中间文件，否则写入Excel，"sku单号"列写出时即设为文本格式），在子进程中运行"""
+    if is_store_path(path):
+        save_frame(df, path)
+    else:
+        write_excel(path, {sheet_name: df})
+    return path
+
+
+# 较小的一个输出不超过该行数时两个表格在当前进程依次写出：子进程需要接收整张表（pickle），
+# 另起进程节省的时间抵不过这部分开销
+SERIAL_WRITE_ROWS = 5000
+
+
+def create_guobu_table(douyin_path, output_guobu_path, max_workers=1):
+    """
+    从抖音订单表提取字段，创建初始国补登记结果表
+
+    max_workers 为写出两个表格的进程数，1为串行（默认），None按CPU核心数；
+    较小的一个表格不超过 SERIAL_WRITE_ROWS 行时总是串行写出。
+    """
+    if not os.path.exists(douyin_path):
+        raise FileNotFoundError(f"抖音订单文件不存在: {douyin_path}")
+
+    # 关键修复1：读取时强制"sku单号"为字符串，避免长数字精度丢失
+    try:
+        douyin_df = apply_schema(read_frame(
+            douyin_path,
+            # converters={"sku单号": str}  # 强制以字符串读取，保留原始格式
+        ))
+        print(f"✅ 成功读取抖音订单表，共 {len(douyin_df)} 条记录")
+        perf_metrics.note_rows(rows_in=len(douyin_df))
+    except Exception as e:
+        raise Exception(f"读取抖音订单表失败: {str(e)}")
+
+    missing_fields = [f for f in GUOBU_REQUIRED_FIELDS if f not in douyin_df.columns]
+    if missing_fields:
+        raise ValueError(f"抖音订单表缺少必要字段: {', '.join(missing_fields)}")
+
+    dingdan_fields, dianzi_df = split_row_types(douyin_df)
+
+    # 构建垫资款文件路径（与订单货款同目录）
+    dianzi_path = f"./中间文件—可忽略/垫资款结果_未处理.xlsx"
 
     try:
-        # 1. 处理订单货款表格（保存到output_guobu_path）
-        with pd.ExcelWriter(output_guobu_path, engine='openpyxl') as writer:
-            # 写入订单货款数据
-            dingdan_fields.to_excel(writer, index=False, sheet_name="订单货款")
-
-            # 设置"sku单号"列为文本格式
-            worksheet = writer.sheets["订单货款"]
-            if "sku单号" in dingdan_fields.columns:
-                sku_col = dingdan_fields.columns.get_loc("sku单号") + 1  # Excel列从1开始
-                for row in range(1, worksheet.max_row + 1):
-                    worksheet.cell(row=row, column=sku_col).number_format = "@"  # 文本格式标记
-
-        # 2. 处理垫资款表格（保存到"垫资款结果.xlsx"）
-        # 构建垫资款文件路径（与订单货款同目录）
-        dianzi_path = f"./中间文件—可忽略/垫资款结果_未处理.xlsx"
-
-        with pd.ExcelWriter(dianzi_path, engine='openpyxl') as writer:
-            # 写入垫资款数据
-            dianzi_df.to_excel(writer, index=False, sheet_name="垫资款")
-
-            # 设置"sku单号"列为文本格式
-            worksheet = writer.sheets["垫资款"]
-            if "sku单号" in dianzi_df.columns:
-                sku_col = dianzi_df.columns.get_loc("sku单号") + 1  # Excel列从1开始
-                for row in range(1, worksheet.max_row + 1):
-                    worksheet.cell(row=row, column=sku_col).number_format = "@"  # 文本格式标记
+        # 1. 订单货款表格保存到output_guobu_path，2. 垫资款表格保存到"垫资款结果.xlsx"
+        # 两个输出互不依赖，两个都较大时分别在两个进程中同时写出（xlsx 写出受 GIL 限制，线程无法并行），
+        # 耗时取决于较大的一个
+        tasks = [(output_guobu_path, dingdan_fields, "订单货款"), (dianzi_path, dianzi_df, "垫资款")]
+        sizes = [len(dingdan_fields), len(dianzi_df)]
+        if min(sizes) <= SERIAL_WRITE_ROWS:
+            max_workers = 1
+        results = run_parallel(save_table, tasks, max_workers=max_workers, sizes=sizes)
+        errors = [error for _, error in results if error is not None]
+        if errors:
+            raise Exception("; ".join(errors))
 
         # 打印结果信息
         print(f"✅ 国补登记结果已生成:")
@@ -455,27 +601,165 @@ def create_guobu_table(douyin_path, output_guobu_path):
     except Exception as e:
         raise Exception(f"保存国补登记结果失败: {str(e)}")
 
-def fill_3c_name(guobu_path, wangdian_path):
-    """匹配并填充3c商品名称"""
+
+STREAM_CHUNK_ROWS = 20000
+# 流式模式下每块保留的字段（订单货款与垫资款字段的并集）
+STREAM_FIELDS = list(dict.fromkeys(DINGDAN_FIELDS + DIANZI_FIELDS))
+
+
+def stream_guobu_tables(input_dir, order_column, output_guobu_path, dianzi_path, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    流式模式：合并抖音订单与按行类型拆分合为一步，不生成抖音订单合并结果
+
+    每个抖店导出文件按 chunk_rows 行分块读取，每块加上店铺主体/店铺名/账单批次后立即按行类型拆分，
+    订单货款追加写入 output_guobu_path（.feather），垫资款追加写入 dianzi_path（xlsx）。
+    同一时间内存中只有一块数据，峰值内存与 chunk_rows 成正比，与导出文件的总行数无关。
+    同一订单批次只读取第一个（表头中有订单字段的）文件，与 merge_excel_by_batch 相同；
+    不使用账单批次台账，每次全部重新读取。
+
+    返回:
+        (订单货款行数, 垫资款行数)，没有可读取的文件时为 None
+    """
+    if not os.path.isdir(input_dir):
+        raise NotADirectoryError(f"输入路径不是有效文件夹: {input_dir}")
+
+    # 第一步：遍历文件夹（按名称排序），按文件名确定批次和店铺信息，只读表头确认订单字段
+    selected = []
+    error_files = []
+    duplicate_files = []
+    taken_batches = set()
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if not file.lower().endswith(('.xlsx', '.xls', '.xlsm')):
+                continue
+            file_path = os.path.join(root, file)
+            rel_path = os.path.relpath(file_path, input_dir)
+            try:
+                order_batch = parse_order_batch(file)
+                key = (order_batch, rel_path) if order_batch == "未知批次" else order_batch  # 未知批次的文件互不视为重复
+                if key in taken_batches:
+                    duplicate_files.append((file, order_batch))
+                    print(f"⚠️ 订单批次重复，已跳过: {file}（批次: {order_batch}）")
+                    continue
+                shop_info = parse_shop_info(file)
+                if order_column not in read_header(file_path):
+                    raise ValueError(f"文件 {file} 缺少订单字段: {order_column}")
+            except Exception as e:
+                print(f"❌ 读取失败 {file}: {str(e)}")
+                error_files.append((file, str(e)))
+                continue
+            taken_batches.add(key)
+            selected.append({"file": file, "file_path": file_path, "order_batch": order_batch, **shop_info})
+
+    if not selected:
+        print("\n⚠️ 未找到可合并的有效数据")
+        return None
+
+    # 第二步：逐块读取、加店铺字段、拆分并追加写出
+    dingdan_rows = 0
+    dianzi_rows = 0
+    seen_columns = set()
+    with frame_stream(output_guobu_path) as append_dingdan, excel_sheet_stream(dianzi_path, "垫资款") as append_dianzi:
+        for candidate in selected:
+            file_rows = 0
+            for chunk in iter_sheet_chunks(candidate["file_path"], chunk_rows):
+                seen_columns.update(chunk.columns)
+                chunk.insert(0, "店铺主体", candidate["shop_subject"])
+                chunk.insert(1, "店铺名", candidate["shop_name"])
+                chunk.insert(2, "账单批次", candidate["bill_batch"])
+                # 与合并后的整表一致：某个文件缺少的字段为空值
+                dingdan, dianzi = split_row_types(chunk.reindex(columns=STREAM_FIELDS))
+                append_dingdan(dingdan)
+                append_dianzi(dianzi)
+                file_rows += len(chunk)
+                dingdan_rows += len(dingdan)
+                dianzi_rows += len(dianzi)
+            print(f"✅ 已读取: {candidate['file']} (记录数: {file_rows})，批次: {candidate['order_batch']}，店铺主体: {candidate['shop_subject']}")
+
+        missing_fields = [f for f in GUOBU_REQUIRED_FIELDS if f not in seen_columns | {"店铺主体", "账单批次"}]
+        if missing_fields:
+            raise ValueError(f"抖音订单表缺少必要字段: {', '.join(missing_fields)}")
+        if dingdan_rows + dianzi_rows == 0:
+            # 所有文件都没有数据行时仍写出表头
+            dingdan, dianzi = split_row_types(pd.DataFrame(columns=STREAM_FIELDS, dtype=object))
+            append_dingdan(dingdan)
+            append_dianzi(dianzi)
+
+    perf_metrics.note_rows(rows_in=dingdan_rows + dianzi_rows, rows_out=dingdan_rows + dianzi_rows)
+    print(f"\n✅ 流式合并并拆分完成（每块 {chunk_rows} 行）:")
+    print(f"   - 订单货款表格: {output_guobu_path}（共 {dingdan_rows} 条记录）")
+    print(f"   - 垫资款表格: {dianzi_path}（共 {dianzi_rows} 条记录）")
+    print(f"📌 处理的文件数: {len(selected)}")
+    print(f"📌 跳过的重复批次文件数: {len(duplicate_files)}")
+    if error_files:
+        print("\n❌ 处理失败的文件:")
+        for file, err in error_files:
+            print(f"- {file}: {err}")
+    return dingdan_rows, dianzi_rows
+
+def fill_3c_name(guobu_path, wangdian_path, output_path=None, index_path=None):
+    """
+    匹配并填充3c商品名称，结果保存到 output_path（None 则覆盖 guobu_path）
+    index_path 为3c商品名称索引（步骤1生成）路径：给出且文件存在时优先使用索引，只按本批订单的 sku 查询，
+    此时不读取 wangdian_path；index_path 为 None（默认）或文件不存在时读取整张网店单号汇总表建立映射
+    """
+    if output_path is None:
+        output_path = guobu_path
+    use_index = bool(index_path) and os.path.exists(index_path)
     if not os.path.exists(guobu_path):
         raise FileNotFoundError(f"国补登记结果文件不存在: {guobu_path}")
-    if not os.path.exists(wangdian_path):
+    if not use_index and not os.path.exists(wangdian_path):
         raise FileNotFoundError(f"网店单号汇总表不存在: {wangdian_path}")
 
     # 关键修复3：读取国补表时，再次强制"sku单号"为字符串
     try:
-        guobu_df = pd.read_excel(
-            guobu_path,dtype=object,
+        guobu_df = read_frame(
+            guobu_path,
             # converters={"sku单号": str}
         )
         print(f"\n✅ 读取国补登记结果，共 {len(guobu_df)} 条记录")
     except Exception as e:
         raise Exception(f"读取国补登记结果失败: {str(e)}")
 
+    # 清理单号（去除可能的空格、单引号等），确保匹配条件一致
+    guobu_df["sku_clean"] = guobu_df["sku单号"].apply(name_index.clean_sku)
+
+    if use_index:
+        # 只查询本批订单中出现的单号
+        conn = name_index.open_index(index_path)
+        try:
+            name_map = name_index.lookup_names(conn, guobu_df["sku_clean"].unique())
+        finally:
+            conn.close()
+        print(f"✅ 已从3c商品名称索引查询 {guobu_df['sku_clean'].nunique()} 个单号，找到 {len(name_map)} 条匹配关系")
+    else:
+        name_map = read_name_map(wangdian_path)
+    # 基于清理后的字段匹配
+    guobu_df["3c商品名称"] = guobu_df["sku_clean"].map(name_map).fillna("未找到对应商品名，请检查3c商品名表格中是否存在")
+
+    # 统计匹配结果
+    matched_count = (guobu_df["3c商品名称"] != "未找到对应商品名，请检查3c商品名表格中是否存在").sum()
+    print(f"✅ 匹配完成，成功填充 {matched_count} 条商品名称（共 {len(guobu_df)} 条记录）")
+
+    # 保存最终结果（再次强制文本格式）
+    try:
+        if is_store_path(output_path):
+            save_frame(apply_schema(guobu_df.drop(columns=["sku_clean"])), output_path)
+        else:
+            write_excel(output_path, {"国补登记结果": guobu_df.drop(columns=["sku_clean"])})
+        print(f"✅ 最终国补登记结果已更新: {output_path}")
+        perf_metrics.note_rows(rows_out=len(guobu_df))
+        return guobu_df
+    except Exception as e:
+        raise Exception(f"更新国补登记结果失败: {str(e)}")
+
+def read_name_map(wangdian_path):
+    """读取整张网店单号汇总表，建立 清理后的网店单号 → 商品名称 的映射（保留第一个出现的商品名称）"""
     # 关键修复4：读取网店表时，强制"网店单号-去后缀"为字符串
     try:
-        wangdian_df = pd.read_excel(
-            wangdian_path,dtype=object
+        wangdian_df = read_frame(
+            wangdian_path,
             # converters={"网店单号-去后缀": str}  # 强制字符串，避免精度丢失
         )
         print(f"✅ 读取网店单号汇总表，共 {len(wangdian_df)} 条记录")
@@ -487,15 +771,7 @@ def fill_3c_name(guobu_path, wangdian_path):
     if missing_wangdian:
         raise ValueError(f"网店单号汇总表缺少必要字段: {', '.join(missing_wangdian)}")
 
-    # 清理字符串（去除可能的空格、单引号等）
-    def clean_str(s):
-        if pd.isna(s):
-            return ""
-        return str(s).strip().strip("'")  # 去除前后空格和Excel文本标记'
-
-    # 清理双方单号，确保匹配条件一致
-    guobu_df["sku_clean"] = guobu_df["sku单号"].apply(clean_str)
-    wangdian_df["wangdian_clean"] = wangdian_df["网店单号-去后缀"].apply(clean_str)
+    wangdian_df["wangdian_clean"] = wangdian_df["网店单号-去后缀"].apply(name_index.clean_sku)
 
     # 构建去重的映射字典（保留第一个出现的商品名称）
     name_map = dict(
@@ -504,25 +780,7 @@ def fill_3c_name(guobu_path, wangdian_path):
         ].values
     )
     print(f"✅ 已创建商品名称映射，共 {len(name_map)} 条唯一匹配关系")
-    # 基于清理后的字段匹配
-    guobu_df["3c商品名称"] = guobu_df["sku_clean"].map(name_map).fillna("未找到对应商品名，请检查3c商品名表格中是否存在")
-
-    # 统计匹配结果
-    matched_count = (guobu_df["3c商品名称"] != "未找到对应商品名，请检查3c商品名表格中是否存在").sum()
-    print(f"✅ 匹配完成，成功填充 {matched_count} 条商品名称（共 {len(guobu_df)} 条记录）")
-
-    # 保存最终结果（再次强制文本格式）
-    try:
-        with pd.ExcelWriter(guobu_path, engine='openpyxl') as writer:
-            guobu_df.drop(columns=["sku_clean"]).to_excel(writer, index=False, sheet_name="国补登记结果")
-            worksheet = writer.sheets["国补登记结果"]
-            sku_col = guobu_df.columns.get_loc("sku单号") + 1
-            for row in range(1, worksheet.max_row + 1):
-                worksheet.cell(row=row, column=sku_col).number_format = "@"
-        print(f"✅ 最终国补登记结果已更新: {guobu_path}")
-        return guobu_df
-    except Exception as e:
-        raise Exception(f"更新国补登记结果失败: {str(e)}")
+    return name_map
 
 # 开始进行规格和其名称匹配
 def parse_shop_to_sheet(shop_name):
@@ -548,32 +806,33 @@ def parse_shop_to_sheet(shop_name):
     # 未匹配到时返回原始名称并标记
     return f"未匹配_{shop_name}"
 
+# 商品名解析用到的正则（只编译一次）
+# 1. 提取“标准版”（匹配“版”字前的中文，如“标准”“高配”“Pro”等）
+VERSION_PATTERN = re.compile(r'([\u4e00-\u9fa5A-Za-z]+版)')
+# 2. 提取“BTKR-W00”（匹配由字母、数字、连字符组成的型号）
+MODEL_PATTERN = re.compile(r'([A-Za-z0-9]+-[A-Za-z0-9]+)')
+# 3. 提取“8G+128G”（匹配“数字G+数字G”的格式）
+MEMORY_PATTERN = re.compile(r'(\d+G\+\d+G)')
+# 内存格式转换：数字+G 后添加B
+MEMORY_UNIT_PATTERN = re.compile(r'(\d+)G')
+# 商品名解析缓存的最大条目数（超出后淘汰最久未用的）
+PRODUCT_PARSE_CACHE_SIZE = 4096
+
+
 def convert_memory_format(memory_str):
     """
     将内存格式从 8G+256G 转换为 8GB+256GB
     """
-    # 正则匹配数字+G的模式，然后在G前添加B
-    pattern = re.compile(r'(\d+)G')
-    converted = pattern.sub(r'\1GB', memory_str)
-    return converted
+    return MEMORY_UNIT_PATTERN.sub(r'\1GB', memory_str)
 
 def match_data(product_name):
-    # 1. 提取“标准版”（匹配“标准版”“高配版”等中文版本描述）
-    # 正则说明：匹配“版”字前的中文（如“标准”“高配”“Pro”等）
-    version_pattern = re.compile(r'([\u4e00-\u9fa5A-Za-z]+版)')
-    version_match = version_pattern.search(product_name)
+    version_match = VERSION_PATTERN.search(product_name)
     version = version_match.group(1) if version_match else ""  # 结果：标准版
 
-    # 2. 提取“BTKR-W00”（匹配类似“XXX-XXX”的型号格式）
-    # 正则说明：匹配由字母、数字、连字符组成的型号（至少3个字符）
-    model_pattern = re.compile(r'([A-Za-z0-9]+-[A-Za-z0-9]+)')
-    model_match = model_pattern.search(product_name)
+    model_match = MODEL_PATTERN.search(product_name)
     model = model_match.group(1) if model_match else ""  # 结果：BTKR-W00
 
-    # 3. 提取“8G+128G”（匹配内存+存储格式）
-    # 正则说明：匹配“数字G+数字G”的格式
-    memory_pattern = re.compile(r'(\d+G\+\d+G)')
-    memory_match = memory_pattern.search(product_name)
+    memory_match = MEMORY_PATTERN.search(product_name)
     memory = memory_match.group(1) if memory_match else ""  # 结果：8G+128G
 
     # 4. 提取“深空灰”（按空格分割取最后一个元素）
@@ -581,7 +840,132 @@ def match_data(product_name):
 
     return version, model, memory, color
 
+
+@functools.lru_cache(maxsize=PRODUCT_PARSE_CACHE_SIZE)
+def parse_product_name(product_name):
+    """
+    带缓存的商品名解析：返回 (版本, 型号, 内存, 颜色)，内存已转换为 8GB+256GB 格式
+    同一个商品名只解析一次，之后为一次字典查找
+    """
+    if not product_name.split():
+        return "", "", "", ""
+    version, model, memory, color = match_data(product_name)
+    return version, model, convert_memory_format(memory), color
+
+
+def product_parse_stats():
+    """商品名解析缓存的命中统计"""
+    info = parse_product_name.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+def extract_spec_fields(product_names):
+    """
+    对整列商品名提取 版本、型号、内存（已转为 8GB+256GB 格式）、颜色
+    每行经 parse_product_name 缓存，重复出现的商品名只是一次字典查找
+    返回 DataFrame，列为 version / model / memory / color
+    """
+    parsed = [parse_product_name(name) for name in product_names.astype(str)]
+    return pd.DataFrame(parsed, columns=["version", "model", "memory", "color"],
+                        index=product_names.index, dtype=object)
+
+
+def match_specs(df, spec_indexes):
+    """
+    批量匹配每行的名称和规格
+
+    参数:
+        df: 国补登记结果，需包含"店铺名""3c商品名称"列
+        spec_indexes: {sheet名: 规格索引}（spec_index.build_spec_index 的结果）
+    返回:
+        (名称 Series, 规格 Series)，规格在未唯一匹配时为 None
+    """
+    keys = extract_spec_fields(df["3c商品名称"])
+    shop_sheets = {shop: parse_shop_to_sheet(shop) for shop in df["店铺名"].drop_duplicates()}
+    keys["sheet"] = df["店铺名"].map(shop_sheets)
+
+    # 同一 (sheet, 版本, 型号, 内存, 颜色) 组合只匹配一次，结果按组号整列展开
+    key_cols = ["sheet", "version", "model", "memory", "color"]
+    codes = keys.groupby(key_cols, sort=False, dropna=False).ngroup().to_numpy()
+    first_rows = np.unique(codes, return_index=True)[1]  # 每个组号第一次出现的行
+    unique_keys = keys[key_cols].iloc[first_rows]
+    names_by_key = []
+    models_by_key = []
+    for sheet, version, model, memory, color in unique_keys.itertuples(index=False, name=None):
+        if sheet in spec_indexes:
+            name, spec = lookup_spec(spec_indexes[sheet], version, model, memory, color)
+        else:
+            name, spec = f"未找到对应的规格表_{sheet}", None
+        names_by_key.append(name)
+        models_by_key.append(spec)
+
+    names = pd.Series(np.array(names_by_key, dtype=object)[codes], index=df.index)
+    models = pd.Series(np.array(models_by_key, dtype=object)[codes], index=df.index)
+    return names, models
+
+
+def fuzzy_match_specs(df, names, models, fuzzy_indexes, row_counts=None):
+    """
+    对精确匹配未成功的行做模糊匹配（--fuzzy）
+
+    参数:
+        names, models: match_specs 的结果
+        fuzzy_indexes: {sheet名: 模糊匹配索引}（fuzzy_match.build_fuzzy_index 的结果）
+        row_counts: df 每行代表的原始行数（df 为每种商品名取一行时传入），用于统计采用的行数，None 时每行计 1
+    返回:
+        (名称 Series, 规格 Series, 匹配置信度 Series, 匹配方式 Series)
+        精确匹配的行置信度为 1、方式为"精确"；模糊匹配采用的行为其得分、方式为"模糊"；其余行置信度为空
+    """
+    shop_sheets = {shop: parse_shop_to_sheet(shop) for shop in df["店铺名"].drop_duplicates()}
+    sheets = df["店铺名"].map(shop_sheets)
+    exact = models.notna().to_numpy()
+    confidence = np.where(exact, 1.0, np.nan)
+    method = np.where(exact, "精确", "").astype(object)
+    names = names.to_numpy(dtype=object).copy()
+    models = models.to_numpy(dtype=object).copy()
+
+    # 同一 (sheet, 商品名) 只模糊匹配一次
+    pending = np.flatnonzero(~exact & sheets.isin(list(fuzzy_indexes)).to_numpy())
+    pending_keys = list(zip(sheets.to_numpy(dtype=object)[pending], df["3c商品名称"].astype(str).to_numpy()[pending]))
+    results = {}
+    for sheet, product_name in dict.fromkeys(pending_keys):
+        model = parse_product_name(product_name)[1]
+        results[(sheet, product_name)] = fuzzy_lookup(fuzzy_indexes[sheet], product_name, model)
+    for row, key in zip(pending, pending_keys):
+        name, model, score = results[key]
+        if name is not None:
+            names[row], models[row], confidence[row], method[row] = name, model, score, "模糊"
+
+    weights = np.ones(len(df), dtype=np.int64) if row_counts is None else np.asarray(row_counts)
+    accepted = int(weights[method == "模糊"].sum())
+    print(f"🔎 模糊匹配：{len(results)} 种未匹配的商品名，采用 {accepted} 行（置信度≥阈值）")
+    return (pd.Series(names, index=df.index), pd.Series(models, index=df.index),
+            pd.Series(confidence, index=df.index), pd.Series(method, index=df.index))
+
+
     #  根据拿到的sheet名，取出规格型号及名称  字典
+SPEC_HEADER_ROW = 2  # 第4行是列名行（A4:名称、C4:规格型号）
+SPEC_COLUMNS = ["名称", "规格型号"]
+
+
+def build_model_name_dict(df):
+    """
+    由一个 sheet 的 名称/规格型号 数据构建 规格型号 → 名称 映射字典
+    :return: {规格型号: [名称1, 名称2...], ...}
+    """
+    # 校验必要列
+    if not set(SPEC_COLUMNS).issubset(df.columns):
+        raise ValueError(f"表格缺少必要列！需包含 {SPEC_COLUMNS}，当前列：{df.columns.tolist()}")
+
+    # 按规格型号分组，收集名称（去重+保留顺序）
+    model_name_dict = {}
+    for model, group in df.groupby("规格型号", sort=False):  # sort=False 保留原顺序
+        unique_names = group["名称"].drop_duplicates().tolist()
+        model_name_dict[model] = unique_names
+
+    return model_name_dict
+
+
 def generate_model_name_dict(file_path, sheet_name=None):
     """
     从企业库存数量中提取 规格型号 → 名称 映射字典
@@ -591,34 +975,144 @@ def generate_model_name_dict(file_path, sheet_name=None):
     :param sheet_name: 工作表名，默认取第一个
     :return: {规格型号: [名称1, 名称2...], ...}
     """
-    # 先清理样式
-    # clean_excel_styles_and_merges(file_path, "cleaned_" + file_path)
+    # 读取表格（跳过表头合并行，从第4行开始识别列名，只加载需要的列）
+    df = read_sheet(file_path, sheet_name=sheet_name or 0, header=SPEC_HEADER_ROW, usecols=SPEC_COLUMNS)
+    return build_model_name_dict(df)
 
 
-    # 1. 读取表格（跳过表头合并行，从第4行开始识别列名）
-    df = pd.read_excel(
-        file_path,
-        sheet_name=sheet_name,
-        dtype = object,
-        header=2,  # 第4行是列名行（A4:名称、C4:规格型号）
-        usecols=["名称", "规格型号"],  # 只加载需要的列
-        engine='openpyxl'
-    )
-    # 新增调试打印，查看读取到的数据
-    # 2. 校验必要列
-    required_cols = ["名称", "规格型号"]
-    if not set(required_cols).issubset(df.columns):
-        raise ValueError(f"表格缺少必要列！需包含 {required_cols}，当前列：{df.columns.tolist()}")
+def load_model_name_dicts(file_path, sheet_names):
+    """
+    打开一次企业库存数量.xlsx，读取所有需要的 sheet 并分别构建 规格型号 → 名称 字典
+
+    :return: ({sheet名: 规格型号字典}, {sheet名: 错误信息})
+    """
+    frames, errors = read_sheets(file_path, sheet_names, header=SPEC_HEADER_ROW, usecols=SPEC_COLUMNS)
+    total_dict = {}
+    for sheet in sheet_names:
+        if sheet not in frames:
+            continue
+        try:
+            total_dict[sheet] = build_model_name_dict(frames[sheet])
+        except Exception as e:
+            errors[sheet] = str(e)
+    return total_dict, errors
+
+
+def print_sheet_dicts(sheets, total_dict, sheet_errors):
+    """打印各 sheet 规格型号字典的提取结果"""
+    for sheet in sheets:
+        print(f"正在处理sheet：{sheet}")
+        if sheet in total_dict:
+            print(f"  成功提取 {len(total_dict[sheet])} 个规格型号")
+        else:
+            print(f"  处理sheet {sheet} 失败：{sheet_errors[sheet]}")
+    # 完整的规格字典只在详细模式（--verbose）下打印
+    if perf_metrics.verbose():
+        print(total_dict)
+
+
+def match_rows(df, total_dict, fuzzy=False, row_counts=None):
+    """
+    按规格字典匹配每行的名称和规格（fuzzy 为 True 时对未匹配的行再做模糊匹配）
+    row_counts 为 df 每行代表的原始行数（只用于模糊匹配的统计输出，见 fuzzy_match_specs）
+
+    返回:
+        (名称 Series, 规格 Series, 匹配置信度 Series, 匹配方式 Series)，不做模糊匹配时后两项为 None
+    """
+    # 批量匹配：一次性提取所有行的版本/型号/内存/颜色，每种组合只匹配一次，再整列赋值
+    spec_indexes = {sheet: build_spec_index(model_dict) for sheet, model_dict in total_dict.items()}
+    names, models = match_specs(df, spec_indexes)
+    if not fuzzy:
+        return names, models, None, None
+    fuzzy_indexes = {sheet: build_fuzzy_index(model_dict) for sheet, model_dict in total_dict.items()}
+    return fuzzy_match_specs(df, names, models, fuzzy_indexes, row_counts=row_counts)
+
+
+def match_rows_cached(df, guige_file_path, sheets, fuzzy=False, cache_path=match_cache.CACHE_PATH):
+    """
+    带匹配结果缓存的 match_rows：(sheet, 3c商品名称) 在缓存中的直接取缓存结果，
+    只读取指纹有变化或有未缓存商品名的 sheet，只匹配未缓存的商品名
+    """
+    mode = "fuzzy" if fuzzy else "exact"
+    shop_sheets = {shop: parse_shop_to_sheet(shop) for shop in df["店铺名"].drop_duplicates()}
+    # 同一 (sheet, 商品名) 只查询/匹配一次，结果按编号整列展开
+    codes, uniques = pd.MultiIndex.from_arrays([df["店铺名"].map(shop_sheets), df["3c商品名称"].astype(str)]).factorize()
+    pairs = list(uniques)
+    fingerprints = sheet_fingerprints(guige_file_path, sheets)
+    sheet_errors = {sheet: f"Worksheet named '{sheet}' not found" for sheet in sheets if sheet not in fingerprints}
+
+    conn = match_cache.open_cache(cache_path)
+    try:
+        stale = set(match_cache.stale_sheets(conn, fingerprints))
+        cacheable = [key for key in pairs if key[0] in fingerprints]
+        # 未变化的 sheet 先查缓存，只读取有变化或有未缓存商品名的 sheet（企业库存数量只打开一次）
+        cached = match_cache.lookup_results(conn, mode, [key for key in cacheable if key[0] not in stale])
+        needed = sorted(stale | {key[0] for key in cacheable if key not in cached})
+        total_dict, load_errors = load_model_name_dicts(guige_file_path, needed) if needed else ({}, {})
+        sheet_errors.update(load_errors)
+        print_sheet_dicts([sheet for sheet in sheets if sheet in needed or sheet in sheet_errors], total_dict, sheet_errors)
+        for sheet in sorted(set(fingerprints) - set(needed)):
+            print(f"♻️ sheet {sheet} 未变化，沿用匹配缓存")
+        for sheet in sorted(stale & total_dict.keys()):
+            changed = match_cache.refresh_sheet(conn, sheet, total_dict[sheet], fingerprints[sheet])
+            if changed is None:
+                print(f"📥 sheet {sheet} 首次加入匹配缓存")
+            else:
+                print(f"🔄 sheet {sheet} 有 {len(changed)} 个规格型号变化，已清除依赖这些型号的匹配缓存")
+        cached.update(match_cache.lookup_results(conn, mode, [key for key in cacheable if key[0] in stale]))
+
+        # 每个 (sheet, 商品名) 的结果
+        pair_names = np.empty(len(pairs), dtype=object)
+        pair_models = np.empty(len(pairs), dtype=object)
+        pair_confidence = np.full(len(pairs), np.nan)
+        pair_method = np.full(len(pairs), "", dtype=object)
+        pair_cached = np.zeros(len(pairs), dtype=bool)
+        for code, key in enumerate(pairs):
+            if key in cached:
+                pair_names[code], pair_models[code], score, pair_method[code] = cached[key]
+                pair_confidence[code] = np.nan if score is None else score
+                pair_cached[code] = True
+
+        # 未缓存的商品名只取其第一行匹配（结果只与 sheet 和商品名有关）
+        miss_codes = np.flatnonzero(~pair_cached)
+        new_results = []
+        if len(miss_codes):
+            first_rows = np.unique(codes, return_index=True)[1][miss_codes]
+            # 每种商品名代表的行数，模糊匹配按行统计采用数
+            row_counts = np.bincount(codes, minlength=len(pairs))[miss_codes]
+            part_names, part_models, part_confidence, part_method = match_rows(df.iloc[first_rows], total_dict, fuzzy,
+                                                                               row_counts=row_counts)
+            pair_names[miss_codes] = part_names.to_numpy(dtype=object)
+            pair_models[miss_codes] = part_models.to_numpy(dtype=object)
+            if fuzzy:
+                pair_confidence[miss_codes] = part_confidence.to_numpy(dtype=float)
+                pair_method[miss_codes] = part_method.to_numpy(dtype=object)
+            for code in miss_codes:
+                sheet, product_name = pairs[code]
+                if sheet not in total_dict:
+                    continue
+                # 精确匹配只依赖商品名中的型号；模糊匹配在型号不在 sheet 中时依赖整张 sheet
+                model = parse_product_name(product_name)[1]
+                dep_model = model if not fuzzy or model in total_dict[sheet] else match_cache.WHOLE_SHEET
+                score = None if np.isnan(pair_confidence[code]) else float(pair_confidence[code])
+                new_results.append((sheet, product_name, pair_names[code], pair_models[code], score,
+                                    pair_method[code], dep_model))
+            match_cache.store_results(conn, mode, new_results)
+    finally:
+        conn.close()
+    print(f"♻️ 匹配缓存：命中 {int(pair_cached[codes].sum())} 行，新匹配 {len(new_results)} 种商品名")
+    if fuzzy:
+        print(f"🔎 模糊匹配：共 {int((pair_method[codes] == '模糊').sum())} 行采用模糊匹配结果（含缓存）")
+
+    index = df.index
+    return (pd.Series(pair_names[codes], index=index), pd.Series(pair_models[codes], index=index),
+            pd.Series(pair_confidence[codes], index=index) if fuzzy else None,
+            pd.Series(pair_method[codes], index=index) if fuzzy else None)
 
-    # 3. 按规格型号分组，收集名称（去重+保留顺序）
-    model_name_dict = {}
-    for model, group in df.groupby("规格型号", sort=False):  # sort=False 保留原顺序
-        unique_names = group["名称"].drop_duplicates().tolist()
-        model_name_dict[model] = unique_names
 
-    return model_name_dict
     #  主要代码，进行名称匹配
-def count_unique_shops_with_sheet(sheet_file_path, guige_file_path,output_path,sheet_name=None):
+def count_unique_shops_with_sheet(sheet_file_path, guige_file_path,output_path,sheet_name=None, fuzzy=False,
+                                  cache_path=match_cache.CACHE_PATH):
     """
     统计表格中“店铺名”列的不重复值，并转换为对应的sheet名,根据sheet名，获取总字典。
     在国补登记结果表格中，进行 行遍历 ，对3c商品名称进行分析。然后在字典中匹配。
@@ -627,6 +1121,8 @@ def count_unique_shops_with_sheet(sheet_file_path, guige_file_path,output_path,s
         sheet_file_path: 表格文件路径（Excel格式）
         guige_file_path: 存放规格的表格 企业库存数量.xlsx
         sheet_name: 工作表名称，默认使用第一个工作表
+        fuzzy: 为 True 时对精确匹配未成功的行做模糊匹配，并增加"匹配置信度""匹配方式"两列
+        cache_path: 名称匹配缓存路径（企业库存数量未变化的 sheet 直接取缓存结果），None 则不使用缓存
     返回:
         元组 (店铺名种类数量, 店铺名与sheet名的映射字典)
     """
@@ -635,10 +1131,12 @@ def count_unique_shops_with_sheet(sheet_file_path, guige_file_path,output_path,s
         raise FileNotFoundError(f"文件不存在: {sheet_file_path}")
 
     # 读取表格数据
-    if sheet_name:
-        df = pd.read_excel(sheet_file_path,dtype=object, sheet_name=sheet_name)
+    if is_store_path(sheet_file_path):
+        df = read_frame(sheet_file_path)
+    elif sheet_name:
+        df = read_sheet(sheet_file_path, sheet_name=sheet_name)
     else:
-        df = pd.read_excel(sheet_file_path,dtype=object
+        df = read_sheet(sheet_file_path
                            # ,converters={"sku单号": str}
                            )  # 默认读取第一个工作表
         # df = pd.read_excel("国补登记结果.xlsx")  # 默认读取第一个工作表
@@ -662,91 +1160,33 @@ def count_unique_shops_with_sheet(sheet_file_path, guige_file_path,output_path,s
     print(shop_to_sheet)
     unique_sheets = list(set(shop_to_sheet.values()))
     print("\n===== 开始提取每个店铺对应的规格型号字典 =====")
-    total_dict = {}  # 总字典：{sheet名: 规格型号字典, ...}
-    for sheet in unique_sheets:
-        try:
-            print(f"正在处理sheet：{sheet}")
-            model_dict = generate_model_name_dict(guige_file_path, sheet)
-            total_dict[sheet] = model_dict
-            print(f"  成功提取 {len(model_dict)} 个规格型号")
-        except Exception as e:
-            print(f"  处理sheet {sheet} 失败：{str(e)}")
-            continue  # 跳过错误的sheet，继续处理其他
-    print("\n===== 所有sheet处理完成 =====")
-    print(total_dict)
-    # total_dict 为存放所有规格的数据
-    print("\n===== 开始匹配规格.......... =====")
-    # 遍历每行进行处理
-    for index, row in df.iterrows():
-        # 1. 取出当前行的"店铺名"和"3c 商品名称"
-        shop_name = row["店铺名"]
-        product_name = row["3c商品名称"]
-        # print(f"这是我在循环中拿到的数据：{shop_name} {product_name}")
-        # 2. 这里放入你的一系列处理逻辑
-        # 示例：将店铺名和商品名拼接作为结果
-        pipei_sheet_name =  parse_shop_to_sheet(shop_name) # 字典匹配sheet名称
-
-        version,model,memory,color = match_data(product_name) # 从这个里面拿规格。 四个参数分别是 版本 型号 内存 颜色
-        memory = convert_memory_format(memory)  # 格式化 内存大小 8G+256G -> 8GB+256GB
-
-        pipei_data_list  = total_dict[pipei_sheet_name].get(model, f"未匹配到该型号{model}")
-        # print(pipei_data_list)
-        # 筛选同时包含内存和颜色的项
-        final_result = [
-            item for item in pipei_data_list
-            if memory in item and color in item
-        ]
-
-        if len(final_result) == 1 :
-
-            processed_result = final_result[0]
-            df["规格"] = df["规格"].astype(str)
-            df.at[index, "规格"] = model
-        elif len(final_result) >= 2 :
-
-            # print(final_result)
-            # 还需进一步排除
-            # 定义非标准版的关键词列表（可根据实际情况扩展）
-            non_standard_versions = ["柔光版", "灵动版", "Pro版", "青春版"]
-            # 分情况筛选
-            if version == "标准版":
-                # 标准版：排除包含任何非标准版关键词的项
-                final_result = [
-                    item for item in final_result
-                    if not any(v in item for v in non_standard_versions)
-                ]
-            else:
-                # 其他版本：直接匹配包含该版本关键词的项
-                final_result = [
-                    item for item in final_result
-                    if version in item
-                ]
-            # 处理之后，在判断以下是否拿到唯一值。
-            if len(final_result) == 1:
-                processed_result = final_result[0]
-                df["规格"] = df["规格"].astype(str)
-                df.at[index, "规格"] = model
-            elif len(final_result) >= 2:
-                processed_result = "无法排除到唯一值_请向工程师反馈"
-
-        elif len(final_result) == 0 :
-            if isinstance(pipei_data_list, list):
-                processed_result = f"有{model}规格，但是没有对应的配置"
-
-            elif isinstance(pipei_data_list, str):  # 判断是否为字符串 未匹配到该型号
-                processed_result = pipei_data_list  # 是字符串则返回本身 未匹配到该型号
-
-        # print(processed_result)
-        # print("========================")
-
-        # 3. 将处理结果存入当前行的"名称"列
-        df["名称"] = df["名称"].astype(str)
-        df.at[index, "名称"] = processed_result
-
-
-    # 写入Excel
-    with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-        df.to_excel(writer, sheet_name="数据结果", index=False)  # index=False不保存索引列
+    if cache_path:
+        names, models, confidence, method = match_rows_cached(df, guige_file_path, unique_sheets, fuzzy, cache_path)
+    else:
+        # 总字典：{sheet名: 规格型号字典, ...}，所有 sheet 在一次打开中读取；共用同一 sheet 的店铺共用一份字典和索引
+        total_dict, sheet_errors = load_model_name_dicts(guige_file_path, unique_sheets)
+        print_sheet_dicts(unique_sheets, total_dict, sheet_errors)
+        print("\n===== 开始匹配规格.......... =====")
+        names, models, confidence, method = match_rows(df, total_dict, fuzzy)
+    print("\n===== 所有sheet匹配完成 =====")
+    stats = product_parse_stats()
+    print(f"商品名解析缓存：命中 {stats['hits']} 次，未命中 {stats['misses']} 次（缓存 {stats['size']}/{stats['maxsize']} 条）")
+    matched = models.notna()
+    if matched.any():
+        df["规格"] = df["规格"].astype(str)
+        df.loc[matched, "规格"] = models[matched]
+    if len(df):
+        df["名称"] = names
+    if fuzzy:
+        df["匹配置信度"] = confidence
+        df["匹配方式"] = method
+
+    perf_metrics.note_rows(rows_in=len(df), rows_out=len(df))
+    # 写入结果（.feather 为列式中间文件，否则写入Excel）
+    if is_store_path(output_path):
+        save_frame(df, output_path)
+    else:
+        write_excel(output_path, {"数据结果": df})
 
 
 # 整理表格格式
@@ -758,80 +1198,40 @@ def document_file(file_path, output_path=None, sheet_name=None):
         file_path: 输入Excel文件路径
         output_path: 输出文件路径，None则覆盖原文件
         sheet_name: 工作表名称，None则使用第一个工作表
+    返回:
+        保存成功时为输出路径，否则为 None
     """
     # 确定输出路径
     if output_path is None:
         output_path = file_path
 
-    # 读取Excel文件获取工作表信息
-    excel_file = pd.ExcelFile(file_path)
-
-    # 如果未指定工作表，使用第一个工作表
-    if sheet_name is None:
-        sheet_name = excel_file.sheet_names[0]
-        print(f"使用工作表: {sheet_name}")
+    if is_store_path(file_path):
+        # 列式中间文件没有工作表，输出沿用步骤4的"数据结果"
+        if sheet_name is None:
+            sheet_name = "数据结果"
+        df = read_frame(file_path)
+    else:
+        # 如果未指定工作表，使用第一个工作表
+        if sheet_name is None:
+            sheet_name = list_sheets(file_path)[0]
+            print(f"使用工作表: {sheet_name}")
 
-    # 读取数据，确保sku单号为字符串类型
-    df = pd.read_excel(file_path, sheet_name=sheet_name, dtype=object)
+        # 读取数据，确保sku单号为字符串类型
+        df = read_sheet(file_path, sheet_name=sheet_name)
 
     # 确保数据按账单批次排序（相同的排在一起）
     df = df.sort_values(by='账单批次')
+    perf_metrics.note_rows(rows_in=len(df), rows_out=len(df))
 
-    # 创建临时文件
-    temp_file = f'temp_bill_merge_{int(time.time())}.xlsx'
-    df.to_excel(temp_file, sheet_name=sheet_name, index=False)
-
-    # 使用openpyxl加载临时文件
-    wb = openpyxl.load_workbook(temp_file)
-    ws = wb[sheet_name]
-
-    # 获取账单批次列、店铺主体列和sku单号列的索引
-    batch_col = None
-    shop_col = None
-    sku_col = None
-    for col in ws.iter_cols(min_row=1, max_row=1):
-        for cell in col:
-            if cell.value == '账单批次':
-                batch_col = cell.column_letter
-            elif cell.value == '店铺主体':
-                shop_col = cell.column_letter
-            elif cell.value == 'sku单号':
-                sku_col = cell.column_letter
-
-    if not batch_col or not shop_col or not sku_col:
+    if not {'账单批次', '店铺主体', 'sku单号'}.issubset(df.columns):
         raise ValueError("表格中未找到'账单批次'、'店铺主体'或'sku单号'列")
 
-    # 从第二行开始处理数据（跳过标题行）
-    row = 2
-    while row <= ws.max_row:
-        current_batch = ws[f"{batch_col}{row}"].value
-        if current_batch is None:
-            row += 1
-            continue
-
-        # 查找连续相同的账单批次
-        merge_rows = 1
-        next_row = row + 1
-        while next_row <= ws.max_row and ws[f"{batch_col}{next_row}"].value == current_batch:
-            merge_rows += 1
-            next_row += 1
-
-        # 合并单元格
-        if merge_rows > 1:
-            # 合并账单批次列
-            ws.merge_cells(f"{batch_col}{row}:{batch_col}{row + merge_rows - 1}")
-            # 按相同行数合并对应的店铺主体列
-            ws.merge_cells(f"{shop_col}{row}:{shop_col}{row + merge_rows - 1}")
-
-            # 设置合并后单元格的对齐方式为居中
-            ws[f"{batch_col}{row}"].alignment = Alignment(horizontal='center', vertical='center')
-            ws[f"{shop_col}{row}"].alignment = Alignment(horizontal='center', vertical='center')
+    # 连续相同的账单批次合并账单批次列，并按相同行数合并对应的店铺主体列；写出时一并登记合并区域
+    merged_cells = {sheet_name: run_length_merges(df['账单批次'], ['账单批次', '店铺主体'])}
 
-        row += merge_rows
-
-    # 保存临时文件并关闭
-    wb.save(temp_file)
-    wb.close()
+    # 先写到临时文件（sku单号写出时即为文本格式）
+    temp_file = f'temp_bill_merge_{int(time.time())}.xlsx'
+    write_excel(temp_file, {sheet_name: df}, merged_cells=merged_cells)
 
     # 处理文件替换
     try:
@@ -840,6 +1240,7 @@ def document_file(file_path, output_path=None, sheet_name=None):
             os.remove(output_path)
         os.rename(temp_file, output_path)
         print(f"✅处理完成，文件已保存至: {output_path}")
+        return output_path
     except PermissionError:
         print(f"错误: 文件 {output_path} 可能被其他程序占用，请关闭后重试")
         print(f"处理后的文件临时保存为: {temp_file}")
@@ -848,92 +1249,183 @@ def document_file(file_path, output_path=None, sheet_name=None):
         if os.path.exists(temp_file):
             os.remove(temp_file)
 
-def main(process_step):
+def main(process_step, force=False, stream=False, fuzzy=False):
     """
     主函数，根据传入的步骤参数执行对应流程
 
     参数:
-        process_step: 0=全流程，1=处理3c商品表，2=处理抖音店铺文件，3=比对并生成结果
+        process_step: 0=全流程，1=处理3c商品表，2=处理抖音店铺文件，3=比对并生成结果，4=匹配名称及规格，5=整理表格格式
+        force: 为 True 时忽略流程指纹，所选步骤全部重新执行
+        stream: 为 True 时步骤2按行分块读取抖音表格并直接拆分为订单货款/垫资款（不生成合并结果，内存占用与块大小成正比），
+                步骤3只填充3c商品名称
+        fuzzy: 为 True 时步骤4对精确匹配未成功的行做模糊匹配，结果增加"匹配置信度""匹配方式"两列
+
+    每个步骤成功后记录输入和输出的指纹（流程指纹.json），输入没有变化的步骤直接跳过、沿用上次的输出。
     """
+    wangdian_summary_path = f"./中间文件—可忽略/网店单号汇总表.feather"
+    name_index_path = name_index.INDEX_PATH
+    douyin_order_path = f"./中间文件—可忽略/抖音订单合并结果.feather"
+    guobu_result_path = f"./中间文件—可忽略/国补登记结果_未匹配名称.feather"
+    dianzi_result_path = f"./中间文件—可忽略/垫资款结果_未处理.xlsx"
+    stream_order_path = f"./中间文件—可忽略/订单货款_流式拆分.feather"
+    pipei_output_path = f"./中间文件—可忽略/国补登记结果_未处理.feather"
+    guige_file_path = "企业库存数量.xlsx"
+    final_output_path = "国补登记结果.xlsx"
 
     # 步骤1：处理3c商品表
     def step1():
         print("\n===== 开始执行步骤1：预处理3c商品表 =====")
         input_folder = "3c商品名表格"
+        cache_folder = f"./中间文件—可忽略/解析缓存/3c商品名表格"
         try:
-            batch_process_excel(input_dir=input_folder)
+            summary_path = batch_process_excel(input_dir=input_folder, cache_dir=cache_folder, max_workers=default_workers(),
+                                               index_path=name_index_path)
             print("===== 步骤1执行完成 =====")
+            return summary_path is not None
         except Exception as e:
             print(f"步骤1执行失败: {str(e)}")
+            return False
 
     # 步骤2：处理抖音店铺文件
     def step2():
         print("\n===== 开始执行步骤2：预处理抖音店铺文件 =====")
         input_folder = "抖音表格"
         order_field = "sku单号"
-        output_file = f"./中间文件—可忽略/抖音订单合并结果.xlsx"
+        ledger_file = f"./中间文件—可忽略/抖音账单批次台账.json"
         try:
-            merge_excel_by_batch(
+            merged_path = merge_excel_by_batch(
                 input_dir=input_folder,
                 order_column=order_field,
-                output_path=output_file
+                output_path=douyin_order_path,
+                ledger_path=ledger_file,
+                max_workers=default_workers()
             )
             print("===== 步骤2执行完成 =====")
+            return merged_path is not None
         except Exception as e:
             print(f"步骤2执行失败: {str(e)}")
+            return False
 
     # 步骤3：比对并生成结果
     def step3():
         print("\n===== 开始执行步骤3：比对并生成结果 =====")
-        douyin_order_path = f"./中间文件—可忽略/抖音订单合并结果.xlsx"
-        wangdian_summary_path = f"./中间文件—可忽略/网店单号汇总表.xlsx"
-        guobu_result_path = f"./中间文件—可忽略/国补登记结果_未匹配名称.xlsx"
         try:
-            create_guobu_table(douyin_order_path, guobu_result_path)
-            fill_3c_name(guobu_result_path, wangdian_summary_path)
+            create_guobu_table(douyin_order_path, guobu_result_path, max_workers=default_workers())
+            fill_3c_name(guobu_result_path, wangdian_summary_path, index_path=name_index_path)
             print(f"\n🎉 步骤3执行完成！最终结果已保存至：{os.path.abspath(guobu_result_path)}")
             print("===== 步骤3执行完成 =====")
+            return True
         except Exception as e:
             print(f"步骤3执行失败: {str(e)}")
+            return False
+
+    # 流式模式的步骤2：分块读取抖音表格，直接拆分为订单货款和垫资款
+    def step2_stream():
+        print("\n===== 开始执行步骤2（流式）：分块读取抖音店铺文件并按行类型拆分 =====")
+        try:
+            result = stream_guobu_tables("抖音表格", "sku单号", stream_order_path, dianzi_result_path)
+            print("===== 步骤2执行完成 =====")
+            return result is not None
+        except Exception as e:
+            print(f"步骤2执行失败: {str(e)}")
+            return False
+
+    # 流式模式的步骤3：订单货款已在步骤2拆分好，只填充3c商品名称
+    def step3_stream():
+        print("\n===== 开始执行步骤3（流式）：填充3c商品名称 =====")
+        try:
+            fill_3c_name(stream_order_path, wangdian_summary_path, output_path=guobu_result_path,
+                         index_path=name_index_path)
+            print(f"\n🎉 步骤3执行完成！最终结果已保存至：{os.path.abspath(guobu_result_path)}")
+            print("===== 步骤3执行完成 =====")
+            return True
+        except Exception as e:
+            print(f"步骤3执行失败: {str(e)}")
+            return False
 
     def step4():
         print("\n===== 开始执行步骤4：根据3c商品名称以及企业规格进行名称匹配 =====")
-        sheet_file_path = f"./中间文件—可忽略/国补登记结果_未匹配名称.xlsx"  # 替换为你的表格路径
-        guige_file_path = "企业库存数量.xlsx"
-        pipei_output_path = f"./中间文件—可忽略/国补登记结果_未处理.xlsx"
-        count_unique_shops_with_sheet(sheet_file_path, guige_file_path, pipei_output_path)
+        count_unique_shops_with_sheet(guobu_result_path, guige_file_path, pipei_output_path, fuzzy=fuzzy)
         print(f"\n🎉 步骤4执行完成！")
-
+        return True
 
     def step5():
         print("\n===== 步骤4：整理表格格式 =====")
-        document_file(f"./中间文件—可忽略/国补登记结果_未处理.xlsx","国补登记结果.xlsx")
+        return document_file(pipei_output_path, final_output_path) is not None
         # document_file(f"./中间文件—可忽略/垫资款结果_未处理.xlsx","垫资款结果.xlsx")
 
+    # 各步骤的输入（原始表格及上游步骤的中间文件）和输出，用于判断步骤是否需要重新执行
+    steps = {
+        1: (step1, ["3c商品名表格"], [wangdian_summary_path, name_index_path]),
+        2: (step2, ["抖音表格"], [douyin_order_path]),
+        3: (step3, [douyin_order_path, wangdian_summary_path, name_index_path], [guobu_result_path, dianzi_result_path]),
+        4: (step4, [guobu_result_path, guige_file_path], [pipei_output_path]),
+        5: (step5, [pipei_output_path], [final_output_path]),
+    }
+    if stream:
+        steps[2] = (step2_stream, ["抖音表格"], [stream_order_path, dianzi_result_path])
+        steps[3] = (step3_stream, [stream_order_path, wangdian_summary_path, name_index_path], [guobu_result_path])
+    fingerprints = step_fingerprint.load_fingerprints()
+    skipped = []
+
+    def run_step(number):
+        step_func, inputs, outputs = steps[number]
+        key = f"step{number}"
+        if fuzzy and number == 4:
+            # 模糊匹配的输出与精确匹配不同，单独记录指纹
+            key += "_fuzzy"
+        if not force and step_fingerprint.is_up_to_date(fingerprints, key, inputs, outputs):
+            print(f"\n⏭️ 步骤{number}的输入与上次相同，沿用上次的输出，跳过（加 --force 可强制重新执行）")
+            skipped.append(number)
+            return
+        # 步骤抛出异常时同样删除记录
+        succeeded = False
+        try:
+            with perf_metrics.stage(key) as record:
+                perf_metrics.count_read(*inputs)
+                succeeded = step_func()
+                record["ok"] = bool(succeeded)
+                if succeeded:
+                    perf_metrics.count_written(*outputs)
+        finally:
+            if succeeded:
+                step_fingerprint.record_step(fingerprints, key, inputs, outputs)
+            else:
+                step_fingerprint.forget_step(fingerprints, key)
+            step_fingerprint.save_fingerprints(fingerprints)
 
     # 根据传入的参数执行对应流程
-    if process_step == 0:
-        print("===== 开始执行全流程 =====")
-        step1()
-        step2()
-        step3()
-        step4()
-        step5()
-        print("\n===== 全流程执行完成 =====")
-    elif process_step == 1:
-        step1()
-    elif process_step == 2:
-        step2()
-    elif process_step == 3:
-        step3()
-    elif process_step == 4:
-        step4()
-    elif process_step == 5:
-        step5()
-    else:
-        print(f"无效参数：{process_step}，请传入 0（全流程）、1、2、3、4（单步骤）")
+    perf_metrics.reset()
+    try:
+        if process_step == 0:
+            print("===== 开始执行全流程 =====")
+            for number in steps:
+                run_step(number)
+            if skipped:
+                print(f"\n♻️ 输入未变化、已跳过的步骤：{'、'.join(str(n) for n in skipped)}")
+            print("\n===== 全流程执行完成 =====")
+        elif process_step in steps:
+            run_step(process_step)
+        else:
+            print(f"无效参数：{process_step}，请传入 0（全流程）、1、2、3、4、5（单步骤）")
+            return
+    finally:
+        # 每个步骤的耗时、行数、读写字节数、内存峰值写入运行报告
+        perf_metrics.write_report("国补登记", extra={"process_step": process_step, "skipped_steps": skipped,
+                                                   "stream": stream, "fuzzy": fuzzy})
 
 if __name__ == "__main__":
+    # 打包成exe后多进程读取需要
+    multiprocessing.freeze_support()
+    # --force：忽略流程指纹，所选步骤全部重新执行
+    force = "--force" in sys.argv[1:]
+    # --stream：抖音表格按行分块读取并直接拆分（数据量很大、内存不足时使用）
+    stream = "--stream" in sys.argv[1:]
+    # --fuzzy：步骤4对精确匹配未成功的行做模糊匹配（结果带匹配置信度）
+    fuzzy = "--fuzzy" in sys.argv[1:]
+    # --verbose：额外打印规格字典等调试内容
+    if "--verbose" in sys.argv[1:]:
+        perf_metrics.set_verbosity(2)
     print("=" * 40)
     print("           🔧 数据处理工具 - 流程选择           ")
     print("=" * 40)
@@ -941,6 +1433,9 @@ if __name__ == "__main__":
     print("-" * 40)
     print(" ➡️ [0] 执行全流程")
     print("      包含：步骤1→步骤2→步骤3（完整处理流程）")
+    print("      输入未变化的步骤自动跳过，启动时加 --force 可全部重新执行")
+    print("      抖音表格数据量很大时，启动时加 --stream 分块处理以降低内存占用")
+    print("      名称匹配不上时，启动时加 --fuzzy 对未匹配的商品名做模糊匹配")
     print("-" * 40)
     print(" 📜 [1] 仅执行——处理3c商品表")
     print("      功能：批量处理3c商品表格并生成汇总表")
@@ -965,7 +1460,7 @@ if __name__ == "__main__":
             step = int(user_input)
             # 验证输入范围
             if 0 <= step <= 5:
-                main(step)  # 执行主程序
+                main(step, force=force, stream=stream, fuzzy=fuzzy)  # 执行主程序
 
                 # 等待用户按任意键退出
                 input("\n操作已完成，按任意键并回车即可退出...")